@@ -8,7 +8,15 @@ setup(
     package_dir={"": "src"},
     package_data={"": ["*.md"]},
     use_incremental=True,
-    scripts=["bin/fsctl", "bin/asciinema", "bin/cowrie", "bin/createfs", "bin/playlog"],
+    scripts=[
+        "bin/fsctl",
+        "bin/asciinema",
+        "bin/cowrie",
+        "bin/createfs",
+        "bin/playlog",
+        "bin/ttylogconvert",
+        "bin/catalog",
+    ],
     setup_requires=["incremental", "click"],
 )
 
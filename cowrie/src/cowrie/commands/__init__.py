@@ -3,6 +3,8 @@
 
 from __future__ import annotations
 
+# After adding a module or changing the commands one provides, update
+# manifest.py with `make manifest`
 __all__ = [
     "adduser",
     "apt",
@@ -16,6 +16,8 @@ from twisted.internet import error, reactor
 from twisted.python import failure, log
 
 from cowrie.core import utils
+from cowrie.core.cache import LRUCache
+from cowrie.core.config import CowrieConfig
 from cowrie.shell.command import HoneyPotCommand
 from typing import TYPE_CHECKING
 
@@ -231,64 +233,28 @@ commands["/bin/hostname"] = Command_hostname
 commands["hostname"] = Command_hostname
 
 
+# Rendered lines of the process table of the server by the arguments of
+# ps, COLUMNS, the user and the version of the table
+psCache = LRUCache(CowrieConfig.getint("shell", "ps_cache_size", fallback=64))
+
+
 class Command_ps(HoneyPotCommand):
     def call(self) -> None:
         user = self.protocol.user.username
         args = ""
         if self.args:
             args = self.args[0].strip()
-        (
-            _user,
-            _pid,
-            _cpu,
-            _mem,
-            _vsz,
-            _rss,
-            _tty,
-            _stat,
-            _start,
-            _time,
-            _command,
-        ) = list(range(11))
-        output_array = []
-
-        output = (
-            "%s".ljust(15 - len("USER")) % "USER",
-            "%s".ljust(8 - len("PID")) % "PID",
-            "%s".ljust(13 - len("%CPU")) % "%CPU",
-            "%s".ljust(13 - len("%MEM")) % "%MEM",
-            "%s".ljust(12 - len("VSZ")) % "VSZ",
-            "%s".ljust(12 - len("RSS")) % "RSS",
-            "%s".ljust(10 - len("TTY")) % "TTY",
-            "%s".ljust(8 - len("STAT")) % "STAT",
-            "%s".ljust(8 - len("START")) % "START",
-            "%s".ljust(8 - len("TIME")) % "TIME",
-            "%s".ljust(30 - len("COMMAND")) % "COMMAND",
-        )
-        output_array.append(output)
-        if self.protocol.user.server.process:
-            for single_ps in self.protocol.user.server.process:
-                output = (
-                    "%s".ljust(15 - len(str(single_ps["USER"])))
-                    % str(single_ps["USER"]),
-                    "%s".ljust(8 - len(str(single_ps["PID"]))) % str(single_ps["PID"]),
-                    "%s".ljust(13 - len(str(round(single_ps["CPU"], 2))))
-                    % str(round(single_ps["CPU"], 2)),
-                    "%s".ljust(13 - len(str(round(single_ps["MEM"], 2))))
-                    % str(round(single_ps["MEM"], 2)),
-                    "%s".ljust(12 - len(str(single_ps["VSZ"]))) % str(single_ps["VSZ"]),
-                    "%s".ljust(12 - len(str(single_ps["RSS"]))) % str(single_ps["RSS"]),
-                    "%s".ljust(10 - len(str(single_ps["TTY"]))) % str(single_ps["TTY"]),
-                    "%s".ljust(8 - len(str(single_ps["STAT"])))
-                    % str(single_ps["STAT"]),
-                    "%s".ljust(8 - len(str(single_ps["START"])))
-                    % str(single_ps["START"]),
-                    "%s".ljust(8 - len(str(single_ps["TIME"])))
-                    % str(single_ps["TIME"]),
-                    "%s".ljust(30 - len(str(single_ps["COMMAND"])))
-                    % str(single_ps["COMMAND"]),
-                )
-                output_array.append(output)
+        lines: tuple[str, ...] = ()
+        server = self.protocol.user.server
+        if server.process:
+            # The process table is rendered once for each version of it,
+            # the session's own processes get new PIDs on every run
+            key = (args, self.environ.get("COLUMNS"), user, server.processVersion)
+            found, lines = psCache.get(key)
+            if not found:
+                lines = tuple(self.render(args, self.process_table(), header=False))
+                psCache.set(key, lines)
+            output_array = [self.header()]
             process = random.randint(4000, 8000)
             output = (
                 "%s".ljust(15 - len("root")) % "root",
@@ -770,8 +736,83 @@ class Command_ps(HoneyPotCommand):
                 ),
             ]
 
+        # The header is always shown, followed by the process table and
+        # then the session's own processes
+        head, *rest = self.render(args, output_array, header=True)
+        for s in (head, *lines, *rest):
+            self.write(f"{s}\n")
+
+    def header(self) -> tuple[str, ...]:
+        """
+        The column names of the process table of the server
+        """
+        return (
+            "%s".ljust(15 - len("USER")) % "USER",
+            "%s".ljust(8 - len("PID")) % "PID",
+            "%s".ljust(13 - len("%CPU")) % "%CPU",
+            "%s".ljust(13 - len("%MEM")) % "%MEM",
+            "%s".ljust(12 - len("VSZ")) % "VSZ",
+            "%s".ljust(12 - len("RSS")) % "RSS",
+            "%s".ljust(10 - len("TTY")) % "TTY",
+            "%s".ljust(8 - len("STAT")) % "STAT",
+            "%s".ljust(8 - len("START")) % "START",
+            "%s".ljust(8 - len("TIME")) % "TIME",
+            "%s".ljust(30 - len("COMMAND")) % "COMMAND",
+        )
+
+    def process_table(self) -> list[tuple[str, ...]]:
+        """
+        The processes of the server
+        """
+        output_array = []
+        for single_ps in self.protocol.user.server.process:
+            output = (
+                "%s".ljust(15 - len(str(single_ps["USER"])))
+                % str(single_ps["USER"]),
+                "%s".ljust(8 - len(str(single_ps["PID"]))) % str(single_ps["PID"]),
+                "%s".ljust(13 - len(str(round(single_ps["CPU"], 2))))
+                % str(round(single_ps["CPU"], 2)),
+                "%s".ljust(13 - len(str(round(single_ps["MEM"], 2))))
+                % str(round(single_ps["MEM"], 2)),
+                "%s".ljust(12 - len(str(single_ps["VSZ"]))) % str(single_ps["VSZ"]),
+                "%s".ljust(12 - len(str(single_ps["RSS"]))) % str(single_ps["RSS"]),
+                "%s".ljust(10 - len(str(single_ps["TTY"]))) % str(single_ps["TTY"]),
+                "%s".ljust(8 - len(str(single_ps["STAT"])))
+                % str(single_ps["STAT"]),
+                "%s".ljust(8 - len(str(single_ps["START"])))
+                % str(single_ps["START"]),
+                "%s".ljust(8 - len(str(single_ps["TIME"])))
+                % str(single_ps["TIME"]),
+                "%s".ljust(30 - len(str(single_ps["COMMAND"])))
+                % str(single_ps["COMMAND"]),
+            )
+            output_array.append(output)
+        return output_array
+
+    def render(
+        self, args: str, output_array: list[tuple[str, ...]], header: bool
+    ) -> list[str]:
+        """
+        Lines of the processes ps shows with args, after the header if
+        it is the first entry
+        """
+        user = self.protocol.user.username
+        (
+            _user,
+            _pid,
+            _cpu,
+            _mem,
+            _vsz,
+            _rss,
+            _tty,
+            _stat,
+            _start,
+            _time,
+            _command,
+        ) = list(range(11))
+        lines = []
         for i in range(len(output_array)):
-            if i != 0:
+            if i != 0 or not header:
                 if "a" not in args and output_array[i][_user].strip() != user:
                     continue
                 elif (
@@ -806,7 +847,8 @@ class Command_ps(HoneyPotCommand):
                         else 80
                     )
                 ]
-            self.write(f"{s}\n")
+            lines.append(s)
+        return lines
 
 
 commands["/bin/ps"] = Command_ps
@@ -974,6 +1016,12 @@ class Command_yes(HoneyPotCommand):
         self.y()
 
     def y(self) -> None:
+        if self.outputClosed():
+            self.exit()
+            return
+        if self.outputPaused():
+            self.scheduled = reactor.callLater(0.01, self.y)  # type: ignore[attr-defined]
+            return
         if self.args:
             self.write("{}\n".format(" ".join(self.args)))
         else:
@@ -10,12 +10,16 @@ from __future__ import annotations
 
 
 import getopt
+from typing import Any, TYPE_CHECKING
 
 from twisted.python import log
 
 from cowrie.shell.command import HoneyPotCommand
 from cowrie.shell.fs import FileNotFound
 
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
 commands = {}
 
 
@@ -26,6 +30,9 @@ class Command_cat(HoneyPotCommand):
 
     number = False
     linenumber = 1
+    memoize = True
+    # Output still to write, see drain()
+    work: Iterator[None] | None = None
 
     def start(self) -> None:
         try:
@@ -47,31 +54,71 @@ class Command_cat(HoneyPotCommand):
             elif o in ("-n", "--number"):
                 self.number = True
 
-        if len(args) > 0:
-            for arg in args:
-                if arg == "-":
-                    self.output(self.input_data)
-                    continue
+        if len(args) > 0 and self.memoKey() is not None:
+            self.memoized(lambda: list(self.cat(args)))
+            self.exit()
+        elif len(args) > 0:
+            self.work = self.cat(args)
+            self.drain()
+        elif self.input_data is not None:
+            self.work = self.output(self.input_data)
+            self.drain()
 
-                pname = self.fs.resolve_path(arg, self.protocol.cwd)
+    def drain(self) -> None:
+        """
+        Write the output, pausing while the terminal has as much queued
+        as it takes and going on once that has been sent
+        """
+        work = self.work
+        if work is None:
+            return
+        for _ in work:
+            if self.outputPaused():
+                self.protocol.terminal.afterOutput(self.drain)
+                return
+        self.work = None
+        self.exit()
 
-                if self.fs.isdir(pname):
-                    self.errorWrite(f"cat: {arg}: Is a directory\n")
-                    continue
+    def cat(self, args: list[str]) -> Iterator[None]:
+        for arg in args:
+            if arg == "-":
+                yield from self.output(self.input_data)
+                continue
 
-                try:
-                    contents = self.fs.file_contents(pname)
-                    self.output(contents)
-                except FileNotFound:
-                    self.errorWrite(f"cat: {arg}: No such file or directory\n")
-            self.exit()
-        elif self.input_data is not None:
-            self.output(self.input_data)
-            self.exit()
+            pname = self.fs.resolve_path(arg, self.protocol.cwd)
+
+            if self.fs.isdir(pname):
+                self.errorWrite(f"cat: {arg}: Is a directory\n")
+                continue
+
+            try:
+                contents = self.fs.file_contents(pname)
+            except FileNotFound:
+                self.errorWrite(f"cat: {arg}: No such file or directory\n")
+                continue
+            yield from self.output(contents)
 
-    def output(self, inb: bytes | None) -> None:
+    def memoKey(self) -> tuple[Any, ...] | None:
         """
-        This is the cat output, with optional line numbering
+        Files under /proc can't be written to, their content is shared
+        for as long as the session hasn't changed the filesystem
+        """
+        if "-" in self.args or self.fs.generation:
+            return None
+        paths = [
+            self.fs.resolve_path(arg, self.protocol.cwd)
+            for arg in self.args
+            if not arg.startswith("-")
+        ]
+        if not all(path.startswith("/proc/") for path in paths):
+            return None
+        key = super().memoKey()
+        return key and (*key, tuple(paths))
+
+    def output(self, inb: bytes | None) -> Iterator[None]:
+        """
+        This is the cat output, with optional line numbering, a line on
+        each step
         """
         if inb is None:
             return
@@ -80,10 +127,13 @@ class Command_cat(HoneyPotCommand):
         if lines[-1] == b"":
             lines.pop()
         for line in lines:
+            if self.outputClosed():
+                return
             if self.number:
                 self.write(f"{self.linenumber:>6}  ")
                 self.linenumber = self.linenumber + 1
             self.writeBytes(line + b"\n")
+            yield None
 
     def lineReceived(self, line: str) -> None:
         """
@@ -96,7 +146,12 @@ class Command_cat(HoneyPotCommand):
             format="INPUT (%(realm)s): %(input)s",
         )
 
-        self.output(line.encode("utf-8"))
+        for _ in self.output(line.encode("utf-8")):
+            pass
+
+    def handle_CTRL_C(self) -> None:
+        self.work = None
+        super().handle_CTRL_C()
 
     def handle_CTRL_D(self) -> None:
         """
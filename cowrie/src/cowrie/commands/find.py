@@ -8,11 +8,21 @@ find command
 
 from __future__ import annotations
 from cowrie.shell.command import HoneyPotCommand
+from cowrie.shell.fs import T_DIR, T_FILE
+from cowrie.shell.pathindex import path_index
 import fnmatch
 import os
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
 
 commands = {}
 
+# Index entries looked at between two writes
+STEP = 1000
+
 class Command_find(HoneyPotCommand):
     """
     find command
@@ -74,31 +84,50 @@ class Command_find(HoneyPotCommand):
 
             idx += 1
 
-        self.find_recursive(self.start_path, 0)
-        self.exit()
-
-    def find_recursive(self, path: str, depth: int) -> None:
-        if self.maxdepth is not None and depth > self.maxdepth:
-            return
-        try:
-            if not self.fs.exists(path):
-                return
-            if self._match(path):
+        self.cooperate(self.find(self.start_path))
+
+    def find(self, path: str) -> Iterator[None]:
+        """
+        Write the paths below path that match, as listed by the path
+        index, STEP entries at a time
+        """
+        index = path_index(self.fs)
+        entries = index.subtree(path)
+        if not entries:
+            # Below a symbolic link, only the path itself is known
+            if self.fs.exists(path) and self._match(path):
                 self.write(f"{path}\n")
+            return
 
-            if self.fs.isdir(path):
-                for entry in self.fs.listdir(path):
-                    if entry in (".", ".."):
-                        continue
-                    full_path = os.path.join(path, entry)
-                    self.find_recursive(full_path, depth + 1)
-        except Exception as e:
-            self.errorWrite(f"find: error accessing {path}: {e}\n")
+        match = None
+        if self.name_pattern:
+            match = re.compile(fnmatch.translate(self.name_pattern)).match
+        kind = {"f": T_FILE, "d": T_DIR}.get(self.type_filter)
+        maxdepth = index.depths[entries.start] + self.maxdepth
+
+        found: list[str] = []
+        i = entries.start
+        steps = 0
+        while i < entries.stop:
+            if index.depths[i] > maxdepth:
+                i = index.ends[i]
+                continue
+            if (kind is None or index.types[i] == kind) and (
+                match is None or match(os.path.basename(index.paths[i]))
+            ):
+                found.append(f"{index.paths[i]}\n")
+            i += 1
+            steps += 1
+            if steps % STEP == 0:
+                self.write("".join(found))
+                found = []
+                yield None
+        self.write("".join(found))
 
     def _match(self, path: str) -> bool:
         basename = os.path.basename(path)
 
-        if self.name_pattern and not fnmatch.fnmatch(basename, self.name_pattern):
+        if self.name_pattern and not fnmatch.fnmatchcase(basename, self.name_pattern):
             return False
 
         if self.type_filter == "f" and not self.fs.isfile(path):
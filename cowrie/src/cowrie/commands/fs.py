@@ -187,6 +187,22 @@ class Command_head(HoneyPotCommand):
     linecount: int = 10
     bytecount: int = 0
 
+    @classmethod
+    def stdin_limit(cls, args: list[str]) -> tuple[int, int]:
+        linecount, bytecount = cls.linecount, cls.bytecount
+        try:
+            optlist, _args = getopt.getopt(args, "c:n:")
+        except getopt.GetoptError:
+            return 0, 0
+        for opt in optlist:
+            if not opt[1].isdigit():
+                continue
+            if opt[0] == "-n":
+                linecount, bytecount = int(opt[1]), 0
+            elif opt[0] == "-c":
+                linecount, bytecount = 0, int(opt[1])
+        return bytecount, linecount
+
     def head_application(self, contents: bytes) -> None:
         if self.bytecount:
             self.writeBytes(contents[: self.bytecount])
@@ -387,6 +403,7 @@ or available locally via: info '(coreutils) rm invocation'\n"""
                         )
                     else:
                         directory.remove(i)
+                        self.fs.generation += 1
                         if verbose:
                             if i[fs.A_TYPE] == fs.T_DIR:
                                 self.write(f"removed directory '{i[fs.A_NAME]}'\n")
@@ -469,6 +486,7 @@ class Command_cp(HoneyPotCommand):
                 directory.remove(next(x for x in directory if x[fs.A_NAME] == outfile))
             s[fs.A_NAME] = outfile
             directory.append(s)
+            self.fs.generation += 1
 
 
 commands["/bin/cp"] = Command_cp
@@ -543,6 +561,7 @@ class Command_mv(HoneyPotCommand):
                 sdir.remove(s)
             else:
                 s[fs.A_NAME] = outfile
+            self.fs.generation += 1
 
 
 commands["/bin/mv"] = Command_mv
@@ -606,6 +625,7 @@ class Command_rmdir(HoneyPotCommand):
                         )
                         return
                     directory.remove(i)
+                    self.fs.generation += 1
                     break
 
 
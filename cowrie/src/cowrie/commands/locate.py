@@ -1,6 +1,11 @@
 from __future__ import annotations
 import getopt
 from cowrie.shell.command import HoneyPotCommand
+from cowrie.shell.pathindex import path_index
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
 
 
 commands = {}
@@ -48,8 +53,12 @@ This program is provided with NO WARRANTY, to the extent permitted by law. \n
 LOCATE_HELP_MSG = """no search pattern specified \n"""
 
 
+# Index entries looked at between two writes
+STEP = 1000
+
+
 class Command_locate(HoneyPotCommand):
-    def call(self):
+    def start(self) -> None:
         if len(self.args):
             try:
                 opts, args = getopt.gnu_getopt(
@@ -59,40 +68,42 @@ class Command_locate(HoneyPotCommand):
                 self.errorWrite(
                     f"locate: invalid option -- '{err.opt}'\nTry 'locate --help' for more information.\n"
                 )
+                self.exit()
                 return
 
             for opt in opts:
                 if opt[0] == "-h" or opt[0] == "--help":
                     self.write(LOCATE_HELP)
+                    self.exit()
                     return
                 elif opt[0] == "-v" or opt[0] == "--version":
                     self.write(LOCATE_VERSION)
+                    self.exit()
                     return
             if len(args) > 0:
-                paths_list = []
-                curdir = "/"
-                locate_list = self.find_path(args, paths_list, curdir)
-                for length in locate_list:
-                    self.write(length + "\n")
+                self.cooperate(self.locate(args))
                 return
 
         else:
             self.write(LOCATE_HELP_MSG)
-            return
-
-    def find_path(self, args, paths_list, curdir):
-        arg = args[0]
-        home_dir = self.fs.listdir(curdir)
-        for hf in home_dir:
-            abs_path = self.fs.resolve_path(hf, curdir)
-            if self.fs.isdir(hf):
-                self.find_path(args, paths_list, abs_path)
-            elif self.fs.isfile(abs_path):
-                resolve_path = self.fs.resolve_path(hf, curdir)
-                if arg in resolve_path and paths_list.count(resolve_path) == 0:
-                    paths_list.append(resolve_path)
-
-        return paths_list
+        self.exit()
+
+    def locate(self, patterns: list[str]) -> Iterator[None]:
+        """
+        Write the paths in the path index that contain any of patterns,
+        STEP entries at a time
+        """
+        index = path_index(self.fs)
+        found: list[str] = []
+        for i in range(1, len(index)):
+            path = index.paths[i]
+            if any(pattern in path for pattern in patterns):
+                found.append(f"{path}\n")
+            if i % STEP == 0:
+                self.write("".join(found))
+                found = []
+                yield None
+        self.write("".join(found))
 
 
 commands["locate"] = Command_locate
@@ -0,0 +1,315 @@
+"""
+Commands provided by each module in cowrie.commands, so that a module is
+only imported when one of its commands is first run.
+
+Generated by src/cowrie/scripts/commandmanifest.py, do not edit.
+"""
+
+from __future__ import annotations
+
+manifest: dict[str, tuple[str, ...]] = {
+    "adduser": (
+        "/usr/sbin/adduser",
+        "/usr/sbin/useradd",
+        "adduser",
+        "useradd",
+    ),
+    "apt": (
+        "/usr/bin/apt-get",
+        "/bin/apt-get",
+        "apt-get",
+        "/usr/bin/apt",
+        "/bin/apt",
+        "apt",
+    ),
+    "awk": (
+        "/bin/awk",
+        "awk",
+    ),
+    "base": (
+        "/usr/bin/whoami",
+        "whoami",
+        "/usr/bin/users",
+        "users",
+        "help",
+        "/usr/bin/w",
+        "w",
+        "/usr/bin/who",
+        "who",
+        "/bin/echo",
+        "echo",
+        "/usr/bin/printf",
+        "printf",
+        "/usr/bin/clear",
+        "clear",
+        "/usr/bin/reset",
+        "reset",
+        "/bin/hostname",
+        "hostname",
+        "/bin/ps",
+        "ps",
+        "/usr/bin/id",
+        "id",
+        "/usr/bin/passwd",
+        "passwd",
+        "/sbin/shutdown",
+        "shutdown",
+        "/sbin/poweroff",
+        "poweroff",
+        "/sbin/halt",
+        "halt",
+        "/sbin/reboot",
+        "reboot",
+        "history",
+        "/bin/date",
+        "date",
+        "/usr/bin/yes",
+        "yes",
+        "/usr/bin/php",
+        "php",
+        "/usr/bin/chattr",
+        "chattr",
+        "set",
+        "umask",
+        "unset",
+        "export",
+        "alias",
+        "jobs",
+        "kill",
+        "/bin/kill",
+        "/bin/pkill",
+        "/bin/killall",
+        "/bin/killall5",
+        "/bin/su",
+        "su",
+        "/bin/chown",
+        "chown",
+        "/bin/chgrp",
+        "chgrp",
+        ":",
+        "do",
+        "done",
+    ),
+    "base64": (
+        "/usr/bin/base64",
+        "base64",
+    ),
+    "bash": (
+        "/bin/bash",
+        "bash",
+        "/bin/sh",
+        "sh",
+        "exit",
+        "logout",
+    ),
+    "busybox": (
+        "/bin/busybox",
+        "busybox",
+    ),
+    "cat": (
+        "/bin/cat",
+        "cat",
+    ),
+    "chmod": (
+        "/bin/chmod",
+        "chmod",
+    ),
+    "chpasswd": (
+        "/usr/sbin/chpasswd",
+        "chpasswd",
+    ),
+    "crontab": (
+        "/usr/bin/crontab",
+        "crontab",
+    ),
+    "curl": (
+        "/usr/bin/curl",
+        "curl",
+    ),
+    "dd": (
+        "/bin/dd",
+        "dd",
+    ),
+    "dig": (
+        "/bin/dig",
+        "dig",
+    ),
+    "du": ("du",),
+    "env": (
+        "/usr/bin/env",
+        "env",
+    ),
+    "ethtool": (
+        "/sbin/ethtool",
+        "ethtool",
+    ),
+    "find": (
+        "find",
+        "/bin/find",
+    ),
+    "finger": (
+        "bin/finger",
+        "finger",
+    ),
+    "free": (
+        "/usr/bin/free",
+        "free",
+    ),
+    "fs": (
+        "/bin/grep",
+        "grep",
+        "/bin/egrep",
+        "/bin/fgrep",
+        "/bin/tail",
+        "/usr/bin/tail",
+        "tail",
+        "/bin/head",
+        "/usr/bin/head",
+        "head",
+        "cd",
+        "/bin/rm",
+        "rm",
+        "/bin/cp",
+        "cp",
+        "/bin/mv",
+        "mv",
+        "/bin/mkdir",
+        "mkdir",
+        "/bin/rmdir",
+        "rmdir",
+        "/bin/pwd",
+        "pwd",
+        "/bin/touch",
+        "touch",
+        ">",
+    ),
+    "ftpget": (
+        "/usr/bin/ftpget",
+        "ftpget",
+    ),
+    "gcc": (
+        "/usr/bin/gcc",
+        "gcc",
+        "/usr/bin/gcc-4.7",
+    ),
+    "git": (
+        "/bin/git",
+        "git",
+    ),
+    "groups": (
+        "groups",
+        "/bin/groups",
+    ),
+    "ifconfig": (
+        "/sbin/ifconfig",
+        "ifconfig",
+    ),
+    "iptables": (
+        "/sbin/iptables",
+        "iptables",
+    ),
+    "last": (
+        "/usr/bin/last",
+        "last",
+    ),
+    "locate": (
+        "locate",
+        "/bin/locate",
+    ),
+    "ls": (
+        "/bin/ls",
+        "ls",
+        "/bin/dir",
+        "dir",
+    ),
+    "lspci": (
+        "/usr/bin/lspci",
+        "lspci",
+    ),
+    "nc": (
+        "/bin/nc",
+        "nc",
+    ),
+    "netstat": (
+        "/bin/netstat",
+        "netstat",
+    ),
+    "nohup": (
+        "/usr/bin/nohup",
+        "nohup",
+    ),
+    "perl": (
+        "/usr/bin/perl",
+        "perl",
+    ),
+    "ping": (
+        "/bin/ping",
+        "ping",
+    ),
+    "python": (
+        "/usr/bin/python",
+        "python",
+    ),
+    "scp": (
+        "/usr/bin/scp",
+        "scp",
+    ),
+    "service": (
+        "/usr/sbin/service",
+        "service",
+    ),
+    "sleep": (
+        "/bin/sleep",
+        "sleep",
+    ),
+    "ssh": (
+        "/usr/bin/ssh",
+        "ssh",
+    ),
+    "sudo": ("sudo",),
+    "tar": (
+        "/bin/tar",
+        "tar",
+    ),
+    "tee": (
+        "/bin/tee",
+        "tee",
+    ),
+    "tftp": (
+        "/usr/bin/tftp",
+        "tftp",
+    ),
+    "ulimit": ("ulimit",),
+    "uname": (
+        "/bin/uname",
+        "uname",
+    ),
+    "uniq": (
+        "/usr/bin/uniq",
+        "uniq",
+    ),
+    "unzip": (
+        "/bin/unzip",
+        "unzip",
+    ),
+    "uptime": (
+        "/usr/bin/uptime",
+        "uptime",
+    ),
+    "wc": (
+        "/usr/bin/wc",
+        "/bin/wc",
+        "wc",
+    ),
+    "wget": (
+        "/usr/bin/wget",
+        "wget",
+        "/usr/bin/dget",
+        "dget",
+    ),
+    "which": ("which",),
+    "yum": (
+        "/usr/bin/yum",
+        "yum",
+    ),
+}
@@ -76,6 +76,8 @@ def uname_fail_extra(arg: str) -> str:
 
 
 class Command_uname(HoneyPotCommand):
+    memoize = True
+
     def full_uname(self) -> str:
         return f"{kernel_name()} {self.protocol.hostname} {kernel_version()} {kernel_build_string()} {hardware_platform()} {operating_system()}\n"
 
@@ -34,6 +34,34 @@ from cowrie.core.config import CowrieConfig
 if TYPE_CHECKING:
     from types import TracebackType
 
+CHUNK_SIZE = 1 << 20
+
+
+def sha256_file(path: str) -> str:
+    """
+    SHA-256 of a file, read in chunks
+    """
+    shasum = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            shasum.update(chunk)
+    return shasum.hexdigest()
+
+
+def store(tempname: str, shasum: str, directory: str) -> tuple[str, bool]:
+    """
+    Move a finished capture to its SHA-256 name in directory, or remove
+    it when that content is stored already
+
+    @return: path of the stored content and whether it was a duplicate
+    """
+    shasumfile = os.path.join(directory, shasum)
+    if os.path.exists(shasumfile):
+        os.remove(tempname)
+        return shasumfile, True
+    os.rename(tempname, shasumfile)
+    return shasumfile, False
+
 
 class Artifact:
     artifactDir: str = CowrieConfig.get("honeypot", "download_path", fallback=".")
@@ -46,12 +74,14 @@ class Artifact:
         )
         self.tempFilename = self.fp.name
         self.closed: bool = False
+        # Hashed as it is written, close() never reads the file back
+        self.hash = hashlib.sha256()
 
         self.shasum: str = ""
         self.shasumFilename: str = ""
 
     def __enter__(self) -> Any:
-        return self.fp
+        return self
 
     def __exit__(
         self,
@@ -64,6 +94,7 @@ class Artifact:
 
     def write(self, data: bytes) -> None:
         self.fp.write(data)
+        self.hash.update(data)
 
     def fileno(self) -> Any:
         return self.fp.fileno()
@@ -77,19 +108,17 @@ class Artifact:
                 pass
             return None
 
-        self.fp.seek(0)
-        data = self.fp.read()
         self.fp.close()
         self.closed = True
 
-        self.shasum = hashlib.sha256(data).hexdigest()
-        self.shasumFilename = os.path.join(self.artifactDir, self.shasum)
+        self.shasum = self.hash.hexdigest()
+        self.shasumFilename, duplicate = store(
+            self.fp.name, self.shasum, self.artifactDir
+        )
 
-        if os.path.exists(self.shasumFilename):
+        if duplicate:
             log.msg("Not storing duplicate content " + self.shasum)
-            os.remove(self.fp.name)
         else:
-            os.rename(self.fp.name, self.shasumFilename)
             umask = os.umask(0)
             os.umask(umask)
             os.chmod(self.shasumFilename, 0o666 & ~umask)
@@ -0,0 +1,180 @@
+"""
+Result caching for output plugins that query external services, and
+bounded in memory caches.
+
+PersistentCache is a small SQLite backed key/value store with a time
+to live per entry, so lookups survive restarts. Coalescer collapses
+concurrent requests for the same key into a single call, so several
+sessions downloading the same file cause one remote lookup. LRUCache
+keeps a bounded number of entries in memory, with or without expiry.
+
+Example:
+
+    cache = PersistentCache("var/lib/cowrie/virustotal.sqlite")
+    inflight = Coalescer()
+
+    result = cache.get("file", shasum)
+    if result is None:
+        d = inflight.run(("file", shasum), lookup, shasum)
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, TYPE_CHECKING
+
+from twisted.internet import defer
+from twisted.python import failure
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable
+
+
+class PersistentCache:
+    """
+    JSON values in SQLite, keyed by (namespace, key), expiring after
+    a per entry time to live.
+    """
+
+    def __init__(self, filename: str) -> None:
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.filename: str = filename
+        self.db = sqlite3.connect(filename)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, "
+            "key TEXT NOT NULL, "
+            "value TEXT NOT NULL, "
+            "expires REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self.db.commit()
+
+    def get(self, namespace: str, key: str, now: float | None = None) -> Any:
+        """
+        Return the cached value, or None if missing or expired
+        """
+        row = self.db.execute(
+            "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < (time.time() if now is None else now):
+            return None
+        return json.loads(row[0])
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: Any,
+        ttl: float,
+        now: float | None = None,
+    ) -> None:
+        expires = (time.time() if now is None else now) + ttl
+        self.db.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires) "
+            "VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires),
+        )
+        self.db.commit()
+
+    def delete(self, namespace: str, key: str) -> None:
+        self.db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+        self.db.commit()
+
+    def purge(self, now: float | None = None) -> int:
+        """
+        Remove expired entries, return the number removed
+        """
+        cur = self.db.execute(
+            "DELETE FROM cache WHERE expires < ?",
+            (time.time() if now is None else now,),
+        )
+        self.db.commit()
+        return cur.rowcount
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class LRUCache:
+    """
+    Bounded mapping of key to (expires, value), least recently used
+    entries are evicted first. Entries set without an expiry time stay
+    until evicted.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize: int = maxsize
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Any, now: float | None = None) -> tuple[bool, Any]:
+        """
+        Return (found, value), entries that expired before now are not
+        found
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        if now is not None and entry[0] < now:
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, entry[1]
+
+    def set(self, key: Any, value: Any, expires: float = math.inf) -> None:
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class Coalescer:
+    """
+    Deduplicate concurrent calls: while a call for a key is in flight,
+    further calls for that key wait for the same result instead of
+    starting a new one.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[Hashable, list[defer.Deferred[Any]]] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def run(
+        self, key: Hashable, f: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> defer.Deferred[Any]:
+        d: defer.Deferred[Any] = defer.Deferred()
+        waiters = self._inflight.get(key)
+        if waiters is not None:
+            waiters.append(d)
+            return d
+
+        self._inflight[key] = [d]
+
+        def fire(result: Any) -> None:
+            for waiter in self._inflight.pop(key):
+                if isinstance(result, failure.Failure):
+                    waiter.errback(result)
+                else:
+                    waiter.callback(result)
+
+        defer.maybeDeferred(f, *args, **kwargs).addBoth(fire)
+        return d
@@ -0,0 +1,148 @@
+"""
+Buffered writers for files captured from a session: stdin in exec mode
+and the targets of > and >> redirections.
+
+Each session keeps its capture files open in a CaptureFiles, keyed by
+path, instead of opening the file for every chunk written. Writers are
+closed when the command that writes them exits and all of them when the
+connection is lost, before the files are moved to the download
+directory. Content is hashed as it is written so the files need not be
+read back for their SHA-256.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Any
+
+from twisted.python import log
+
+BUFFER_SIZE = 65536
+
+
+class CaptureWriter:
+    """
+    Capture file appended to through a buffer of buffer_size bytes. At
+    most limit bytes are kept, 0 for no limit; anything past it is
+    dropped and truncated is set.
+
+    The content is hashed as it is written. A file that already had
+    content is only hashed when inputhash, the hash of a previous writer
+    of the same file, covers all of it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        limit: int = 0,
+        buffer_size: int = BUFFER_SIZE,
+        inputhash: Any = None,
+    ):
+        self.path: str = path
+        self.limit: int = limit
+        self.buffer_size: int = buffer_size
+        self.buffer = bytearray()
+        self.truncated: bool = False
+        self.closed: bool = False
+        self.fd: int = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        self.size: int = os.fstat(self.fd).st_size
+        self.hash: Any = None
+        if self.size == 0:
+            self.hash = hashlib.sha256()
+        elif inputhash is not None and inputhash[1] == self.size:
+            self.hash = inputhash[0]
+
+    def write(self, data: bytes) -> int:
+        """
+        Append data, returning how many bytes were accepted
+        """
+        if self.closed:
+            return 0
+        if self.limit and self.size + len(data) > self.limit:
+            data = data[: max(self.limit - self.size, 0)]
+            if not self.truncated:
+                log.msg(format="Data upload limit reached for %(path)s", path=self.path)
+            self.truncated = True
+        self.buffer += data
+        self.size += len(data)
+        if self.hash is not None:
+            self.hash.update(data)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if not self.buffer or self.closed:
+            return
+        data, self.buffer = memoryview(self.buffer), bytearray()
+        while data:
+            data = data[os.write(self.fd, data) :]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        os.close(self.fd)
+
+    def hexdigest(self) -> str | None:
+        """
+        SHA-256 of the file, None when it had content this writer did not
+        see
+        """
+        if self.hash is None:
+            return None
+        return self.hash.hexdigest()
+
+
+class CaptureFiles:
+    """
+    Capture writers of one session, keyed by path. Opening a path that is
+    already open, such as the target of repeated >> redirections, returns
+    the same writer. The hash of a closed writer is kept so the file can
+    be reopened and its SHA-256 still be known without reading it.
+    """
+
+    def __init__(self, limit: int = 0, buffer_size: int = BUFFER_SIZE) -> None:
+        self.limit: int = limit
+        self.buffer_size: int = buffer_size
+        self.writers: dict[str, CaptureWriter] = {}
+        self.hashes: dict[str, tuple[Any, int]] = {}
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.writers
+
+    def open(self, path: str) -> CaptureWriter:
+        writer = self.writers.get(path)
+        if writer is None:
+            writer = CaptureWriter(
+                path, self.limit, self.buffer_size, self.hashes.pop(path, None)
+            )
+            self.writers[path] = writer
+        return writer
+
+    def close(self, path: str) -> None:
+        writer = self.writers.pop(path, None)
+        if writer is not None:
+            writer.close()
+            if writer.hash is not None:
+                self.hashes[path] = (writer.hash, writer.size)
+
+    def hexdigest(self, path: str) -> str | None:
+        """
+        SHA-256 of a closed capture file, None when unknown
+        """
+        if path not in self.hashes:
+            return None
+        inputhash, size = self.hashes[path]
+        try:
+            if os.path.getsize(path) != size:
+                return None
+        except OSError:
+            return None
+        return inputhash.hexdigest()
+
+    def close_all(self) -> None:
+        for path in list(self.writers):
+            self.close(path)
@@ -0,0 +1,280 @@
+"""
+SQLite catalog of sessions, their TTY logs, commands and artifacts,
+built from the JSON log events so they can be searched without
+grepping the logs themselves.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from typing import TYPE_CHECKING, Any
+
+from cowrie.core.config import CowrieConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY,
+    src_ip TEXT,
+    starttime TEXT,
+    endtime TEXT
+);
+CREATE TABLE IF NOT EXISTS ttylogs (
+    session TEXT NOT NULL,
+    ttylog TEXT NOT NULL,
+    shasum TEXT,
+    size INTEGER,
+    duration REAL,
+    UNIQUE (session, ttylog)
+);
+CREATE TABLE IF NOT EXISTS commands (
+    session TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    command TEXT NOT NULL,
+    input TEXT NOT NULL,
+    UNIQUE (session, timestamp, input)
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    session TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    shasum TEXT NOT NULL,
+    url TEXT,
+    outfile TEXT,
+    UNIQUE (session, timestamp, shasum)
+);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    inode INTEGER,
+    offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS sessions_src_ip ON sessions (src_ip);
+CREATE INDEX IF NOT EXISTS ttylogs_shasum ON ttylogs (shasum);
+CREATE INDEX IF NOT EXISTS commands_session ON commands (session);
+CREATE INDEX IF NOT EXISTS commands_command ON commands (command);
+CREATE INDEX IF NOT EXISTS artifacts_session ON artifacts (session);
+CREATE INDEX IF NOT EXISTS artifacts_shasum ON artifacts (shasum);
+"""
+
+# Events the catalog is built from
+EVENTS = frozenset(
+    (
+        "cowrie.session.connect",
+        "cowrie.session.closed",
+        "cowrie.log.closed",
+        "cowrie.command.input",
+        "cowrie.session.file_download",
+        "cowrie.session.file_upload",
+    )
+)
+
+
+def catalog_path() -> str:
+    """
+    Configured location of the catalog database
+    """
+    return CowrieConfig.get(
+        "output_catalog",
+        "db_file",
+        fallback=os.path.join(
+            CowrieConfig.get("honeypot", "state_path", fallback="."),
+            "catalog.sqlite",
+        ),
+    )
+
+
+class Catalog:
+    """
+    Catalog stored in the SQLite database at path. Adding events is
+    idempotent, so overlapping imports of the same log do no harm.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def add(self, events: Iterable[dict[str, Any]]) -> int:
+        """
+        Add events in one transaction, returning how many were used
+
+        @param events: cowrie log events, others than EVENTS are ignored
+        """
+        count = 0
+        with self.db:
+            for event in events:
+                if event.get("eventid") in EVENTS:
+                    self._add(event)
+                    count += 1
+        return count
+
+    def _add(self, event: dict[str, Any]) -> None:
+        eventid = event["eventid"]
+        session = event["session"]
+        timestamp = event.get("timestamp")
+        self.db.execute(
+            "INSERT OR IGNORE INTO sessions (session) VALUES (?)", (session,)
+        )
+        if eventid == "cowrie.session.connect":
+            self.db.execute(
+                "UPDATE sessions SET src_ip = ?, starttime = ? WHERE session = ?",
+                (event.get("src_ip"), timestamp, session),
+            )
+        elif eventid == "cowrie.session.closed":
+            self.db.execute(
+                "UPDATE sessions SET endtime = ? WHERE session = ?",
+                (timestamp, session),
+            )
+        elif eventid == "cowrie.log.closed":
+            self.db.execute(
+                "INSERT OR IGNORE INTO ttylogs VALUES (?, ?, ?, ?, ?)",
+                (
+                    session,
+                    event["ttylog"],
+                    event.get("shasum"),
+                    event.get("size"),
+                    event.get("duration"),
+                ),
+            )
+        elif eventid == "cowrie.command.input":
+            words = event["input"].split()
+            self.db.execute(
+                "INSERT OR IGNORE INTO commands VALUES (?, ?, ?, ?)",
+                (
+                    session,
+                    timestamp,
+                    os.path.basename(words[0]) if words else "",
+                    event["input"],
+                ),
+            )
+        elif event.get("shasum"):
+            self.db.execute(
+                "INSERT OR IGNORE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (
+                    session,
+                    timestamp,
+                    event["shasum"],
+                    event.get("url"),
+                    event.get("outfile"),
+                ),
+            )
+
+    def index(self, path: str) -> int:
+        """
+        Add the events of a JSON log written since the last call for the
+        same path, starting over when the file was rotated or truncated.
+        Returns the number of events added.
+
+        @param path: cowrie.json style log, one event per line
+        """
+        st = os.stat(path)
+        row = self.db.execute(
+            "SELECT inode, offset FROM sources WHERE path = ?", (path,)
+        ).fetchone()
+        offset = 0
+        if row and row[0] == st.st_ino and row[1] <= st.st_size:
+            offset = row[1]
+
+        count = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                lines = f.readlines(1 << 20)
+                if not lines:
+                    break
+                # A partly written last line is picked up next time
+                if not lines[-1].endswith(b"\n"):
+                    f.seek(-len(lines.pop()), os.SEEK_CUR)
+                    if not lines:
+                        break
+                events = []
+                for line in lines:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        continue
+                count += self.add(events)
+                offset = f.tell()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                (path, st.st_ino, offset),
+            )
+        return count
+
+    def sessions_by_command(self, command: str) -> list[tuple[Any, ...]]:
+        """
+        (session, src_ip, timestamp, input) of command lines starting with
+        the program command, with or without its path
+        """
+        return self.db.execute(
+            "SELECT c.session, s.src_ip, c.timestamp, c.input "
+            "FROM commands c JOIN sessions s USING (session) "
+            "WHERE c.command = ? ORDER BY c.timestamp",
+            (os.path.basename(command),),
+        ).fetchall()
+
+    def sessions_by_input(self, pattern: str) -> list[tuple[Any, ...]]:
+        """
+        (session, src_ip, timestamp, input) of command lines containing
+        pattern. This scans every command, prefer sessions_by_command().
+        """
+        return self.db.execute(
+            "SELECT c.session, s.src_ip, c.timestamp, c.input "
+            "FROM commands c JOIN sessions s USING (session) "
+            "WHERE instr(c.input, ?) > 0 ORDER BY c.timestamp",
+            (pattern,),
+        ).fetchall()
+
+    def sessions_by_artifact(self, shasum: str) -> list[tuple[Any, ...]]:
+        """
+        (session, src_ip, timestamp, url) of sessions that downloaded or
+        uploaded the artifact
+        """
+        return self.db.execute(
+            "SELECT a.session, s.src_ip, a.timestamp, a.url "
+            "FROM artifacts a JOIN sessions s USING (session) "
+            "WHERE a.shasum = ? ORDER BY a.timestamp",
+            (shasum,),
+        ).fetchall()
+
+    def sessions_by_ip(self, src_ip: str) -> list[tuple[Any, ...]]:
+        """
+        (session, starttime, endtime) of the sessions from src_ip
+        """
+        return self.db.execute(
+            "SELECT session, starttime, endtime FROM sessions "
+            "WHERE src_ip = ? ORDER BY starttime",
+            (src_ip,),
+        ).fetchall()
+
+    def session(self, session: str) -> dict[str, Any]:
+        """
+        Everything known about one session: its row, TTY logs, commands
+        and artifacts
+        """
+        db = self.db
+        return {
+            "session": db.execute(
+                "SELECT * FROM sessions WHERE session = ?", (session,)
+            ).fetchone(),
+            "ttylogs": db.execute(
+                "SELECT ttylog, shasum, size, duration FROM ttylogs WHERE session = ?",
+                (session,),
+            ).fetchall(),
+            "commands": db.execute(
+                "SELECT timestamp, input FROM commands WHERE session = ? "
+                "ORDER BY timestamp",
+                (session,),
+            ).fetchall(),
+            "artifacts": db.execute(
+                "SELECT timestamp, shasum, url, outfile FROM artifacts "
+                "WHERE session = ? ORDER BY timestamp",
+                (session,),
+            ).fetchall(),
+        }
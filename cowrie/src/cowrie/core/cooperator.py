@@ -0,0 +1,12 @@
+"""
+The Cooperator that runs all of Cowrie's long jobs a step at a time
+between other work: streamed sample uploads and shell commands with a
+lot of output. Sharing one scheduler keeps their steps interleaved
+fairly and bounds the time they take per reactor iteration together.
+"""
+
+from __future__ import annotations
+
+from twisted.internet import task
+
+cooperator: task.Cooperator = task.Cooperator()
@@ -0,0 +1,120 @@
+"""
+Shared IP enrichment lookups.
+
+Output plugins that look up information about an IP address (reverse
+DNS, GreyNoise, ...) register a fetch function per source and call
+`lookup(source, ip)`. Results are kept in an in-memory LRU backed by a
+persistent SQLite tier with a TTL per source, and concurrent lookups
+for the same address are coalesced, so a returning scanner costs no
+external queries, even after a restart.
+
+[enrichment]
+cache_file = ${honeypot:state_path}/enrichment.sqlite
+lru_size = 10000
+ttl_reversedns = 86400
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, TYPE_CHECKING
+
+from twisted.internet import defer
+
+from cowrie.core.cache import Coalescer, LRUCache, PersistentCache
+from cowrie.core.config import CowrieConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+DEFAULT_TTL: int = 86400
+
+
+class EnrichmentService:
+    """
+    Two tier cache with request coalescing in front of per source
+    fetch functions. A fetch function takes an IP and returns a JSON
+    serializable value or a Deferred firing with one. None is a valid,
+    cached, negative result. Failures are not cached.
+    """
+
+    def __init__(self, filename: str | None, lru_size: int = 10000) -> None:
+        self.lru = LRUCache(lru_size)
+        self.store: PersistentCache | None = (
+            PersistentCache(filename) if filename else None
+        )
+        self.inflight = Coalescer()
+        self.sources: dict[str, tuple[Callable[[str], Any], float]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def register(
+        self, source: str, fetch: Callable[[str], Any], ttl: float | None = None
+    ) -> None:
+        if ttl is None:
+            ttl = CowrieConfig.getint(
+                "enrichment", f"ttl_{source}", fallback=DEFAULT_TTL
+            )
+        self.sources[source] = (fetch, ttl)
+
+    def cached(self, source: str, ip: str) -> tuple[bool, Any]:
+        """
+        Look in both cache tiers without fetching, return (found, value)
+        """
+        now = time.time()
+        found, value = self.lru.get((source, ip), now)
+        if found:
+            return True, value
+        if self.store is not None:
+            entry = self.store.get(source, ip, now)
+            if entry is not None:
+                self.lru.set((source, ip), entry["value"], entry["expires"])
+                return True, entry["value"]
+        return False, None
+
+    def lookup(self, source: str, ip: str) -> defer.Deferred[Any]:
+        found, value = self.cached(source, ip)
+        if found:
+            self.hits += 1
+            return defer.succeed(value)
+        self.misses += 1
+        return self.inflight.run((source, ip), self._fetch, source, ip)
+
+    @defer.inlineCallbacks
+    def _fetch(self, source: str, ip: str) -> Any:
+        fetch, ttl = self.sources[source]
+        value = yield defer.maybeDeferred(fetch, ip)
+        now = time.time()
+        self.lru.set((source, ip), value, now + ttl)
+        if self.store is not None:
+            self.store.set(source, ip, {"value": value, "expires": now + ttl}, ttl, now)
+        return value
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+
+_service: EnrichmentService | None = None
+
+
+def get_enrichment() -> EnrichmentService:
+    """
+    Return the process wide enrichment service, created on first use
+    """
+    global _service
+    if _service is None:
+        _service = EnrichmentService(
+            CowrieConfig.get(
+                "enrichment",
+                "cache_file",
+                fallback=os.path.join(
+                    CowrieConfig.get("honeypot", "state_path", fallback="."),
+                    "enrichment.sqlite",
+                ),
+            ),
+            CowrieConfig.getint("enrichment", "lru_size", fallback=10000),
+        )
+    return _service
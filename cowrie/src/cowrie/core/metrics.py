@@ -0,0 +1,358 @@
+"""
+In-process metrics surface.
+
+Core code records counters, gauges and histograms in the module level
+`metrics` registry. Sinks consume them: pull based exporters such as the
+Prometheus output call `metrics.collect()` on scrape, push based sinks
+(JSON file, StatsD) are flushed periodically by `MetricsReporter`.
+
+Example:
+
+    from cowrie.core.metrics import metrics
+
+    writes = metrics.counter("output_events_total", "Events per plugin")
+    writes.inc(plugin="jsonlog")
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import time
+from typing import Any
+
+from twisted.application import service
+from twisted.internet import protocol, reactor, task
+from twisted.python import log
+
+from cowrie.core.config import CowrieConfig
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _labelkey(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metric:
+    """
+    Base class for a named metric with labelled samples
+    """
+
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.values: dict[LabelKey, Any] = {}
+
+    def samples(self) -> list[tuple[dict[str, str], Any]]:
+        return [(dict(key), value) for key, value in self.values.items()]
+
+    def clear(self) -> None:
+        self.values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _labelkey(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        self.values[_labelkey(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _labelkey(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class HistogramValue:
+    """
+    Bucket counts for one label set. `counts[i]` is the number of
+    observations <= buckets[i], the last entry is the +Inf bucket.
+    """
+
+    __slots__ = ("buckets", "count", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        result: list[tuple[float, int]] = []
+        acc = 0
+        for le, c in zip((*self.buckets, float("inf")), self.counts, strict=True):
+            acc += c
+            result.append((le, acc))
+        return result
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding quantile q
+        """
+        target = q * self.count
+        for le, acc in self.cumulative():
+            if acc >= target:
+                return le
+        return float("inf")
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labelkey(labels)
+        h = self.values.get(key)
+        if h is None:
+            h = self.values[key] = HistogramValue(self.buckets)
+        h.observe(value)
+
+
+class MetricsRegistry:
+    """
+    Holds all metrics by name. Asking for an existing name returns the
+    existing metric, so modules can declare the metrics they use
+    without coordinating.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def _get(self, cls: type[Metric], name: str, *args: Any) -> Any:
+        m = self._metrics.get(name)
+        if m is None:
+            m = self._metrics[name] = cls(name, *args)
+        elif not isinstance(m, cls):
+            raise TypeError(name)
+        return m
+
+    def counter(self, name: str, documentation: str = "") -> Counter:
+        return self._get(Counter, name, documentation)  # type: ignore[no-any-return]
+
+    def gauge(self, name: str, documentation: str = "") -> Gauge:
+        return self._get(Gauge, name, documentation)  # type: ignore[no-any-return]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str = "",
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, documentation, buckets)  # type: ignore[no-any-return]
+
+    def get(self, name: str) -> Metric | None:
+        return self._metrics.get(name)
+
+    def collect(self) -> list[Metric]:
+        return list(self._metrics.values())
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """
+        Return all metrics as JSON serializable dictionaries
+        """
+        result = []
+        for m in self.collect():
+            samples = []
+            for labels, value in m.samples():
+                if isinstance(value, HistogramValue):
+                    value = {
+                        "count": value.count,
+                        "sum": value.sum,
+                        "buckets": [
+                            ["+Inf" if le == float("inf") else le, c]
+                            for le, c in value.cumulative()
+                        ],
+                    }
+                samples.append({"labels": labels, "value": value})
+            result.append({"name": m.name, "type": m.type, "samples": samples})
+        return result
+
+    def clear(self) -> None:
+        self._metrics.clear()
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsSink:
+    """
+    Base class for push based sinks, flushed by MetricsReporter
+    """
+
+    def flush(self, registry: MetricsRegistry) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JSONFileSink(MetricsSink):
+    """
+    Append one JSON line with a full snapshot per flush
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+
+    def flush(self, registry: MetricsRegistry) -> None:
+        line = json.dumps({"time": time.time(), "metrics": registry.snapshot()})
+        with open(self.filename, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class StatsDSink(MetricsSink):
+    """
+    Send metrics as StatsD lines over UDP. Counters and histogram counts
+    are sent as deltas since the previous flush, labels are folded into
+    the metric name.
+    """
+
+    def __init__(self, host: str, port: int, prefix: str = "cowrie") -> None:
+        self.address = (host, port)
+        self.prefix = prefix
+        self._last: dict[str, float] = {}
+        self._port = reactor.listenUDP(0, protocol.DatagramProtocol())  # type: ignore[attr-defined]
+
+    def _name(self, name: str, labels: dict[str, str]) -> str:
+        parts = [self.prefix, name]
+        parts += [f"{k}_{v}" for k, v in sorted(labels.items())]
+        return ".".join(p.replace(".", "_").replace(":", "_") for p in parts)
+
+    def _delta(self, key: str, value: float) -> float:
+        delta = value - self._last.get(key, 0)
+        self._last[key] = value
+        return delta
+
+    def lines(self, registry: MetricsRegistry) -> list[str]:
+        lines: list[str] = []
+        for m in registry.collect():
+            for labels, value in m.samples():
+                name = self._name(m.name, labels)
+                if isinstance(value, HistogramValue):
+                    lines.append(f"{name}.count:{self._delta(name, value.count)}|c")
+                    lines.append(f"{name}.sum:{value.sum}|g")
+                elif m.type == "counter":
+                    lines.append(f"{name}:{self._delta(name, value)}|c")
+                else:
+                    lines.append(f"{name}:{value}|g")
+        return lines
+
+    def flush(self, registry: MetricsRegistry) -> None:
+        for line in self.lines(registry):
+            self._port.write(line.encode("utf-8"), self.address)
+
+    def close(self) -> None:
+        self._port.stopListening()
+
+
+class MetricsReporter(service.Service):
+    """
+    Periodically flush the registry to the configured push sinks.
+
+    [monitor]
+    sinks = jsonlog statsd
+    flush_interval = 60
+    """
+
+    def __init__(self, registry: MetricsRegistry = metrics) -> None:
+        self.registry = registry
+        self.sinks: list[MetricsSink] = []
+        self.interval = CowrieConfig.getfloat(
+            "monitor", "flush_interval", fallback=60.0
+        )
+        self._loop = task.LoopingCall(self.flush)
+
+    def startService(self) -> None:
+        service.Service.startService(self)
+        for name in CowrieConfig.get("monitor", "sinks", fallback="").split():
+            try:
+                if name == "jsonlog":
+                    logdir = CowrieConfig.get(
+                        "honeypot", "log_path", fallback="var/log/cowrie"
+                    )
+                    self.sinks.append(
+                        JSONFileSink(
+                            CowrieConfig.get(
+                                "monitor",
+                                "jsonlog_file",
+                                fallback=f"{logdir}/metrics.json",
+                            )
+                        )
+                    )
+                elif name == "statsd":
+                    self.sinks.append(
+                        StatsDSink(
+                            CowrieConfig.get(
+                                "monitor", "statsd_host", fallback="127.0.0.1"
+                            ),
+                            CowrieConfig.getint(
+                                "monitor", "statsd_port", fallback=8125
+                            ),
+                            CowrieConfig.get(
+                                "monitor", "statsd_prefix", fallback="cowrie"
+                            ),
+                        )
+                    )
+                else:
+                    log.msg(f"Unknown metrics sink: {name}")
+            except Exception:
+                log.err(None, f"Failed to start metrics sink: {name}")
+        if self.sinks:
+            self._loop.start(self.interval, now=False)
+
+    def stopService(self) -> None:
+        if self._loop.running:
+            self._loop.stop()
+            self.flush()
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+        service.Service.stopService(self)
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            try:
+                sink.flush(self.registry)
+            except Exception:
+                log.err(None, f"Failed to flush metrics to {sink.__class__.__name__}")
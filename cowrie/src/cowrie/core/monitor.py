@@ -0,0 +1,186 @@
+"""
+Reactor health monitoring.
+
+ReactorMonitor samples how late the reactor runs a timed call
+(event loop lag) and runs a watchdog thread that notices when the
+reactor thread is stuck in a single callback for longer than
+`slow_threshold`. The stack of the blocking code is logged once per
+distinct call site, so a recurring slow path does not flood the log.
+
+[monitor]
+enabled = true
+lag_interval = 1.0
+slow_threshold = 0.25
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sys
+import threading
+import time
+import traceback
+from typing import Any, TYPE_CHECKING
+
+from twisted.application import service
+from twisted.internet import reactor
+from twisted.python import log
+
+from cowrie.core.config import CowrieConfig
+from cowrie.core.metrics import metrics
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from types import FrameType
+
+    from twisted.internet.interfaces import IDelayedCall
+
+LAG_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "Twisted reactor lag (s)", LAG_BUCKETS
+)
+slow_callbacks = metrics.counter(
+    "reactor_slow_callbacks_total", "Reactor blocked longer than slow_threshold"
+)
+slow_writes = metrics.counter(
+    "output_slow_writes_total", "Output plugin write() calls over slow_threshold"
+)
+
+# Stack signatures of blocking callbacks already logged
+_reported: set[str] = set()
+
+# Output plugins with a slow write() already logged
+_slow_plugins: set[str] = set()
+
+slow_threshold: float = CowrieConfig.getfloat(
+    "monitor", "slow_threshold", fallback=0.25
+)
+
+
+def _signature(stack: list[traceback.FrameSummary]) -> str:
+    sig = "|".join(f"{f.filename}:{f.lineno}" for f in stack)
+    return hashlib.sha1(sig.encode()).hexdigest()
+
+
+def report_slow_write(plugin: str, duration: float, write: Callable[..., Any]) -> None:
+    """
+    Record an output plugin write() call that took longer than
+    slow_threshold, logging the write() method once per plugin. write()
+    has returned by now, so its stack would only show the caller.
+    """
+    slow_writes.inc(plugin=plugin)
+    if plugin in _slow_plugins:
+        return
+    _slow_plugins.add(plugin)
+    code = getattr(write, "__code__", None)
+    where = f" at {code.co_filename}:{code.co_firstlineno}" if code else ""
+    log.msg(
+        f"Output plugin {plugin} write() took {duration:.3f}s "
+        f"(threshold {slow_threshold}s): "
+        f"{write.__module__}.{write.__qualname__}{where}"
+    )
+
+
+class ReactorMonitor(service.Service):
+    """
+    Sample reactor lag and report callbacks blocking the reactor
+    """
+
+    def __init__(
+        self, interval: float | None = None, threshold: float | None = None
+    ) -> None:
+        self.interval: float = (
+            interval
+            if interval is not None
+            else CowrieConfig.getfloat("monitor", "lag_interval", fallback=1.0)
+        )
+        self.threshold: float = threshold if threshold is not None else slow_threshold
+        self._call: IDelayedCall | None = None
+        self._expected: float = 0.0
+        self._beat: float = 0.0
+        self._reactor_thread: int | None = None
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+
+    def startService(self) -> None:
+        service.Service.startService(self)
+        self._reactor_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._schedule()
+        if self.threshold > 0:
+            self._stop.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, name="cowrie-reactor-watchdog", daemon=True
+            )
+            self._watchdog.start()
+
+    def stopService(self) -> None:
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+        self._stop.set()
+        if self._watchdog is not None:
+            self._watchdog.join(1)
+            self._watchdog = None
+        service.Service.stopService(self)
+
+    def _schedule(self) -> None:
+        self._expected = time.monotonic() + self.interval
+        self._call = reactor.callLater(self.interval, self._tick)  # type: ignore[attr-defined]
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        self._beat = now
+        loop_lag.observe(max(0.0, now - self._expected))
+        self._schedule()
+
+    def _watch(self) -> None:
+        """
+        Runs in a separate thread. The reactor is considered blocked when
+        the heartbeat is more than `threshold` overdue.
+        """
+        blocked = False
+        step = min(self.threshold / 2, self.interval)
+        while not self._stop.wait(step):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue <= self.threshold:
+                blocked = False
+                continue
+            if blocked:
+                # still the same blocking episode
+                continue
+            blocked = True
+            frame = sys._current_frames().get(self._reactor_thread)  # type: ignore[arg-type]
+            if frame is None:
+                continue
+            self._report(frame, overdue)
+
+    def _report(self, frame: FrameType, overdue: float) -> None:
+        stack = traceback.extract_stack(frame)
+        sig = _signature(stack)
+        first = sig not in _reported
+        _reported.add(sig)
+        text = "".join(traceback.format_list(stack))
+        reactor.callFromThread(self._log_slow, overdue, text if first else None)  # type: ignore[attr-defined]
+
+    def _log_slow(self, overdue: float, text: str | None) -> None:
+        slow_callbacks.inc()
+        if text is not None:
+            log.msg(
+                f"Reactor blocked for more than {overdue:.3f}s "
+                f"(threshold {self.threshold}s) in:\n{text}"
+            )
@@ -39,7 +39,9 @@ from re import Pattern
 from twisted.internet import reactor
 from twisted.logger import formatTime
 
+from cowrie.core import monitor
 from cowrie.core.config import CowrieConfig
+from cowrie.core.metrics import metrics
 
 # Events:
 #  cowrie.client.fingerprint
@@ -64,6 +66,37 @@ from cowrie.core.config import CowrieConfig
 # in epoch format and in key 'timestamp' as a ISO compliant string
 # in UTC.
 
+WRITE_BUCKETS: tuple[float, ...] = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    5.0,
+)
+
+write_seconds = metrics.histogram(
+    "output_write_seconds", "Output plugin write() duration", WRITE_BUCKETS
+)
+events_total = metrics.counter(
+    "output_events_total", "Events written per output plugin"
+)
+errors_total = metrics.counter(
+    "output_errors_total", "Exceptions raised by output plugin write()"
+)
+dropped_total = metrics.counter(
+    "output_dropped_total", "Events dropped before write() per output plugin"
+)
+
 
 def convert(data):
     """
@@ -96,6 +129,7 @@ class Output(metaclass=abc.ABCMeta):
     def __init__(self) -> None:
         self.sessions: dict[str, str] = {}
         self.ips: dict[str, str] = {}
+        self.plugin_name: str = self.__class__.__module__.rsplit(".", 1)[-1]
 
         # Need these for each individual transport, or else the session numbers overlap
         self.sshRegex: Pattern[str] = re.compile(".*SSHTransport,([0-9]+),[0-9a-f:.]+$")
@@ -173,10 +207,12 @@ class Output(metaclass=abc.ABCMeta):
             and "session" not in event
             and "system" not in event
         ):
+            dropped_total.inc(plugin=self.plugin_name)
             return
 
         # Ignore anything without message
         if "message" not in event and "format" not in event:
+            dropped_total.inc(plugin=self.plugin_name)
             return
 
         ev: dict[str, any] = convert(event)  # type: ignore
@@ -210,6 +246,7 @@ class Output(metaclass=abc.ABCMeta):
                     if value == ev["session"]
                 )
             except StopIteration:
+                dropped_total.inc(plugin=self.plugin_name)
                 return
         # Extract session id from the twisted log prefix
         elif "system" in ev:
@@ -222,6 +259,7 @@ class Output(metaclass=abc.ABCMeta):
                 if sshmatch:
                     sessionno = f"S{sshmatch.groups()[0]}"
             if sessionno == "0":
+                dropped_total.inc(plugin=self.plugin_name)
                 return
         else:
             print(f"Can't determine sessionno: {ev!r}")  # noqa: T201
@@ -237,9 +275,62 @@ class Output(metaclass=abc.ABCMeta):
         else:
             ev["session"] = self.sessions[sessionno]
 
-        self.write(ev)
+        start = time.perf_counter()
+        try:
+            self.write(ev)
+        except Exception:
+            errors_total.inc(plugin=self.plugin_name)
+            raise
+        else:
+            events_total.inc(plugin=self.plugin_name)
+        finally:
+            elapsed = time.perf_counter() - start
+            write_seconds.observe(elapsed, plugin=self.plugin_name)
+            if elapsed > monitor.slow_threshold > 0:
+                monitor.report_slow_write(self.plugin_name, elapsed, self.write)
 
         # Disconnect is special, remove cached data
         if ev["eventid"] == "cowrie.session.closed":
             del self.sessions[sessionno]
             del self.ips[sessionno]
+
+
+def profile_report() -> str:
+    """
+    Ranked table of output plugin write() cost, most total time first
+    """
+    rows = []
+    for labels, h in write_seconds.samples():
+        plugin = labels["plugin"]
+        rows.append(
+            (
+                h.sum,
+                plugin,
+                events_total.values.get((("plugin", plugin),), 0),
+                errors_total.values.get((("plugin", plugin),), 0),
+                dropped_total.values.get((("plugin", plugin),), 0),
+                h.sum / h.count * 1000 if h.count else 0.0,
+                h.quantile(0.5) * 1000,
+                h.quantile(0.99) * 1000,
+            )
+        )
+    rows.sort(reverse=True)
+
+    lines = [
+        "{:<16} {:>10} {:>8} {:>8} {:>10} {:>10} {:>9} {:>9}".format(
+            "plugin",
+            "events",
+            "errors",
+            "dropped",
+            "total(s)",
+            "mean(ms)",
+            "p50(ms)",
+            "p99(ms)",
+        )
+    ]
+    for total, plugin, events, errors, dropped, mean, p50, p99 in rows:
+        lines.append(
+            f"{plugin:<16} {events:>10} {errors:>8} {dropped:>8} {total:>10.3f} "
+            f"{mean:>10.3f} {p50:>9.3f} {p99:>9.3f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,86 @@
+"""
+Token bucket scheduling for rate limited remote APIs.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, TYPE_CHECKING
+
+from twisted.internet import defer, reactor
+
+if TYPE_CHECKING:
+    from twisted.internet.interfaces import IDelayedCall, IReactorTime
+
+
+class TokenBucket:
+    """
+    Hand out `rate` tokens per `period` seconds with bursts of up to
+    `capacity`. acquire() returns a Deferred that fires when a token is
+    available. Waiters are served in order.
+
+    Example, the public VirusTotal API allows 4 requests per minute:
+
+        bucket = TokenBucket(4, 60)
+        yield bucket.acquire()
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        period: float = 1.0,
+        capacity: float | None = None,
+        clock: IReactorTime | None = None,
+    ) -> None:
+        self.rate: float = rate / period
+        self.capacity: float = capacity if capacity is not None else rate
+        self.clock: IReactorTime = clock if clock is not None else reactor  # type: ignore[assignment]
+        self.tokens: float = self.capacity
+        self._updated: float = self.clock.seconds()
+        self._waiters: deque[defer.Deferred[None]] = deque()
+        self._call: IDelayedCall | None = None
+
+    def __len__(self) -> int:
+        """
+        Number of callers waiting for a token
+        """
+        return len(self._waiters)
+
+    def _refill(self) -> None:
+        now = self.clock.seconds()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def acquire(self) -> defer.Deferred[None]:
+        d: defer.Deferred[None] = defer.Deferred(self._cancel)
+        self._waiters.append(d)
+        # Otherwise the pending timer serves the queue in order
+        if self._call is None:
+            self._drain()
+        return d
+
+    def _cancel(self, d: defer.Deferred[Any]) -> None:
+        try:
+            self._waiters.remove(d)
+        except ValueError:
+            pass
+
+    def _drain(self) -> None:
+        self._call = None
+        self._refill()
+        while self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            self._waiters.popleft().callback(None)
+        if self._waiters and self._call is None:
+            delay = (1 - self.tokens) / self.rate
+            self._call = self.clock.callLater(delay, self._drain)
+
+    def stop(self) -> None:
+        """
+        Cancel the refill timer, pending waiters never fire
+        """
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
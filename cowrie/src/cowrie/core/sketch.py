@@ -0,0 +1,187 @@
+"""
+Bounded-memory stream summaries.
+
+SpaceSaving keeps approximate counts for the heaviest hitters of a
+stream (Metwally, Agrawal, El Abbadi 2005) in a fixed number of slots.
+HyperLogLog estimates the number of distinct items in a stream
+(Flajolet et al. 2007) in a fixed number of registers.
+
+Both are used to keep the number of exported metric series constant
+no matter how many distinct source addresses, usernames or commands
+the honeypot sees.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable, Iterator
+
+
+class SpaceSaving:
+    """
+    Approximate top-K counter with at most `capacity` tracked keys.
+
+    Every key that occurs more than total/capacity times is guaranteed
+    to be tracked. A reported count overestimates the true count by
+    at most the reported error.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError
+        self.capacity: int = capacity
+        self.total: int = 0
+        self._counts: dict[Hashable, int] = {}
+        self._errors: dict[Hashable, int] = {}
+        # count -> keys with that count, insertion ordered
+        self._buckets: dict[int, dict[Hashable, None]] = {}
+        self._min: int = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._counts
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._counts)
+
+    def get(self, key: Hashable) -> int:
+        """
+        Return the estimated count for key, 0 if it is not tracked
+        """
+        return self._counts.get(key, 0)
+
+    def error(self, key: Hashable) -> int:
+        """
+        Return the maximum overestimation of the count for key
+        """
+        return self._errors.get(key, 0)
+
+    def add(self, key: Hashable, count: int = 1) -> None:
+        """
+        Add `count` occurrences of key
+        """
+        if count <= 0:
+            return
+        self.total += count
+
+        if key in self._counts:
+            old = self._counts[key]
+            self._unlink(key, old)
+            self._link(key, old + count)
+            return
+
+        if len(self._counts) < self.capacity:
+            self._errors[key] = 0
+            self._link(key, count)
+            return
+
+        # Evict the oldest key with the minimum count and take over its slot
+        bucket = self._buckets[self._min]
+        victim = next(iter(bucket))
+        floor = self._min
+        self._unlink(victim, floor)
+        del self._errors[victim]
+        self._errors[key] = floor
+        self._link(key, floor + count)
+
+    def top(self, n: int | None = None) -> list[tuple[Hashable, int, int]]:
+        """
+        Return up to n (key, count, error) tuples, highest count first
+        """
+        result: list[tuple[Hashable, int, int]] = []
+        for c in sorted(self._buckets, reverse=True):
+            for key in self._buckets[c]:
+                if n is not None and len(result) >= n:
+                    return result
+                result.append((key, c, self._errors[key]))
+        return result
+
+    def clear(self) -> None:
+        self.total = 0
+        self._counts.clear()
+        self._errors.clear()
+        self._buckets.clear()
+        self._min = 0
+
+    def _link(self, key: Hashable, c: int) -> None:
+        self._counts[key] = c
+        self._buckets.setdefault(c, {})[key] = None
+        if len(self._counts) == 1 or c < self._min:
+            self._min = c
+
+    def _unlink(self, key: Hashable, c: int) -> None:
+        del self._counts[key]
+        bucket = self._buckets[c]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[c]
+            if c == self._min and self._buckets:
+                self._min = min(self._buckets)
+
+
+class HyperLogLog:
+    """
+    Cardinality estimator using 2**precision one-byte registers.
+
+    The standard error is about 1.04 / sqrt(2**precision), so the
+    default precision of 14 gives roughly 0.8% in 16 KiB.
+    """
+
+    def __init__(self, precision: int = 14) -> None:
+        if not 4 <= precision <= 18:
+            raise ValueError
+        self.precision: int = precision
+        self.m: int = 1 << precision
+        self.registers: bytearray = bytearray(self.m)
+
+        if self.m == 16:
+            self._alpha = 0.673
+        elif self.m == 32:
+            self._alpha = 0.697
+        elif self.m == 64:
+            self._alpha = 0.709
+        else:
+            self._alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, item: str | bytes) -> None:
+        if isinstance(item, str):
+            item = item.encode("utf-8")
+        x = int.from_bytes(hashlib.blake2b(item, digest_size=8).digest(), "big")
+        idx = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def count(self) -> int:
+        """
+        Return the estimated number of distinct items added
+        """
+        total = 0.0
+        zeros = 0
+        for r in self.registers:
+            total += 2.0**-r
+            if r == 0:
+                zeros += 1
+        estimate = self._alpha * self.m * self.m / total
+        # Small range correction: fall back to linear counting
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return round(estimate)
+
+    def merge(self, other: HyperLogLog) -> None:
+        """
+        Merge other into this estimator, both must have the same precision
+        """
+        if other.precision != self.precision:
+            raise ValueError
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def clear(self) -> None:
+        self.registers = bytearray(self.m)
@@ -0,0 +1,177 @@
+"""
+Asynchronous sample submission for sandbox and sharing services.
+
+Output plugins that upload artifacts (Cuckoo, MalShare) hand each
+sample to a SubmissionQueue keyed by its SHA-256. Submissions of a
+sample already queued, in flight or recently submitted collapse into
+one, at most `concurrency` uploads run at a time and failed uploads are
+retried with exponential backoff. MultipartFile streams the file from
+disk instead of reading it into memory.
+
+Example:
+
+    queue = SubmissionQueue(concurrency=2, retries=3, backoff=10)
+    queue.submit(shasum, self.postfile, outfile, filename)
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import uuid
+from typing import Any, BinaryIO, TYPE_CHECKING
+
+from twisted.internet import defer, reactor, task
+from twisted.python import log
+from twisted.web.client import FileBodyProducer
+
+from cowrie.core.cache import Coalescer, LRUCache
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from twisted.internet.interfaces import IReactorTime
+
+
+class SubmissionError(Exception):
+    """
+    Raised by submit functions for failures worth retrying
+    """
+
+
+class SubmissionQueue:
+    """
+    Run submit functions for samples keyed by SHA-256, one per sample,
+    at most `concurrency` at a time, retrying failures `retries` times
+    after `backoff`, 2 * `backoff`, ... seconds.
+
+    The last `remember` successfully submitted keys are kept so later
+    sessions dropping the same sample do not submit it again.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        retries: int = 3,
+        backoff: float = 10.0,
+        remember: int = 10000,
+        clock: IReactorTime | None = None,
+    ) -> None:
+        self.semaphore = defer.DeferredSemaphore(concurrency)
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.clock: IReactorTime = clock if clock is not None else reactor  # type: ignore[assignment]
+        self.inflight = Coalescer()
+        self.submitted = LRUCache(remember)
+
+    def __contains__(self, shasum: str) -> bool:
+        """
+        True if the sample is queued, in flight or was submitted
+        """
+        return shasum in self.inflight or self._done(shasum)
+
+    def _done(self, shasum: str) -> bool:
+        return self.submitted.get(shasum)[0]  # type: ignore[no-any-return]
+
+    def submit(
+        self, shasum: str, f: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> defer.Deferred[Any]:
+        """
+        Submit a sample with f(*args, **kwargs) unless it already is.
+        Returns a Deferred firing with the result of f, or None for a
+        sample that was submitted before.
+        """
+        if self._done(shasum):
+            return defer.succeed(None)
+        return self.inflight.run(shasum, self._run, shasum, f, *args, **kwargs)
+
+    @defer.inlineCallbacks
+    def _run(
+        self, shasum: str, f: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Any:
+        delay = self.backoff
+        attempt = 0
+        while True:
+            try:
+                result = yield self.semaphore.run(f, *args, **kwargs)
+            except Exception as e:
+                if attempt >= self.retries:
+                    log.msg(f"Submission of {shasum} failed: {e!r}")
+                    raise
+                attempt += 1
+                log.msg(
+                    f"Submission of {shasum} failed: {e!r}, "
+                    f"retry {attempt}/{self.retries} in {delay}s"
+                )
+                yield task.deferLater(self.clock, delay, lambda: None)
+                delay *= 2
+            else:
+                self.submitted.set(shasum, True)
+                return result
+
+
+class _Concat:
+    """
+    Read from several file objects in turn
+    """
+
+    def __init__(self, *parts: BinaryIO) -> None:
+        self.parts = list(parts)
+
+    def read(self, size: int = -1) -> bytes:
+        while self.parts:
+            data = self.parts[0].read(size)
+            if data:
+                return data
+            self.parts.pop(0).close()
+        return b""
+
+    def close(self) -> None:
+        for part in self.parts:
+            part.close()
+        self.parts = []
+
+
+class MultipartFile(FileBodyProducer):
+    """
+    multipart/form-data body with one file field and optional text
+    fields, read from disk in chunks while it is sent. Pass it as
+    `data` to treq together with the `content_type` header.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        filename: str,
+        path: str,
+        fields: dict[str, str] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        boundary = uuid.uuid4().hex
+        self.content_type: bytes = f"multipart/form-data; boundary={boundary}".encode()
+        head = b""
+        for key, value in (fields or {}).items():
+            head += (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode()
+        quoted = filename.replace("\\", "\\\\").replace('"', '\\"')
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{quoted}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+        size = os.path.getsize(path)
+        super().__init__(
+            _Concat(io.BytesIO(head), open(path, "rb"), io.BytesIO(tail)),
+            **kwargs,
+        )
+        self.length = len(head) + size + len(tail)
+
+    def close(self) -> None:
+        """
+        Close the file, for requests that failed before sending it
+        """
+        self._inputFile.close()
@@ -10,53 +10,303 @@ Should be compatible with user mode linux
 from __future__ import annotations
 
 import hashlib
+import os
 import struct
+import zlib
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+from twisted.internet import reactor
+
+from cowrie.core.config import CowrieConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
 
 OP_OPEN, OP_CLOSE, OP_WRITE, OP_EXEC = 1, 2, 3, 4
 TYPE_INPUT, TYPE_OUTPUT, TYPE_INTERACT = 1, 2, 3
 TTYSTRUCT = "<iLiiLL"
 
+# Compressed container: MAGIC, then blocks of whole records, each a
+# BLOCKHEAD followed by the zlib compressed records, then an index of
+# INDEXENTRY per block and the FOOTER pointing back at the index
+MAGIC = b"COWRTTY\x01"
+BLOCKHEAD = "<IIdd"  # compressed size, raw size, first and last stamp
+INDEXENTRY = "<Qdd"  # block offset, first and last stamp
+FOOTER = "<QI4s"  # index offset, number of entries, INDEXMAGIC
+INDEXMAGIC = b"TTYX"
+BLOCKSIZE = 65536
 
-def ttylog_open(logfile: str, stamp: float) -> None:
+
+def compress_block(raw: bytes, first: float, last: float) -> bytes:
     """
-    Initialize new tty log
+    Block of the compressed container holding the records in raw
 
-    @param logfile: logfile name
-    @param stamp: timestamp
+    @param raw: whole records in the raw format
+    @param first: timestamp of the first record
+    @param last: timestamp of the last record
     """
-    with open(logfile, "ab") as f:
-        sec, usec = int(stamp), int(1000000 * (stamp - int(stamp)))
-        f.write(struct.pack(TTYSTRUCT, OP_OPEN, 0, 0, 0, sec, usec))
+    data = zlib.compress(raw)
+    return struct.pack(BLOCKHEAD, len(data), len(raw), first, last) + data
 
 
-def ttylog_write(
-    logfile: str, length: int, direction: int, stamp: float, data: bytes
-) -> None:
+def encode_index(entries: list[tuple[int, float, float]], offset: int) -> bytes:
     """
-    Write to tty log
+    Index and footer closing a compressed container
 
-    @param logfile: timestamp
-    @param length: length
-    @param direction: 0 or 1
-    @param stamp: timestamp
-    @param data: data
+    @param entries: (offset, first stamp, last stamp) of every block
+    @param offset: file offset the index is written at
     """
-    with open(logfile, "ab") as f:
-        sec, usec = int(stamp), int(1000000 * (stamp - int(stamp)))
-        f.write(struct.pack(TTYSTRUCT, OP_WRITE, 0, length, direction, sec, usec))
-        f.write(data)
+    index = b"".join(struct.pack(INDEXENTRY, *entry) for entry in entries)
+    return index + struct.pack(FOOTER, offset, len(entries), INDEXMAGIC)
 
 
-def ttylog_close(logfile: str, stamp: float) -> None:
+class TTYLogWriter:
     """
-    Close tty log
+    TTY log held open for the whole session. Records are buffered and
+    written out when the buffer reaches ttylog_buffer_size bytes,
+    ttylog_flush_interval seconds after the first buffered record, and
+    on close. A crash loses at most the records of one interval; set
+    ttylog_buffer_size = 0 to write every record immediately and
+    ttylog_fsync = true to also sync each write to disk.
 
-    @param logfile: logfile name
-    @param stamp: timestamp
+    With ttylog_compress = true every flush is written as one compressed
+    block of the container format and close appends the block index.
     """
-    with open(logfile, "ab") as f:
+
+    def __init__(self, logfile: str, stamp: float, clock: Any = None) -> None:
+        self.logfile: str = logfile
+        self.buffer_size: int = CowrieConfig.getint(
+            "honeypot", "ttylog_buffer_size", fallback=65536
+        )
+        self.flush_interval: float = CowrieConfig.getfloat(
+            "honeypot", "ttylog_flush_interval", fallback=1.0
+        )
+        self.fsync: bool = CowrieConfig.getboolean(
+            "honeypot", "ttylog_fsync", fallback=False
+        )
+        self.compress: bool = CowrieConfig.getboolean(
+            "honeypot", "ttylog_compress", fallback=False
+        )
+        self.clock = clock if clock is not None else reactor
+        self.buffer = bytearray()
+        self.closed: bool = False
+        # SHA-256 of everything but output, same as ttylog_inputhash()
+        self.inputhash = hashlib.sha256()
+        self._call: Any = None
+        # Time range of the buffered records and the block index
+        self.first: float = stamp
+        self.last: float = stamp
+        self.index: list[tuple[int, float, float]] = []
+        self.fd: int = os.open(logfile, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        self.offset: int = os.fstat(self.fd).st_size
+        if self.compress and self.offset == 0:
+            self._write(MAGIC)
+        self._record(OP_OPEN, 0, 0, stamp, b"")
+
+    def _record(
+        self, op: int, length: int, direction: int, stamp: float, data: bytes
+    ) -> None:
         sec, usec = int(stamp), int(1000000 * (stamp - int(stamp)))
-        f.write(struct.pack(TTYSTRUCT, OP_CLOSE, 0, 0, 0, sec, usec))
+        if not self.buffer:
+            self.first = stamp
+        self.last = stamp
+        self.buffer += struct.pack(TTYSTRUCT, op, 0, length, direction, sec, usec)
+        self.buffer += data
+        if data and not (op == OP_WRITE and direction == TYPE_OUTPUT):
+            self.inputhash.update(data)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+        elif self._call is None and self.flush_interval > 0:
+            self._call = self.clock.callLater(self.flush_interval, self.flush)
+
+    def write(self, length: int, direction: int, stamp: float, data: bytes) -> None:
+        """
+        Write to tty log
+
+        @param length: length
+        @param direction: TYPE_INPUT, TYPE_OUTPUT or TYPE_INTERACT
+        @param stamp: timestamp
+        @param data: data
+        """
+        if self.closed:
+            return
+        self._record(OP_WRITE, length, direction, stamp, data)
+
+    def flush(self) -> None:
+        if self._call is not None:
+            if self._call.active():
+                self._call.cancel()
+            self._call = None
+        if not self.buffer or self.closed:
+            return
+        data, self.buffer = self.buffer, bytearray()
+        if self.compress:
+            self.index.append((self.offset, self.first, self.last))
+            data = compress_block(data, self.first, self.last)
+        self._write(data)
+        if self.fsync:
+            os.fsync(self.fd)
+
+    def _write(self, data: bytes) -> None:
+        self.offset += len(data)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.fd, view) :]
+
+    def close(self, stamp: float) -> None:
+        """
+        Write the close record, flush and close the file
+
+        @param stamp: timestamp
+        """
+        if self.closed:
+            return
+        self._record(OP_CLOSE, 0, 0, stamp, b"")
+        self.flush()
+        if self.compress:
+            self._write(encode_index(self.index, self.offset))
+        self.closed = True
+        os.close(self.fd)
+
+    def hexdigest(self) -> str:
+        """
+        Hash of the input parts of the tty log written so far
+        """
+        return self.inputhash.hexdigest()
+
+
+def is_compressed(fd: BinaryIO) -> bool:
+    """
+    Whether the tty log open at fd is in the compressed container format
+    """
+    pos = fd.tell()
+    magic = fd.read(len(MAGIC))
+    fd.seek(pos)
+    return magic == MAGIC
+
+
+def read_index(fd: BinaryIO) -> list[tuple[int, float, float]]:
+    """
+    (offset, first stamp, last stamp) of every block of a compressed
+    tty log. Logs that were never closed have no index, their blocks
+    are found by walking the block headers up to the first truncated one.
+    """
+    fd.seek(0, os.SEEK_END)
+    end = fd.tell()
+    fsize = struct.calcsize(FOOTER)
+    esize = struct.calcsize(INDEXENTRY)
+    if end >= len(MAGIC) + fsize:
+        fd.seek(end - fsize)
+        offset, count, magic = struct.unpack(FOOTER, fd.read(fsize))
+        if magic == INDEXMAGIC and offset + count * esize == end - fsize:
+            fd.seek(offset)
+            return list(struct.iter_unpack(INDEXENTRY, fd.read(count * esize)))
+
+    entries: list[tuple[int, float, float]] = []
+    hsize = struct.calcsize(BLOCKHEAD)
+    offset = len(MAGIC)
+    while offset + hsize <= end:
+        fd.seek(offset)
+        csize, _rsize, first, last = struct.unpack(BLOCKHEAD, fd.read(hsize))
+        if offset + hsize + csize > end:
+            break
+        entries.append((offset, first, last))
+        offset += hsize + csize
+    return entries
+
+
+def _block_records(raw: bytes) -> Iterator[tuple[int, int, int, int, int, int, bytes]]:
+    ssize = struct.calcsize(TTYSTRUCT)
+    pos = 0
+    while pos + ssize <= len(raw):
+        op, tty, length, direction, sec, usec = struct.unpack_from(TTYSTRUCT, raw, pos)
+        pos += ssize
+        yield op, tty, length, direction, sec, usec, raw[pos : pos + length]
+        pos += length
+
+
+def ttylog_records(
+    fd: BinaryIO, offset: float = 0.0
+) -> Iterator[tuple[int, int, int, int, int, int, bytes]]:
+    """
+    Records (op, tty, length, direction, sec, usec, data) of a tty log
+    in either format
+
+    @param fd: tty log opened in binary mode
+    @param offset: skip records earlier than this many seconds after the
+                   first one. Compressed logs skip whole blocks unread.
+    """
+    if is_compressed(fd):
+        hsize = struct.calcsize(BLOCKHEAD)
+        index = read_index(fd)
+        start = index[0][1] + offset if index else 0.0
+        for pos, _first, last in index:
+            if last < start:
+                continue
+            fd.seek(pos)
+            csize, _rsize, _first, _last = struct.unpack(BLOCKHEAD, fd.read(hsize))
+            for record in _block_records(zlib.decompress(fd.read(csize))):
+                if not offset or record[4] + record[5] / 1000000 >= start:
+                    yield record
+        return
+
+    ssize = struct.calcsize(TTYSTRUCT)
+    start = None
+    while 1:
+        try:
+            op, tty, length, direction, sec, usec = struct.unpack(
+                TTYSTRUCT, fd.read(ssize)
+            )
+            data = fd.read(length)
+        except struct.error:
+            break
+        if start is None:
+            start = sec + usec / 1000000 + offset
+        if not offset or sec + usec / 1000000 >= start:
+            yield op, tty, length, direction, sec, usec, data
+
+
+def ttylog_convert(src: BinaryIO, dst: BinaryIO, compress: bool = True) -> None:
+    """
+    Copy a tty log in either format to dst, compressed into blocks of
+    about BLOCKSIZE bytes or in the raw format
+
+    @param src: tty log opened for reading
+    @param dst: file opened for writing
+    @param compress: write the compressed container format
+    """
+    index: list[tuple[int, float, float]] = []
+    raw = bytearray()
+    first = last = 0.0
+    written = 0
+
+    def emit() -> None:
+        nonlocal raw, written
+        if not raw:
+            return
+        index.append((written, first, last))
+        block = compress_block(raw, first, last)
+        dst.write(block)
+        written += len(block)
+        raw = bytearray()
+
+    if compress:
+        dst.write(MAGIC)
+        written = len(MAGIC)
+    for op, tty, length, direction, sec, usec, data in ttylog_records(src):
+        record = struct.pack(TTYSTRUCT, op, tty, length, direction, sec, usec) + data
+        if not compress:
+            dst.write(record)
+            continue
+        if not raw:
+            first = sec + usec / 1000000
+        last = sec + usec / 1000000
+        raw += record
+        if len(raw) >= BLOCKSIZE:
+            emit()
+    if compress:
+        emit()
+        dst.write(encode_index(index, written))
 
 
 def ttylog_inputhash(logfile: str) -> str:
@@ -65,28 +315,13 @@ def ttylog_inputhash(logfile: str) -> str:
 
     @param logfile: logfile name
     """
-    ssize: int = struct.calcsize(TTYSTRUCT)
-    inputbytes: bytes = b""
+    inputhash = hashlib.sha256()
 
     with open(logfile, "rb") as fd:
-        while 1:
-            try:
-                op: int
-                _tty: int
-                length: int
-                direction: int
-                _sec: int
-                _usec: int
-                op, _tty, length, direction, _sec, _usec = struct.unpack(
-                    TTYSTRUCT, fd.read(ssize)
-                )
-                data: bytes = fd.read(length)
-            except struct.error:
-                break
-
+        for op, _tty, _length, direction, _sec, _usec, data in ttylog_records(fd):
             if op is OP_WRITE and direction is TYPE_OUTPUT:
                 continue
-            inputbytes = inputbytes + data
+            inputhash.update(data)
 
-        shasum: str = hashlib.sha256(inputbytes).hexdigest()
+        shasum: str = inputhash.hexdigest()
         return shasum
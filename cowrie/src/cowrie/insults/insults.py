@@ -3,19 +3,23 @@
 
 from __future__ import annotations
 
-import hashlib
 import os
 import time
-from typing import Any
+from collections import deque
+from typing import Any, TYPE_CHECKING
 
 from twisted.conch.insults import insults
+from twisted.internet import reactor
 from twisted.internet.protocol import connectionDone
 from twisted.python import failure, log
 
-from cowrie.core import ttylog
+from cowrie.core import artifact, ttylog
 from cowrie.core.config import CowrieConfig
 from cowrie.shell import protocol
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
 
 class LoggingServerProtocol(insults.ServerProtocol):
     """
@@ -28,10 +32,20 @@ class LoggingServerProtocol(insults.ServerProtocol):
     bytesReceivedLimit: int = CowrieConfig.getint(
         "honeypot", "download_limit_size", fallback=0
     )
+    # Bytes per second sent to the client, 0 for no limit
+    outputRateLimit: int = CowrieConfig.getint(
+        "honeypot", "output_rate_limit", fallback=0
+    )
+    # Most bytes queued for the client, output written past it is dropped
+    # but logged. 0 for no limit
+    outputBufferLimit: int = CowrieConfig.getint(
+        "honeypot", "output_buffer_limit", fallback=0
+    )
 
     def __init__(self, protocolFactory=None, *a, **kw):
         self.type: str
         self.ttylogFile: str
+        self.ttylogWriter: ttylog.TTYLogWriter
         self.ttylogSize: int = 0
         self.bytesSent: int = 0
         self.bytesReceived: int = 0
@@ -43,6 +57,20 @@ class LoggingServerProtocol(insults.ServerProtocol):
         self.transport: Any
         self.startTime: float
         self.stdinlogFile: str
+        # Writes made within one reactor iteration are sent to the client
+        # and logged as one
+        self.clock: Any = reactor
+        # Queued writes, outputOffset bytes of the first one are sent and
+        # the first outputLogged bytes queued are in the ttylog already
+        self.outputBuffer: deque[bytes] = deque()
+        self.outputOffset: int = 0
+        self.outputBuffered: int = 0
+        self.outputLogged: int = 0
+        self.outputDropped: int = 0
+        self.outputCall: Any = None
+        self.outputBudget: float = self.outputRateLimit
+        self.outputTime: float = 0.0
+        self.whenFlushed: list[tuple[Callable[..., None], tuple[Any, ...]]] = []
 
         insults.ServerProtocol.__init__(self, protocolFactory, *a, **kw)
 
@@ -68,7 +96,7 @@ class LoggingServerProtocol(insults.ServerProtocol):
                 channelId,
                 self.type,
             )
-            ttylog.ttylog_open(self.ttylogFile, self.startTime)
+            self.ttylogWriter = ttylog.TTYLogWriter(self.ttylogFile, self.startTime)
             self.ttylogOpen = True
             self.ttylogSize = 0
 
@@ -84,8 +112,8 @@ class LoggingServerProtocol(insults.ServerProtocol):
             # log the command into ttylog
             if self.ttylogEnabled:
                 (sess, cmd) = self.protocolArgs
-                ttylog.ttylog_write(
-                    self.ttylogFile, len(cmd), ttylog.TYPE_INTERACT, time.time(), cmd
+                self.ttylogWriter.write(
+                    len(cmd), ttylog.TYPE_INTERACT, time.time(), cmd
                 )
         else:
             self.stdinlogOpen = False
@@ -96,14 +124,133 @@ class LoggingServerProtocol(insults.ServerProtocol):
             self.terminalProtocol.execcmd.encode("utf8")
 
     def write(self, data: bytes) -> None:
-        self.bytesSent += len(data)
-        if self.ttylogEnabled and self.ttylogOpen:
-            ttylog.ttylog_write(
-                self.ttylogFile, len(data), ttylog.TYPE_OUTPUT, time.time(), data
+        dropped = b""
+        if self.outputBufferLimit:
+            room = max(self.outputBufferLimit - self.outputBuffered, 0)
+            if len(data) > room:
+                if not self.outputDropped:
+                    log.msg(
+                        f"Output buffer full, dropping output over {self.outputBufferLimit} bytes"
+                    )
+                data, dropped = data[:room], data[room:]
+                self.outputDropped += len(dropped)
+        if data:
+            self.bytesSent += len(data)
+            self.outputBuffer.append(data)
+            self.outputBuffered += len(data)
+            if self.outputCall is None:
+                self.outputCall = self.clock.callLater(0, self.flushOutput)
+        if dropped:
+            # The ttylog keeps the dropped output, after what is queued
+            self.logQueued()
+            self.logOutput(dropped)
+
+    def outputFull(self) -> bool:
+        """
+        True when no more output can be queued for the client. Commands
+        that keep writing should wait until it has been sent.
+        """
+        return bool(self.outputBufferLimit) and (
+            self.outputBuffered >= self.outputBufferLimit
+        )
+
+    def takeOutput(self, size: int) -> bytes:
+        """
+        Remove the first size bytes of the queued output. Only the bytes
+        taken are copied, however the writes were split.
+        """
+        chunks: list[bytes | memoryview] = []
+        self.outputBuffered -= size
+        while size:
+            head = self.outputBuffer[0]
+            end = self.outputOffset + size
+            if end < len(head):
+                chunks.append(memoryview(head)[self.outputOffset : end])
+                self.outputOffset = end
+                break
+            self.outputBuffer.popleft()
+            if self.outputOffset:
+                chunks.append(memoryview(head)[self.outputOffset :])
+            else:
+                chunks.append(head)
+            size = end - len(head)
+            self.outputOffset = 0
+        return b"".join(chunks)
+
+    def logQueued(self) -> None:
+        """
+        Log the queued output that is not in the ttylog yet
+        """
+        need = self.outputBuffered - self.outputLogged
+        if not need:
+            return
+        self.outputLogged = self.outputBuffered
+        chunks: list[bytes | memoryview] = []
+        for chunk in reversed(self.outputBuffer):
+            if len(chunk) >= need:
+                chunks.append(memoryview(chunk)[len(chunk) - need :])
+                break
+            chunks.append(chunk)
+            need -= len(chunk)
+        self.logOutput(b"".join(reversed(chunks)))
+
+    def flushOutput(self) -> None:
+        """
+        Send and log the writes buffered since the last flush, as far as
+        the output rate limit allows
+        """
+        self.outputCall = None
+        size = self.outputBuffered
+
+        if self.outputRateLimit:
+            now = self.clock.seconds()
+            self.outputBudget = min(
+                self.outputBudget + (now - self.outputTime) * self.outputRateLimit,
+                self.outputRateLimit,
             )
+            self.outputTime = now
+            size = min(size, max(int(self.outputBudget), 0))
+            self.outputBudget -= size
+            rest = self.outputBuffered - size
+            if rest:
+                self.outputCall = self.clock.callLater(
+                    min(rest, self.outputRateLimit) / self.outputRateLimit,
+                    self.flushOutput,
+                )
+
+        data = self.takeOutput(size)
+        logged = min(self.outputLogged, size)
+        self.outputLogged -= logged
+        if data:
+            if logged < len(data):
+                self.logOutput(data[logged:])
+            insults.ServerProtocol.write(self, data)
+
+        if not self.outputBuffered:
+            self.outputDropped = 0
+            whenFlushed, self.whenFlushed = self.whenFlushed, []
+            for f, args in whenFlushed:
+                f(*args)
+
+    def logOutput(self, data: bytes) -> None:
+        if self.ttylogEnabled and self.ttylogOpen:
+            self.ttylogWriter.write(len(data), ttylog.TYPE_OUTPUT, time.time(), data)
             self.ttylogSize += len(data)
 
-        insults.ServerProtocol.write(self, data)
+    def afterOutput(self, f: Callable[..., None], *args: Any) -> None:
+        """
+        Call f once the buffered output has been sent
+        """
+        if self.outputCall is None:
+            f(*args)
+        else:
+            self.whenFlushed.append((f, args))
+
+    def processEnded(self, reason: failure.Failure) -> None:
+        """
+        End the session after its output
+        """
+        self.afterOutput(self.transport.processEnded, reason)
 
     def dataReceived(self, data: bytes) -> None:
         """
@@ -116,12 +263,9 @@ class LoggingServerProtocol(insults.ServerProtocol):
             return
 
         if self.stdinlogOpen:
-            with open(self.stdinlogFile, "ab") as f:
-                f.write(data)
+            self.terminalProtocol.captures.open(self.stdinlogFile).write(data)
         elif self.ttylogEnabled and self.ttylogOpen:
-            ttylog.ttylog_write(
-                self.ttylogFile, len(data), ttylog.TYPE_INPUT, time.time(), data
-            )
+            self.ttylogWriter.write(len(data), ttylog.TYPE_INPUT, time.time(), data)
 
         insults.ServerProtocol.dataReceived(self, data)
 
@@ -136,24 +280,43 @@ class LoggingServerProtocol(insults.ServerProtocol):
         """
         Override super to remove the terminal reset on logout
         """
-        self.transport.loseConnection()
+        self.afterOutput(self.transport.loseConnection)
+
+    def captureShasum(self, path: str) -> str:
+        """
+        SHA-256 of a stdin or redirect capture, as hashed while it was
+        written when possible
+        """
+        if self.terminalProtocol is not None:
+            shasum = self.terminalProtocol.captures.hexdigest(path)
+            if shasum:
+                return shasum
+        return artifact.sha256_file(path)
 
     def connectionLost(self, reason: failure.Failure = connectionDone) -> None:
         """
         FIXME: this method is called 4 times on logout....
         it's called once from Avatar.closed() if disconnected
         """
+        # Output still buffered can't be sent anymore, but is logged
+        if self.outputCall is not None:
+            self.outputCall.cancel()
+            self.outputCall = None
+            self.logQueued()
+            self.outputBuffer.clear()
+            self.outputOffset = self.outputBuffered = self.outputLogged = 0
+            self.whenFlushed = []
+
+        # Write out the captures still open before they are stored
+        if self.terminalProtocol is not None:
+            self.terminalProtocol.captures.close_all()
+
         if self.stdinlogOpen:
             try:
-                with open(self.stdinlogFile, "rb") as f:
-                    shasum = hashlib.sha256(f.read()).hexdigest()
-                    shasumfile = os.path.join(self.downloadPath, shasum)
-                    if os.path.exists(shasumfile):
-                        os.remove(self.stdinlogFile)
-                        duplicate = True
-                    else:
-                        os.rename(self.stdinlogFile, shasumfile)
-                        duplicate = False
+                shasum = self.captureShasum(self.stdinlogFile)
+                shasumfile, duplicate = artifact.store(
+                    self.stdinlogFile, shasum, self.downloadPath
+                )
 
                 log.msg(
                     eventid="cowrie.session.file_download",
@@ -185,15 +348,10 @@ class LoggingServerProtocol(insults.ServerProtocol):
                         os.remove(rf)
                         continue
 
-                    with open(rf, "rb") as f:
-                        shasum = hashlib.sha256(f.read()).hexdigest()
-                        shasumfile = os.path.join(self.downloadPath, shasum)
-                        if os.path.exists(shasumfile):
-                            os.remove(rf)
-                            duplicate = True
-                        else:
-                            os.rename(rf, shasumfile)
-                            duplicate = False
+                    shasum = self.captureShasum(rf)
+                    shasumfile, duplicate = artifact.store(
+                        rf, shasum, self.downloadPath
+                    )
                     log.msg(
                         eventid="cowrie.session.file_download",
                         format="Saved redir contents with SHA-256 %(shasum)s to %(outfile)s",
@@ -207,9 +365,9 @@ class LoggingServerProtocol(insults.ServerProtocol):
             self.redirFiles.clear()
 
         if self.ttylogEnabled and self.ttylogOpen:
-            ttylog.ttylog_close(self.ttylogFile, time.time())
+            self.ttylogWriter.close(time.time())
             self.ttylogOpen = False
-            shasum = ttylog.ttylog_inputhash(self.ttylogFile)
+            shasum = self.ttylogWriter.hexdigest()
             shasumfile = os.path.join(self.ttylogPath, shasum)
 
             if os.path.exists(shasumfile):
@@ -31,10 +31,13 @@ spammers, and abusive activity on the internet." <https://www.abuseipdb.com/>
 from __future__ import annotations
 
 __author__ = "Benjamin Stephens"
-__version__ = "0.3b3"
+__version__ = "0.4b1"
 
+import heapq
+import json
+import os
 import pickle
-from collections import deque
+import threading
 from datetime import datetime
 from json.decoder import JSONDecodeError
 from pathlib import Path
@@ -50,11 +53,20 @@ from twisted.web import http
 from cowrie.core import output
 from cowrie.core.config import CowrieConfig
 
-# How often we clean and dump and our lists/dict...
+# How often we expire entries and dump changes to disk...
 CLEAN_DUMP_SCHED = 600
-# ...and the file we dump to.
+# ...the snapshot and journal files we dump to...
+SNAPSHOT_FILE: str = "aipdb.json"
+JOURNAL_FILE: str = "aipdb.journal"
+# ...and the pickle dump written by versions before 0.4, migrated on start.
 DUMP_FILE: str = "aipdb.dump"
 
+# tolerance_window is split into this many counting buckets per IP, so an
+# attempt is forgotten up to tolerance_window / WINDOW_BUCKETS late.
+WINDOW_BUCKETS = 12
+# Resolution of the expiry timer wheel in seconds.
+WHEEL_TICK = 60
+
 ABUSEIP_URL = "https://api.abuseipdb.com/api/v2/report"
 # AbuseIPDB will just 429 us if we report an IP too often; currently 15 minutes
 # (900 seconds); set lower limit here to protect againt bad user input.
@@ -67,64 +79,38 @@ class Output(output.Output):
             "output_abuseipdb", "tolerance_attempts", fallback=10
         )
         self.state_path = Path(CowrieConfig.get("output_abuseipdb", "dump_path"))
-        self.state_dump = self.state_path / DUMP_FILE
 
-        self.logbook = LogBook(self.tolerance_attempts, self.state_dump)
+        if not self.state_path.exists():
+            # If we don't already have an abuseipdb directory, let's make
+            # one with the necessary permissions now.
+            self.state_path.mkdir(mode=0o700, parents=False, exist_ok=False)
+
+        self.logbook = LogBook(self.tolerance_attempts, self.state_path)
         # Pass our instance of LogBook() to Reporter() so we don't end up
         # working with different records.
         self.reporter = Reporter(self.logbook, self.tolerance_attempts)
 
         # We store the LogBook state any time a shutdown occurs. The rest of
         # our start-up is just for loading and cleaning the previous state
-        try:
-            with open(self.state_dump, "rb") as f:
-                self.logbook.update(pickle.load(f))
-
-            # Check to see if we're still asleep after receiving a Retry-After
-            # header in a previous response
-            if self.logbook["sleeping"]:
-                t_wake: float = self.logbook["sleep_until"]
-                t_now: float = time()
-                if t_wake > t_now:
-                    # If we're meant to be asleep, we'll set logbook.sleep to
-                    # true and logbook.sleep_until to the time we can wake-up
-                    self.logbook.sleeping = True
-                    self.logbook.sleep_until = t_wake
-                    # and we set an alarm so the reactor knows when he can drag
-                    # us back out of bed
-                    reactor.callLater(t_wake - t_now, self.logbook.wakeup)
-
-            del self.logbook["sleeping"]
-            del self.logbook["sleep_until"]
-            tolerated = self.logbook.pop("tolerated")
-
-        except (pickle.UnpicklingError, FileNotFoundError, KeyError):
-            if self.state_path.exists():
-                pass
+        self.logbook.load()
+
+        # Check to see if we're still asleep after receiving a Retry-After
+        # header in a previous response
+        if self.logbook.sleeping:
+            t_now: float = time()
+            if self.logbook.sleep_until > t_now:
+                # and we set an alarm so the reactor knows when he can drag
+                # us back out of bed
+                reactor.callLater(self.logbook.sleep_until - t_now, self.logbook.wakeup)
             else:
-                # If we don't already have an abuseipdb directory, let's make
-                # one with the necessary permissions now.
-                Path(self.state_path).mkdir(mode=0o700, parents=False, exist_ok=False)
+                self.logbook.sleeping = False
+                self.logbook.sleep_until = 0.0
 
         # And we do a clean-up to make sure that we're not carrying any expired
         # entries. The clean-up task ends by calling itself in a callLater,
         # thus running every CLEAN_DUMP_SCHED seconds until the end of time.
         self.logbook.cleanup_and_dump_state()
 
-        # If tolerance_attempts > the previous setting, we need to change the
-        # maximum length of the deque for any previously seen IP that we're
-        # loading, otherwise we'd potentially have IPs that may never trigger
-        # a report
-        try:
-            if tolerated != self.tolerance_attempts:
-                for k in self.logbook:
-                    if self.logbook[k].__class__() == deque():
-                        self.logbook[k] = deque(
-                            [*self.logbook[k]], maxlen=self.tolerance_attempts
-                        )
-        except UnboundLocalError:
-            pass
-
         log.msg(
             eventid="cowrie.abuseipdb.started",
             format=f"AbuseIPDB Plugin version {__version__} started. Currently in beta.",
@@ -146,57 +132,113 @@ class Output(output.Output):
                 self.tolerant_observer(event["src_ip"], time())
 
     def intolerant_observer(self, ip, t, uname):
-        # Checks if already reported; if yes, checks if we can rereport yet.
-        # The entry for a reported IP is a tuple (None, time_reported). If IP
-        # is not already in logbook, reports it immediately
-        if ip in self.logbook:
-            if self.logbook.can_rereport(ip, t):
-                self.reporter.report_ip_single(ip, t, uname)
-            else:
-                return
-        else:
-            self.reporter.report_ip_single(ip, t, uname)
+        # Reports the IP immediately unless it was reported less than
+        # rereport_after ago.
+        if ip in self.logbook and not self.logbook.can_rereport(ip, t):
+            return
+        self.reporter.report_ip_single(ip, t, uname)
 
     def tolerant_observer(self, ip, t):
-        # Appends the time an IP was seen to it's list in logbook. Once the
-        # length of the list equals tolerance_attempts, the IP is reported.
-        if ip in self.logbook:
-            try:
-                if self.logbook[ip][0]:
-                    # Evaluates true if IP not already reported. If reported,
-                    # logbook entry is of the form (None, time_reported).
-                    self.logbook[ip].append(t)
-                    self.logbook.clean_expired_timestamps(ip, t)
-
-                    if len(self.logbook[ip]) >= self.tolerance_attempts:
-                        self.reporter.report_ip_multiple(ip)
+        # Counts the attempt in the IP's time buckets. Once the attempts
+        # within tolerance_window reach tolerance_attempts, the IP is
+        # reported.
+        record = self.logbook.attempt(ip, t)
+        if record is not None and record.count() >= self.tolerance_attempts:
+            self.reporter.report_ip_multiple(ip)
 
-                elif self.logbook.can_rereport(ip, t):
-                    # Check if reported IP is ready for re-reporting
-                    self.logbook[ip] = deque([t], maxlen=self.tolerance_attempts)
 
-                else:
-                    return
-
-            except IndexError:
-                # If IP address was in logbook but had no entries then we're
-                # fine to re-report.
-                self.logbook[ip].append(t)
+class IPRecord:
+    """
+    Login attempts for one IP, counted per bucket of bucket_width seconds.
+    A reported IP only keeps the time it was reported.
+    """
 
-        else:
-            self.logbook[ip] = deque([t], maxlen=self.tolerance_attempts)
+    __slots__ = ("buckets", "first", "last", "reported", "slot")
+
+    def __init__(self) -> None:
+        # bucket number -> attempts, bucket number is int(t // bucket_width)
+        self.buckets: dict[int, int] = {}
+        self.first: float = 0.0
+        self.last: float = 0.0
+        self.reported: float = 0.0
+        # Timer wheel slot this record is scheduled in, -1 for none
+        self.slot: int = -1
+
+    def count(self) -> int:
+        return sum(self.buckets.values())
+
+    def to_list(self) -> list:
+        return [self.first, self.last, self.reported, list(self.buckets.items())]
+
+    @classmethod
+    def from_list(cls, data: list, scale: float = 1.0) -> IPRecord:
+        """
+        Build a record from to_list() output. `scale` converts bucket
+        numbers written with a different bucket width.
+        """
+        record = cls()
+        record.first, record.last, record.reported = data[0], data[1], data[2]
+        for bucket, n in data[3]:
+            bucket = int(bucket * scale)
+            record.buckets[bucket] = record.buckets.get(bucket, 0) + n
+        return record
+
+
+class TimerWheel:
+    """
+    Keys grouped into slots of `tick` seconds by expiry time. expire()
+    only visits slots that are due, so the cost of a clean-up depends on
+    the number of expiring entries instead of the number of entries.
 
+    Rescheduling a key does not remove it from its old slot; callers
+    remember the current slot of a key and skip stale ones.
+    """
 
-class LogBook(dict):
+    def __init__(self, tick: float) -> None:
+        self.tick: float = tick
+        self.slots: dict[int, set[str]] = {}
+        self._due: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def schedule(self, key: str, when: float) -> int:
+        slot = int(when // self.tick)
+        keys = self.slots.get(slot)
+        if keys is None:
+            keys = self.slots[slot] = set()
+            heapq.heappush(self._due, slot)
+        keys.add(key)
+        return slot
+
+    def expire(self, now: float) -> list[tuple[int, str]]:
+        """
+        Remove and return (slot, key) for all slots ending before now
+        """
+        result: list[tuple[int, str]] = []
+        current = int(now // self.tick)
+        while self._due and self._due[0] < current:
+            slot = heapq.heappop(self._due)
+            result.extend((slot, key) for key in self.slots.pop(slot))
+        return result
+
+
+class LogBook:
     """
-    Dictionary class with methods for cleaning and dumping its state.
+    Per IP attempt counters, expired by a timer wheel, with methods for
+    dumping their state.
+
+    State is kept on disk as a JSON snapshot plus a journal of records
+    changed since. Every CLEAN_DUMP_SCHED seconds the changed records are
+    appended to the journal, and the journal is folded into the snapshot
+    once it outgrows it. File IO runs in a thread.
 
     This class should be treated as global state. For the moment this is
     achieved simply by passing the instance created by Output() directly to
     Reporter(). Sharing is caring.
     """
 
-    def __init__(self, tolerance_attempts, state_dump):
+    def __init__(self, tolerance_attempts, state_path):
         self.sleeping = False
         self.sleep_until: float = 0.0
         self.tolerance_attempts = tolerance_attempts
@@ -208,12 +250,28 @@ class LogBook(dict):
         )
         if self.rereport_after < REREPORT_MINIMUM:
             self.rereport_after = REREPORT_MINIMUM
-        self.state_dump = state_dump
-        # To write our dump to disk we have a method we call in a thread so we
-        # don't block if we get slow io. This is a cheap hack to get a lock on
-        # the file. See self.write_dump_file()
-        self._writing = False
-        super().__init__()
+        self.bucket_width: float = max(1.0, self.tolerance_window / WINDOW_BUCKETS)
+
+        self.state_path = Path(state_path)
+        self.snapshot_file = self.state_path / SNAPSHOT_FILE
+        self.journal_file = self.state_path / JOURNAL_FILE
+
+        self.records: dict[str, IPRecord] = {}
+        self.wheel = TimerWheel(WHEEL_TICK)
+        # IPs changed or deleted since the last dump
+        self.dirty: set[str] = set()
+        self.journal_length: int = 0
+        # Serializes the dump writers running in the thread pool
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, ip):
+        return ip in self.records
+
+    def __getitem__(self, ip):
+        return self.records[ip]
 
     def wakeup(self):
         # This is the method we pass in a callLater() before we go to sleep.
@@ -226,56 +284,101 @@ class LogBook(dict):
             "Retry-After header in previous response.",
         )
 
-    def clean_expired_timestamps(self, ip_key, current_time):
-        # Performs popleft() if leftmost timestamp has expired. Continues doing
-        # so until either; 1) a timestamp within our reporting window is
-        # reached, or; 2) the list is empty.
-        while self[ip_key]:
-            if not self[ip_key][0]:
-                break
-            elif self[ip_key][0] < current_time - self.tolerance_window:
-                self[ip_key].popleft()
-            else:
-                break
+    def _schedule(self, ip, record):
+        # A counting record is done once its newest bucket leaves the
+        # window, a reported one once it may be re-reported.
+        if record.reported:
+            when = record.reported + self.rereport_after
+        else:
+            when = (max(record.buckets) + WINDOW_BUCKETS + 1) * self.bucket_width
+        # Most attempts land in the slot the record is already in
+        if int(when // self.wheel.tick) != record.slot:
+            record.slot = self.wheel.schedule(ip, when)
+
+    def _put(self, ip, record):
+        self.records[ip] = record
+        self.dirty.add(ip)
+        self._schedule(ip, record)
+
+    def _delete(self, ip):
+        del self.records[ip]
+        self.dirty.add(ip)
+
+    def clean_expired_buckets(self, record, current_time):
+        # Drops buckets that have left tolerance_window. The first attempt
+        # time is moved up to the start of the oldest remaining bucket.
+        oldest = int(current_time // self.bucket_width) - WINDOW_BUCKETS
+        for bucket in [b for b in record.buckets if b <= oldest]:
+            del record.buckets[bucket]
+        if record.buckets:
+            record.first = max(record.first, min(record.buckets) * self.bucket_width)
+
+    def attempt(self, ip, t):
+        """
+        Count a login attempt. Returns the IP's record, or None when the
+        IP was reported and can not be re-reported yet.
+        """
+        record = self.records.get(ip)
+        if record is not None and record.reported:
+            if not self.can_rereport(ip, t):
+                return None
+            record = None
+
+        if record is None:
+            record = IPRecord()
+            record.first = t
+        else:
+            self.clean_expired_buckets(record, t)
+            if not record.buckets:
+                record.first = t
 
-    def find_and_delete_empty_entries(self):
-        # Search and destroy method. Iterates over dict, appends k to delete_me
-        # where v is an empty list.
-        delete_me = []
-        for k in self:
-            if not self[k]:
-                delete_me.append(k)
-        self.delete_entries(delete_me)
+        bucket = int(t // self.bucket_width)
+        record.buckets[bucket] = record.buckets.get(bucket, 0) + 1
+        record.last = t
+        self._put(ip, record)
+        return record
 
-    def delete_entries(self, delete_me):
-        for i in delete_me:
-            del self[i]
+    def mark_reported(self, ip, t):
+        record = IPRecord()
+        record.reported = t
+        self._put(ip, record)
 
     def can_rereport(self, ip_key, current_time):
         # Checks if an IP in the logbook that has already been reported is
-        # ready to be re-reported again.
-        try:
-            if current_time > self[ip_key][1] + self.rereport_after:
-                return True
-
-            elif self[ip_key][0] and self.tolerance_attempts <= 1:
-                # If we were previously running with a tolerance_attempts > 1
-                # and have been been restarted with tolerance_attempts <= 1,
-                # we could still be carrying some logs which would evaluate as
-                # false in our first test. Reported IPs will still evaluate
-                # false here.
-                return True
-
-            else:
-                return False
-
-        except IndexError:
+        # ready to be re-reported again. IPs that were only counted, e.g.
+        # before a restart with tolerance_attempts <= 1, can be reported.
+        record = self.records[ip_key]
+        if not record.reported:
             return True
+        return current_time > record.reported + self.rereport_after
+
+    def expire(self, current_time):
+        # Visits the IPs whose timer wheel slot is due. Entries that were
+        # rescheduled since are skipped, entries with attempts left in the
+        # window are rescheduled.
+        for slot, ip in self.wheel.expire(current_time):
+            record = self.records.get(ip)
+            if record is None or record.slot != slot:
+                continue
+            record.slot = -1
+            if record.reported:
+                if self.can_rereport(ip, current_time):
+                    self._delete(ip)
+                else:
+                    self._schedule(ip, record)
+                continue
+            self.clean_expired_buckets(record, current_time)
+            if record.buckets:
+                self._schedule(ip, record)
+                self.dirty.add(ip)
+            else:
+                self._delete(ip)
 
     def cleanup_and_dump_state(self, mode=0):
-        # Runs a full clean-up of logbook. Re-calls itself in CLEAN_DUMP_SCHED
-        # seconds. MODES: 0) Normal looping task, and; 1) Sleep/Stop mode;
-        # cancels any scheduled callLater() and doesn't recall itself.
+        # Expires due entries and dumps changes. Re-calls itself in
+        # CLEAN_DUMP_SCHED seconds. MODES: 0) Normal looping task, and;
+        # 1) Sleep/Stop mode; cancels any scheduled callLater() and doesn't
+        # recall itself.
         if mode == 1:
             try:
                 self.recall.cancel()
@@ -287,14 +390,7 @@ class LogBook(dict):
         else:
             t = time()
 
-        delete_me = []
-        for k in self:
-            if self.can_rereport(k, t):
-                delete_me.append(k)
-            self.clean_expired_timestamps(k, t)
-        self.delete_entries(delete_me)
-
-        self.find_and_delete_empty_entries()
+        self.expire(t)
 
         self.dump_state()
 
@@ -303,36 +399,126 @@ class LogBook(dict):
                 CLEAN_DUMP_SCHED, self.cleanup_and_dump_state
             )
 
-    def dump_state(self):
-        dump = {
+    def state(self):
+        return {
             "sleeping": self.sleeping,
             "sleep_until": self.sleep_until,
-            # Store current self_tolerance for comparison on next start
-            "tolerated": self.tolerance_attempts,
+            "bucket_width": self.bucket_width,
         }
 
-        for k, v in self.items():
-            dump[k] = v
-
-        reactor.callInThread(self.write_dump_file, dump)
-
-    def write_dump_file(self, dump):
-        # Check self._writing; waits for release; timeout after 10 seconds.
-        i = 0
-        while self._writing:
-            sleep(1)
-            i += 1
-            if i >= 10:
-                return
-
-        # Acquire 'lock'
-        self._writing = True
-
-        with open(self.state_dump, "wb") as f:
-            pickle.dump(dump, f, protocol=pickle.HIGHEST_PROTOCOL)
+    def dump_state(self):
+        # Only records changed since the last dump are serialized here, on
+        # the reactor thread; writing them and compacting run in a thread.
+        changes = [
+            (ip, self.records[ip].to_list() if ip in self.records else None)
+            for ip in self.dirty
+        ]
+        self.dirty.clear()
+        self.journal_length += len(changes) + 1
+        compact = self.journal_length > max(1000, len(self.records))
+        if compact:
+            self.journal_length = 0
+        reactor.callInThread(self.write_dump_file, self.state(), changes, compact)
+
+    def write_dump_file(self, state, changes, compact=False):
+        with self._lock:
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                for ip, data in changes:
+                    f.write(json.dumps({"ip": ip, "record": data}) + "\n")
+                f.write(json.dumps({"state": state}) + "\n")
+            if compact:
+                self._compact()
+
+    def _compact(self):
+        # Folds the journal into a new snapshot, replaced atomically.
+        state, records = self.read_dump_files()
+        tmp = self.snapshot_file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"state": state, "records": records}, f)
+        os.replace(tmp, self.snapshot_file)
+        self.journal_file.unlink(missing_ok=True)
+
+    def read_dump_files(self):
+        """
+        Return (state, records) from the snapshot with the journal applied
+        """
+        state: dict = {}
+        records: dict = {}
+        try:
+            with open(self.snapshot_file, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            state = snapshot["state"]
+            records = snapshot["records"]
+        except FileNotFoundError:
+            pass
+        try:
+            with open(self.journal_file, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except JSONDecodeError:
+                        # Torn write from a crash, the rest is lost
+                        break
+                    if "state" in entry:
+                        state = entry["state"]
+                    elif entry["record"] is None:
+                        records.pop(entry["ip"], None)
+                    else:
+                        records[entry["ip"]] = entry["record"]
+        except FileNotFoundError:
+            pass
+        return state, records
 
-        # Release 'lock'
-        self._writing = False
+    def load(self):
+        # Restores state from the snapshot and journal, or migrates the
+        # pickle dump of earlier versions.
+        try:
+            state, records = self.read_dump_files()
+        except (JSONDecodeError, KeyError, TypeError):
+            log.msg(
+                eventid="cowrie.abuseipdb.loadfail",
+                format="AbuseIPDB plugin could not read its previous state.",
+            )
+            return
+        if not state and not records and (self.state_path / DUMP_FILE).exists():
+            state, records = self.read_legacy_dump()
+
+        self.sleeping = state.get("sleeping", False)
+        self.sleep_until = state.get("sleep_until", 0.0)
+        scale = state.get("bucket_width", self.bucket_width) / self.bucket_width
+        for ip, data in records.items():
+            record = IPRecord.from_list(data, scale)
+            if record.reported or record.buckets:
+                self._put(ip, record)
+        self.dirty.clear()
+        self.journal_length = 0
+        self._compact()
+
+    def read_legacy_dump(self):
+        # Before 0.4 the dump was a pickled dict of IP to a deque of
+        # timestamps, or (None, time_reported) once reported.
+        try:
+            with open(self.state_path / DUMP_FILE, "rb") as f:
+                dump = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError):
+            return {}, {}
+        state = {
+            "sleeping": dump.pop("sleeping", False),
+            "sleep_until": dump.pop("sleep_until", 0.0),
+        }
+        dump.pop("tolerated", None)
+        records = {}
+        for ip, v in dump.items():
+            record = IPRecord()
+            if isinstance(v, tuple):
+                record.reported = v[1]
+            elif v:
+                record.first, record.last = v[0], v[-1]
+                for t in v:
+                    bucket = int(t // self.bucket_width)
+                    record.buckets[bucket] = record.buckets.get(bucket, 0) + 1
+            records[ip] = record.to_list()
+        return state, records
 
 
 class Reporter:
@@ -350,7 +536,7 @@ class Reporter:
         }
 
     def report_ip_single(self, ip, t, uname):
-        self.logbook[ip] = (None, t)
+        self.logbook.mark_reported(ip, t)
 
         t = self.epoch_to_string_utc(t)
 
@@ -364,10 +550,11 @@ class Reporter:
         self.http_request(params)
 
     def report_ip_multiple(self, ip):
-        t_last = self.logbook[ip].pop()
-        t_first = self.epoch_to_string_utc(self.logbook[ip].popleft())
+        record = self.logbook[ip]
+        t_first = self.epoch_to_string_utc(record.first)
+        t_last = record.last
 
-        self.logbook[ip] = (None, t_last)
+        self.logbook.mark_reported(ip, t_last)
 
         t_last = self.epoch_to_string_utc(t_last)
 
@@ -0,0 +1,66 @@
+"""
+Keep the SQLite session catalog (cowrie.core.catalog) up to date as
+events arrive. Events are batched and written from the thread pool,
+one transaction per flush_interval.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from twisted.internet import task, threads
+from twisted.python import log
+
+import cowrie.core.output
+from cowrie.core.catalog import EVENTS, Catalog, catalog_path
+from cowrie.core.config import CowrieConfig
+
+
+class Output(cowrie.core.output.Output):
+    """
+    catalog output
+    """
+
+    def start(self) -> None:
+        self.catalog = Catalog(catalog_path())
+        self.pending: list[dict[str, Any]] = []
+        self.writing: Any = None
+        self.deferToThread = threads.deferToThread
+        self.loop = task.LoopingCall(self.flush)
+        self.loop.start(
+            CowrieConfig.getfloat("output_catalog", "flush_interval", fallback=5.0),
+            now=False,
+        )
+
+    def stop(self) -> None:
+        if self.loop.running:
+            self.loop.stop()
+        if self.writing is None:
+            self._close()
+        else:
+            # Let the running batch finish, then write the rest
+            self.writing.addBoth(lambda _: self._close())
+
+    def _close(self) -> None:
+        if self.pending:
+            self.catalog.add(self.pending)
+            self.pending = []
+        self.catalog.close()
+
+    def write(self, event: dict[str, Any]) -> None:
+        if event["eventid"] in EVENTS:
+            self.pending.append(event)
+
+    def flush(self) -> None:
+        """
+        Hand the pending events to the thread pool, one batch at a time
+        """
+        if not self.pending or self.writing is not None:
+            return
+        batch, self.pending = self.pending, []
+        self.writing = self.deferToThread(self.catalog.add, batch)
+        self.writing.addErrback(log.err, "catalog: failed to add events")
+        self.writing.addBoth(self._written)
+
+    def _written(self, result: Any) -> None:
+        self.writing = None
@@ -33,15 +33,21 @@ Send downloaded/uplaoded files to Cuckoo
 from __future__ import annotations
 
 import os
+from base64 import b64encode
 from urllib.parse import urljoin, urlparse
 
-import requests
-from requests.auth import HTTPBasicAuth
+import treq
+from zope.interface import implementer
 
+from twisted.internet import defer, reactor, ssl
 from twisted.python import log
+from twisted.web import client
+from twisted.web.iweb import IPolicyForHTTPS
 
 import cowrie.core.output
 from cowrie.core.config import CowrieConfig
+from cowrie.core.cooperator import cooperator
+from cowrie.core.submission import MultipartFile, SubmissionError, SubmissionQueue
 
 
 class Output(cowrie.core.output.Output):
@@ -62,6 +68,21 @@ class Output(cowrie.core.output.Output):
         self.api_user = CowrieConfig.get("output_cuckoo", "user")
         self.api_passwd = CowrieConfig.get("output_cuckoo", "passwd", raw=True)
         self.cuckoo_force = int(CowrieConfig.getboolean("output_cuckoo", "force"))
+        self.headers = {
+            b"Authorization": b"Basic "
+            + b64encode(f"{self.api_user}:{self.api_passwd}".encode())
+        }
+        self.http = treq.client.HTTPClient(
+            client.Agent(reactor, WhitelistContextFactory())
+        )
+        self.cooperator = cooperator
+        self.queue = SubmissionQueue(
+            concurrency=CowrieConfig.getint("output_cuckoo", "concurrency", fallback=2),
+            retries=CowrieConfig.getint("output_cuckoo", "retries", fallback=3),
+            backoff=CowrieConfig.getfloat(
+                "output_cuckoo", "retry_backoff", fallback=10.0
+            ),
+        )
 
     def stop(self):
         """
@@ -71,7 +92,6 @@ class Output(cowrie.core.output.Output):
 
     def write(self, event):
         if event["eventid"] == "cowrie.session.file_download":
-            log.msg("Sending file to Cuckoo")
             p = urlparse(event["url"]).path
             if p == "":
                 fileName = event["shasum"]
@@ -82,87 +102,101 @@ class Output(cowrie.core.output.Output):
                 else:
                     fileName = b
 
-            if (
-                self.cuckoo_force
-                or self.cuckoo_check_if_dup(os.path.basename(event["outfile"])) is False
-            ):
-                self.postfile(event["outfile"], fileName)
+            self.submit(event["shasum"], event["outfile"], fileName)
 
         elif event["eventid"] == "cowrie.session.file_upload":
-            if (
-                self.cuckoo_force
-                or self.cuckoo_check_if_dup(os.path.basename(event["outfile"])) is False
-            ):
-                log.msg("Sending file to Cuckoo")
-                self.postfile(event["outfile"], event["filename"])
-
-    def cuckoo_check_if_dup(self, sha256: str) -> bool:
+            self.submit(event["shasum"], event["outfile"], event["filename"])
+
+    def submit(self, shasum, artifact, fileName):
+        """
+        Queue a file for Cuckoo, duplicates of queued files are dropped
+        """
+        d = self.queue.submit(shasum, self.checkandpost, shasum, artifact, fileName)
+        d.addErrback(lambda f: log.msg(f"Cuckoo Request failed: {f.value!r}"))
+        return d
+
+    @defer.inlineCallbacks
+    def checkandpost(self, sha256, artifact, fileName):
+        if not self.cuckoo_force:
+            dup = yield self.cuckoo_check_if_dup(sha256)
+            if dup:
+                return
+        log.msg("Sending file to Cuckoo")
+        task_id = yield self.postfile(artifact, fileName)
+        return task_id
+
+    @defer.inlineCallbacks
+    def cuckoo_check_if_dup(self, sha256: str):
         """
         Check if file already was analyzed by cuckoo
         """
         try:
             log.msg(f"Looking for tasks for: {sha256}")
-            res = requests.get(
+            res = yield self.http.get(
                 urljoin(self.url_base, f"/files/view/sha256/{sha256}".encode()),
-                verify=False,
-                auth=HTTPBasicAuth(self.api_user, self.api_passwd),
+                headers=self.headers,
                 timeout=60,
             )
-            if res and res.ok:
+            if res.code == 200:
+                j = yield res.json()
                 log.msg(
                     "Sample found in Sandbox, with ID: {}".format(
-                        res.json().get("sample", {}).get("id", 0)
+                        j.get("sample", {}).get("id", 0)
                     )
                 )
                 return True
+            yield res.content()
         except Exception as e:
             log.msg(e)
 
         return False
 
+    @defer.inlineCallbacks
     def postfile(self, artifact, fileName):
         """
-        Send a file to Cuckoo
+        Send a file to Cuckoo, streamed from disk
         """
-        with open(artifact, "rb") as art:
-            files = {"file": (fileName, art.read())}
+        body = MultipartFile("file", fileName, artifact, cooperator=self.cooperator)
         try:
-            res = requests.post(
+            res = yield self.http.post(
                 urljoin(self.url_base, b"tasks/create/file"),
-                files=files,
-                auth=HTTPBasicAuth(self.api_user, self.api_passwd),
-                verify=False,
+                data=body,
+                headers={**self.headers, b"Content-Type": body.content_type},
             )
-            if res and res.ok:
-                log.msg(
-                    "Cuckoo Request: {}, Task created with ID: {}".format(
-                        res.status_code, res.json()["task_id"]
-                    )
-                )
-            else:
-                log.msg(f"Cuckoo Request failed: {res.status_code}")
-        except Exception as e:
-            log.msg(f"Cuckoo Request failed: {e}")
-
+        finally:
+            body.close()
+        if res.code == 200:
+            j = yield res.json()
+            log.msg(f"Cuckoo Request: {res.code}, Task created with ID: {j['task_id']}")
+            return j["task_id"]
+        yield res.content()
+        if res.code >= 500:
+            raise SubmissionError(res.code)
+        log.msg(f"Cuckoo Request failed: {res.code}")
+
+    @defer.inlineCallbacks
     def posturl(self, scanUrl):
         """
         Send a URL to Cuckoo
         """
-        data = {"url": scanUrl}
         try:
-            res = requests.post(
+            res = yield self.http.post(
                 urljoin(self.url_base, b"tasks/create/url"),
-                data=data,
-                auth=HTTPBasicAuth(self.api_user, self.api_passwd),
-                verify=False,
+                data={"url": scanUrl},
+                headers=self.headers,
             )
-            if res and res.ok:
+            if res.code == 200:
+                j = yield res.json()
                 log.msg(
-                    "Cuckoo Request: {}, Task created with ID: {}".format(
-                        res.status_code, res.json()["task_id"]
-                    )
+                    f"Cuckoo Request: {res.code}, Task created with ID: {j['task_id']}"
                 )
             else:
-                log.msg(f"Cuckoo Request failed: {res.status_code}")
+                log.msg(f"Cuckoo Request failed: {res.code}")
         except Exception as e:
             log.msg(f"Cuckoo Request failed: {e}")
+
+
+@implementer(IPolicyForHTTPS)
+class WhitelistContextFactory:
+    def creatorForNetloc(self, hostname, port):
+        return ssl.CertificateOptions(verify=False)
@@ -11,6 +11,7 @@ from twisted.python import log
 
 import cowrie.core.output
 from cowrie.core.config import CowrieConfig
+from cowrie.core.enrichment import get_enrichment
 
 COWRIE_USER_AGENT = "Cowrie Honeypot"
 GNAPI_URL = "https://api.greynoise.io/v3/community/"
@@ -29,6 +30,8 @@ class Output(cowrie.core.output.Output):
         self.debug = CowrieConfig.getboolean(
             "output_greynoise", "debug", fallback=False
         )
+        self.enrichment = get_enrichment()
+        self.enrichment.register("greynoise", self.query)
 
     def stop(self):
         """
@@ -62,11 +65,8 @@ class Output(cowrie.core.output.Output):
                     f"The owner is {query['name']}.",
                 )
 
-        gn_url = f"{GNAPI_URL}{event['src_ip']}".encode()
-        headers = {"User-Agent": [COWRIE_USER_AGENT], "key": self.apiKey}
-
         try:
-            response = yield treq.get(url=gn_url, headers=headers, timeout=10)
+            j = yield self.enrichment.lookup("greynoise", event["src_ip"])
         except (
             defer.CancelledError,
             error.ConnectingCancelledError,
@@ -74,22 +74,41 @@ class Output(cowrie.core.output.Output):
         ):
             log.msg("GreyNoise requests timeout")
             return
+        except GreyNoiseError:
+            return
+
+        if j["message"] == "Success":
+            message(j)
+        else:
+            log.msg(f"GreyNoise: no results for IP {event['src_ip']}: {j['message']}")
+
+    @defer.inlineCallbacks
+    def query(self, ip):
+        """
+        Query the GreyNoise community API for an IP. Called by the
+        enrichment service, so repeat addresses are answered from cache.
+        Not found answers are returned (and cached), errors raise.
+        """
+        gn_url = f"{GNAPI_URL}{ip}".encode()
+        headers = {"User-Agent": [COWRIE_USER_AGENT], "key": self.apiKey}
+
+        response = yield treq.get(url=gn_url, headers=headers, timeout=10)
 
         if response.code == 404:
-            rsp = yield response.json()
-            log.err(f"GreyNoise: {rsp['ip']} - {rsp['message']}")
-            return
+            return (yield response.json())
 
         if response.code != 200:
             rsp = yield response.text()
             log.err(f"GreyNoise: got error {rsp}")
-            return
+            raise GreyNoiseError(response.code)
 
         j = yield response.json()
         if self.debug:
             log.msg("GreyNoise: debug: " + repr(j))
+        return j
 
-        if j["message"] == "Success":
-            message(j)
-        else:
-            log.msg("GreyNoise: no results for for IP {}".format(event["src_ip"]))
+
+class GreyNoiseError(Exception):
+    """
+    The GreyNoise API returned an error, the answer is not cached
+    """
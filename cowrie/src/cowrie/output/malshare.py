@@ -34,21 +34,24 @@ More info https://malshare.com/doc.php
 from __future__ import annotations
 
 import os
-from urllib.parse import urlparse
+from urllib.parse import urlencode, urlparse
 
-import requests
+import treq
 
+from twisted.internet import defer
 from twisted.python import log
 
 import cowrie.core.output
 from cowrie.core.config import CowrieConfig
+from cowrie.core.cooperator import cooperator
+from cowrie.core.submission import MultipartFile, SubmissionError, SubmissionQueue
+
+MALSHARE_URL = "https://malshare.com/api.php"
 
 
 class Output(cowrie.core.output.Output):
     """
     malshare output
-
-    TODO: use `treq`
     """
 
     apiKey: str
@@ -58,6 +61,18 @@ class Output(cowrie.core.output.Output):
         Start output plugin
         """
         self.apiKey = CowrieConfig.get("output_malshare", "api_key")
+        self.url = CowrieConfig.get("output_malshare", "url", fallback=MALSHARE_URL)
+        self.http = treq
+        self.cooperator = cooperator
+        self.queue = SubmissionQueue(
+            concurrency=CowrieConfig.getint(
+                "output_malshare", "concurrency", fallback=2
+            ),
+            retries=CowrieConfig.getint("output_malshare", "retries", fallback=3),
+            backoff=CowrieConfig.getfloat(
+                "output_malshare", "retry_backoff", fallback=10.0
+            ),
+        )
 
     def stop(self):
         """
@@ -77,25 +92,39 @@ class Output(cowrie.core.output.Output):
                 else:
                     fileName = b
 
-            self.postfile(event["outfile"], fileName)
+            self.submit(event["shasum"], event["outfile"], fileName)
 
         elif event["eventid"] == "cowrie.session.file_upload":
-            self.postfile(event["outfile"], event["filename"])
+            self.submit(event["shasum"], event["outfile"], event["filename"])
+
+    def submit(self, shasum, artifact, fileName):
+        """
+        Queue a file for MalShare, duplicates of queued files are dropped
+        """
+        d = self.queue.submit(shasum, self.postfile, artifact, fileName)
+        d.addErrback(lambda f: log.msg(f"MalShare Request failed: {f.value!r}"))
+        return d
 
+    @defer.inlineCallbacks
     def postfile(self, artifact, fileName):
         """
-        Send a file to MalShare
+        Send a file to MalShare, streamed from disk
         """
+        body = MultipartFile("upload", fileName, artifact, cooperator=self.cooperator)
         try:
-            res = requests.post(
-                "https://malshare.com/api.php?api_key="
-                + self.apiKey
-                + "&action=upload",
-                files={"upload": open(artifact, "rb")},
+            res = yield self.http.post(
+                self.url
+                + "?"
+                + urlencode({"api_key": self.apiKey, "action": "upload"}),
+                data=body,
+                headers={b"Content-Type": body.content_type},
             )
-            if res and res.ok:
-                log.msg("Submitted to MalShare")
-            else:
-                log.msg(f"MalShare Request failed: {res.status_code}")
-        except Exception as e:
-            log.msg(f"MalShare Request failed: {e}")
+        finally:
+            body.close()
+        yield res.content()
+        if res.code == 200:
+            log.msg("Submitted to MalShare")
+        elif res.code >= 500:
+            raise SubmissionError(res.code)
+        else:
+            log.msg(f"MalShare Request failed: {res.code}")
@@ -4,18 +4,38 @@ Cowrie Prometheus output.
 [output_prometheus]
 enabled = true
 port    = 9000
+topk    = 50
+
+Per source IP, username, command and destination series are only
+exported for the `topk` heaviest hitters, tracked with a bounded
+SpaceSaving summary, so the number of series stays constant under
+internet-wide scanning. Unique counts come from HyperLogLog sketches.
 """
 
 from __future__ import annotations
 
 import socket
 import time
+from typing import TYPE_CHECKING
 
-from prometheus_client import start_http_server, Counter, Gauge, Histogram
+from prometheus_client import REGISTRY, start_http_server, Counter, Gauge, Histogram
+from prometheus_client.core import (
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    HistogramMetricFamily,
+)
+from twisted.internet import task
 from twisted.python import log
 
 import cowrie.core.output
 from cowrie.core.config import CowrieConfig
+from cowrie.core.metrics import HistogramValue, MetricsRegistry, metrics
+from cowrie.core.sketch import HyperLogLog, SpaceSaving
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+
+    from prometheus_client.core import Metric
 
 # ────────────────────────────────────────────
 #  Metric objects
@@ -36,25 +56,19 @@ session_duration = Histogram(
     ["transport"],
     buckets=BUCKETS_DUR,
 )
-source_ip_total = Counter(
-    "cowrie_source_ip_total", "Sessions per source IP", ["ip", "asn_country"]
-)
-
 source_ip_card = Gauge(
     "cowrie_source_ip_cardinality", "Unique source IPs seen", ["interval"]
 )
-
-login_attempts = Counter(
-    "cowrie_login_attempts_total", "Login attempts", ["result", "username"]
+unique_card = Gauge(
+    "cowrie_unique_values",
+    "Estimated distinct values seen since start",
+    ["dimension"],
 )
+
 password_length = Histogram(
     "cowrie_password_length", "Password length histogram", buckets=BUCKETS_LEN
 )
 
-commands_total = Counter(
-    "cowrie_command_total", "Commands executed", ["command", "sensor"]
-)
-
 dl_bytes_total = Counter(
     "cowrie_file_download_bytes_total", "Downloaded bytes", ["protocol", "sensor"]
 )
@@ -65,24 +79,92 @@ dl_time_hist = Histogram(
     buckets=BUCKETS_DUR,
 )
 
-outbound_total = Counter(
-    "cowrie_connection_outbound_total",
-    "Outbound direct‑tcpip connections",
-    ["dst_ip", "dst_port"],
-)
-
-loop_lag_hist = Histogram("cowrie_event_loop_lag_seconds", "Twisted reactor lag (s)")
 py_exceptions = Counter(
     "cowrie_python_exceptions_total", "Uncaught Python exceptions", ["exception"]
 )
 
 
+class TopKCollector:
+    """
+    Export the heaviest hitters of a SpaceSaving summary as a counter.
+    Series for keys that fall out of the summary disappear on the next
+    scrape, which keeps the exposition bounded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        tracker: SpaceSaving,
+        limit: int,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = list(labelnames)
+        self.tracker = tracker
+        self.limit = limit
+
+    def describe(self) -> Iterator[CounterMetricFamily]:
+        yield CounterMetricFamily(self.name, self.documentation, labels=self.labelnames)
+
+    def collect(self) -> Iterator[CounterMetricFamily]:
+        family = CounterMetricFamily(
+            self.name, self.documentation, labels=self.labelnames
+        )
+        for key, count, _error in self.tracker.top(self.limit):
+            family.add_metric(list(key), count)
+        yield family
+
+
+class CoreMetricsCollector:
+    """
+    Expose the cowrie.core.metrics registry (reactor lag, slow callbacks,
+    output plugin timings) with a cowrie_ prefix.
+    """
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.registry = registry
+
+    def collect(self) -> Iterator[Metric]:
+        for m in self.registry.collect():
+            name = f"cowrie_{m.name}"
+            samples = m.samples()
+            labelnames = sorted(samples[0][0]) if samples else []
+            family: Metric
+            if m.type == "counter":
+                family = CounterMetricFamily(name, m.documentation, labels=labelnames)
+            elif m.type == "histogram":
+                family = HistogramMetricFamily(name, m.documentation, labels=labelnames)
+            else:
+                family = GaugeMetricFamily(name, m.documentation, labels=labelnames)
+            for labels, value in samples:
+                labelvalues = [labels.get(k, "") for k in labelnames]
+                if isinstance(value, HistogramValue):
+                    family.add_metric(  # type: ignore[call-arg]
+                        labelvalues,
+                        buckets=[
+                            ("+Inf" if le == float("inf") else str(le), c)
+                            for le, c in value.cumulative()
+                        ],
+                        sum_value=value.sum,
+                    )
+                else:
+                    family.add_metric(labelvalues, value)  # type: ignore[call-arg]
+            yield family
+
+
 class Output(cowrie.core.output.Output):
     def start(self) -> None:
         port = CowrieConfig.getint("output_prometheus", "port", fallback=9000)
         self.debug = CowrieConfig.getboolean(
             "output_prometheus", "debug", fallback=False
         )
+        topk = CowrieConfig.getint("output_prometheus", "topk", fallback=50)
+        # Track more keys than are exported so the reported top is accurate
+        capacity = CowrieConfig.getint(
+            "output_prometheus", "topk_capacity", fallback=topk * 20
+        )
         start_http_server(port)
 
         if self.debug:
@@ -91,15 +173,61 @@ class Output(cowrie.core.output.Output):
 
         # Helper structures
         self._start_times: dict[str, float] = {}
-        self._srcip_seen_5m: set[str] = set()
-        self._srcip_seen_60m: set[str] = set()
-
-        # Periodic callbacks for event-loop lag & unique-IP gauges
-        # task.LoopingCall(self._report_loop_lag).start(5, now=False)
-        # task.LoopingCall(self._flush_unique_ip_gauges, 300, "5m").start(300, now=False)
-        # task.LoopingCall(self._flush_unique_ip_gauges, 3600, "1h").start(
-        #     3600, now=False
-        # )
+        self._srcip_seen_5m = HyperLogLog()
+        self._srcip_seen_60m = HyperLogLog()
+
+        self._source_ips = SpaceSaving(capacity)
+        self._usernames = SpaceSaving(capacity)
+        self._commands = SpaceSaving(capacity)
+        self._outbound = SpaceSaving(capacity)
+        self._collectors = [
+            TopKCollector(
+                "cowrie_source_ip_total",
+                "Sessions per source IP (top-k)",
+                ["ip", "asn_country"],
+                self._source_ips,
+                topk,
+            ),
+            TopKCollector(
+                "cowrie_login_attempts_total",
+                "Login attempts (top-k)",
+                ["result", "username"],
+                self._usernames,
+                topk,
+            ),
+            TopKCollector(
+                "cowrie_command_total",
+                "Commands executed (top-k)",
+                ["command", "sensor"],
+                self._commands,
+                topk,
+            ),
+            TopKCollector(
+                "cowrie_connection_outbound_total",
+                "Outbound direct-tcpip connections (top-k)",
+                ["dst_ip", "dst_port"],
+                self._outbound,
+                topk,
+            ),
+        ]
+        self._collectors.append(CoreMetricsCollector(metrics))
+        for collector in self._collectors:
+            REGISTRY.register(collector)
+
+        self._unique: dict[str, HyperLogLog] = {}
+        for dimension in ("ip", "username", "command", "destination"):
+            hll = HyperLogLog()
+            self._unique[dimension] = hll
+            unique_card.labels(dimension).set_function(hll.count)
+
+        # Periodic callbacks for unique-IP gauges. Event loop lag is sampled
+        # by cowrie.core.monitor and exported through CoreMetricsCollector
+        self._loops = [
+            task.LoopingCall(self._flush_unique_ip_gauges, 300, "5m"),
+            task.LoopingCall(self._flush_unique_ip_gauges, 3600, "1h"),
+        ]
+        self._loops[0].start(300, now=False)
+        self._loops[1].start(3600, now=False)
 
     def write(self, event: dict) -> None:
         try:
@@ -147,7 +275,8 @@ class Output(cowrie.core.output.Output):
 
         ip = ev.get("src_ip", "unknown")
         asn = ev.get("src_persist_as", "UNK")
-        source_ip_total.labels(ip, asn).inc()
+        self._source_ips.add((ip, asn))
+        self._unique["ip"].add(ip)
 
     def _on_session_closed(self, ev: dict) -> None:
         sid = ev["session"]
@@ -164,13 +293,15 @@ class Output(cowrie.core.output.Output):
         res = "success" if success else "fail"
         user = ev.get("username", "unknown")
         passwd = ev.get("password", "")
-        login_attempts.labels(res, user).inc()
+        self._usernames.add((res, str(user)))
+        self._unique["username"].add(str(user))
         if passwd:
             password_length.observe(len(str(passwd)))
 
     def _on_command(self, ev: dict) -> None:
         cmd = ev.get("input", "").strip().split(" ")[0][:30]  # first token
-        commands_total.labels(cmd, HOST_LABEL).inc()
+        self._commands.add((cmd, HOST_LABEL))
+        self._unique["command"].add(cmd)
 
     def _on_download(self, ev: dict) -> None:
         proto = ev.get("shasum", "").split(":")[0] or "unknown"
@@ -182,16 +313,17 @@ class Output(cowrie.core.output.Output):
     def _on_outbound(self, ev: dict) -> None:
         dst_ip = ev.get("dst_ip", "unknown")
         dst_port = str(ev.get("dst_port", "0"))
-        outbound_total.labels(dst_ip, dst_port).inc()
+        self._outbound.add((dst_ip, dst_port))
+        self._unique["destination"].add(f"{dst_ip}:{dst_port}")
 
-    # def _report_loop_lag(self) -> None:
-    #     before = time.time()
-    #     reactor.callLater(0, lambda: loop_lag_hist.observe(time.time() - before))
-    #
-    # def _flush_unique_ip_gauges(self, interval_sec: int, label: str) -> None:
-    #     s = self._srcip_seen_5m if interval_sec == 300 else self._srcip_seen_60m
-    #     source_ip_card.labels(label).set(len(s))
-    #     s.clear()
+    def _flush_unique_ip_gauges(self, interval_sec: int, label: str) -> None:
+        s = self._srcip_seen_5m if interval_sec == 300 else self._srcip_seen_60m
+        source_ip_card.labels(label).set(s.count())
+        s.clear()
 
     def stop(self):
-        pass
+        for loop in self._loops:
+            if loop.running:
+                loop.stop()
+        for collector in self._collectors:
+            REGISTRY.unregister(collector)
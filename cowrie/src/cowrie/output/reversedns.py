@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-from functools import lru_cache
 import ipaddress
 
 from twisted.internet import defer
@@ -9,6 +8,7 @@ from twisted.python import log
 
 import cowrie.core.output
 from cowrie.core.config import CowrieConfig
+from cowrie.core.enrichment import get_enrichment
 
 
 class Output(cowrie.core.output.Output):
@@ -23,6 +23,8 @@ class Output(cowrie.core.output.Output):
         Start Output Plugin
         """
         self.timeout = [CowrieConfig.getint("output_reversedns", "timeout", fallback=3)]
+        self.enrichment = get_enrichment()
+        self.enrichment.register("reversedns", self.lookup_ptr)
 
     def stop(self):
         """
@@ -40,21 +42,17 @@ class Output(cowrie.core.output.Output):
             Create log messages for connect events
             """
             if result is None:
-                log.msg("reversedns: no results (1)")
-                return
-            if len(result[0]) == 0:
-                log.msg("reversedns: no results (2)")
+                log.msg("reversedns: No PTR record returned")
                 return
 
-            payload = result[0][0].payload
             log.msg(
                 eventid="cowrie.reversedns.connect",
                 session=event["session"],
                 format="reversedns: PTR record for IP %(src_ip)s is %(ptr)s"
                 " ttl=%(ttl)i",
                 src_ip=event["src_ip"],
-                ptr=str(payload.name),
-                ttl=payload.ttl,
+                ptr=result["ptr"],
+                ttl=result["ttl"],
             )
 
         def processForward(result):
@@ -63,23 +61,19 @@ class Output(cowrie.core.output.Output):
             """
             if result is None:
                 return
-            payload = result[0][0].payload
             log.msg(
                 eventid="cowrie.reversedns.forward",
                 session=event["session"],
                 format="reversedns: PTR record for IP %(dst_ip)s is %(ptr)s"
                 " ttl=%(ttl)i",
                 dst_ip=event["dst_ip"],
-                ptr=str(payload.name),
-                ttl=payload.ttl,
+                ptr=result["ptr"],
+                ttl=result["ttl"],
             )
 
         def cbError(failure):
             if failure.type == defer.TimeoutError:
                 log.msg("reversedns: Timeout in DNS lookup")
-            elif failure.type == error.DNSNameError:
-                # DNSNameError is the NXDOMAIN response
-                log.msg("reversedns: No PTR record returned")
             elif failure.type == error.DNSServerError:
                 # DNSServerError is the SERVFAIL response
                 log.msg("reversedns: DNS server not responding")
@@ -98,17 +92,38 @@ class Output(cowrie.core.output.Output):
                 d.addCallback(processForward)
                 d.addErrback(cbError)
 
-    @lru_cache(maxsize=1000)
     def reversedns(self, addr):
         """
-        Perform a reverse DNS lookup on an IP
+        Perform a reverse DNS lookup on an IP, through the shared
+        enrichment cache
 
         Arguments:
             addr -- IPv4 Address
         """
         try:
-            ptr = ipaddress.ip_address(addr).reverse_pointer
+            ipaddress.ip_address(addr)
         except ValueError:
             return None
+        return self.enrichment.lookup("reversedns", addr)
+
+    def lookup_ptr(self, addr):
+        """
+        Fetch the PTR record for addr. Returns a dict with the name and
+        ttl, or None if there is none, so negative answers are cached too.
+        """
+        ptr = ipaddress.ip_address(addr).reverse_pointer
+
+        def cbResult(result):
+            if len(result[0]) == 0:
+                return None
+            payload = result[0][0].payload
+            return {"ptr": str(payload.name), "ttl": payload.ttl}
+
+        def cbNXDomain(failure):
+            # DNSNameError is the NXDOMAIN response
+            failure.trap(error.DNSNameError)
+            return None
+
         d = client.lookupPointer(ptr, timeout=self.timeout)
+        d.addCallbacks(cbResult, cbNXDomain)
         return d
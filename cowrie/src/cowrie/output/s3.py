@@ -1,9 +1,15 @@
 """
 Send downloaded/uplaoded files to S3 (or compatible)
+
+Keys of uploaded artifacts are remembered in a local cache, so a
+duplicate artifact costs no HEAD request. Artifacts larger than
+multipart_threshold are sent as a multipart upload, read from disk one
+part at a time with at most multipart_concurrency parts in flight.
 """
 
 from __future__ import annotations
 
+import os
 from typing import Any
 
 from configparser import NoOptionError
@@ -15,8 +21,11 @@ from twisted.internet import defer, threads
 from twisted.python import log
 
 import cowrie.core.output
+from cowrie.core.cache import Coalescer, PersistentCache
 from cowrie.core.config import CowrieConfig
 
+MiB = 1024 * 1024
+
 
 class Output(cowrie.core.output.Output):
     """
@@ -48,8 +57,36 @@ class Output(cowrie.core.output.Output):
             verify=CowrieConfig.getboolean("output_s3", "verify", fallback=True),
         )
 
+        self.cache_ttl = CowrieConfig.getint(
+            "output_s3", "cache_ttl", fallback=30 * 86400
+        )
+        self.cache = PersistentCache(
+            CowrieConfig.get(
+                "output_s3",
+                "cache_file",
+                fallback=os.path.join(
+                    CowrieConfig.get("honeypot", "state_path", fallback="."),
+                    "s3.sqlite",
+                ),
+            )
+        )
+        self.cache.purge()
+        self.inflight = Coalescer()
+
+        self.multipart_threshold = CowrieConfig.getint(
+            "output_s3", "multipart_threshold", fallback=16 * MiB
+        )
+        # S3 requires parts of at least 5 MiB, except for the last one
+        self.multipart_chunksize = CowrieConfig.getint(
+            "output_s3", "multipart_chunksize", fallback=8 * MiB
+        )
+        self.parts = defer.DeferredSemaphore(
+            CowrieConfig.getint("output_s3", "multipart_concurrency", fallback=4)
+        )
+        self.deferToThread = threads.deferToThread
+
     def stop(self) -> None:
-        pass
+        self.cache.close()
 
     def write(self, event: dict[str, Any]) -> None:
         if event["eventid"] == "cowrie.session.file_download":
@@ -58,41 +95,116 @@ class Output(cowrie.core.output.Output):
         elif event["eventid"] == "cowrie.session.file_upload":
             self.upload(event["shasum"], event["outfile"])
 
+    def _remember(self, shasum: str) -> None:
+        self.seen.add(shasum)
+        self.cache.set(self.bucket, shasum, True, self.cache_ttl)
+
     @defer.inlineCallbacks
     def _object_exists_remote(self, shasum):
         try:
-            yield threads.deferToThread(
+            yield self.deferToThread(
                 self.client.head_object,
                 Bucket=self.bucket,
                 Key=shasum,
             )
         except ClientError as e:
             if e.response["Error"]["Code"] == "404":
-                defer.returnValue(False)
+                return False
             raise
 
-        defer.returnValue(True)
+        return True
 
-    @defer.inlineCallbacks
     def upload(self, shasum, filename):
-        if shasum in self.seen:
+        if shasum in self.seen or self.cache.get(self.bucket, shasum):
             log.msg(f"Already uploaded file with sha {shasum} to S3")
-            return
+            self.seen.add(shasum)
+            return defer.succeed(None)
+
+        # Sessions dropping the same file at once share one upload
+        return self.inflight.run(shasum, self._upload, shasum, filename)
 
+    @defer.inlineCallbacks
+    def _upload(self, shasum, filename):
         exists = yield self._object_exists_remote(shasum)
         if exists:
             log.msg(f"Somebody else already uploaded file with sha {shasum} to S3")
-            self.seen.add(shasum)
+            self._remember(shasum)
             return
 
         log.msg(f"Uploading file with sha {shasum} ({filename}) to S3")
+        if os.path.getsize(filename) > self.multipart_threshold:
+            yield self._upload_multipart(shasum, filename)
+        else:
+            yield self.deferToThread(self._put_object, shasum, filename)
+
+        self._remember(shasum)
+
+    def _put_object(self, shasum, filename):
+        # botocore reads the body from the open file
         with open(filename, "rb") as fp:
-            yield threads.deferToThread(
-                self.client.put_object,
+            self.client.put_object(
                 Bucket=self.bucket,
                 Key=shasum,
-                Body=fp.read(),
+                Body=fp,
                 ContentType="application/octet-stream",
             )
 
-        self.seen.add(shasum)
+    def _upload_part(self, shasum, filename, upload_id, number, offset, size):
+        # Runs in a thread, only this part of the file is in memory
+        with open(filename, "rb") as fp:
+            fp.seek(offset)
+            body = fp.read(size)
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=shasum,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=body,
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    @defer.inlineCallbacks
+    def _upload_multipart(self, shasum, filename):
+        size = os.path.getsize(filename)
+        response = yield self.deferToThread(
+            self.client.create_multipart_upload,
+            Bucket=self.bucket,
+            Key=shasum,
+            ContentType="application/octet-stream",
+        )
+        upload_id = response["UploadId"]
+
+        try:
+            parts = yield defer.gatherResults(
+                [
+                    self.parts.run(
+                        self.deferToThread,
+                        self._upload_part,
+                        shasum,
+                        filename,
+                        upload_id,
+                        number,
+                        offset,
+                        min(self.multipart_chunksize, size - offset),
+                    )
+                    for number, offset in enumerate(
+                        range(0, size, self.multipart_chunksize), start=1
+                    )
+                ],
+                consumeErrors=True,
+            )
+            yield self.deferToThread(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=shasum,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            yield self.deferToThread(
+                self.client.abort_multipart_upload,
+                Bucket=self.bucket,
+                Key=shasum,
+                UploadId=upload_id,
+            )
+            raise
@@ -28,11 +28,14 @@
 
 """
 Send SSH logins to Virustotal
+
+Reports are kept in a persistent SQLite cache, concurrent lookups for
+the same file or URL are collapsed into one request and all requests
+go through a token bucket that respects the API rate limit.
 """
 
 from __future__ import annotations
 
-import datetime
 import json
 import os
 from typing import Any
@@ -47,12 +50,13 @@ from twisted.web import client, http_headers
 from twisted.web.iweb import IBodyProducer
 
 import cowrie.core.output
+from cowrie.core.cache import Coalescer, PersistentCache
 from cowrie.core.config import CowrieConfig
+from cowrie.core.ratelimit import TokenBucket
 
 COWRIE_USER_AGENT = "Cowrie Honeypot"
 VTAPI_URL = "https://www.virustotal.com/vtapi/v2/"
 COMMENT = "First seen by #Cowrie SSH/telnet Honeypot http://github.com/cowrie/cowrie"
-TIME_SINCE_FIRST_DOWNLOAD = datetime.timedelta(minutes=1)
 
 
 class Output(cowrie.core.output.Output):
@@ -66,14 +70,14 @@ class Output(cowrie.core.output.Output):
     agent: Any
     scan_url: bool
     scan_file: bool
-    url_cache: dict[str, datetime.datetime]  # url and last time succesfully submitted
+    cache: PersistentCache
+    inflight: Coalescer
+    bucket: TokenBucket
 
     def start(self) -> None:
         """
         Start output plugin
         """
-        self.url_cache = {}
-
         self.apiKey = CowrieConfig.get("output_virustotal", "api_key")
         self.debug = CowrieConfig.getboolean(
             "output_virustotal", "debug", fallback=False
@@ -93,361 +97,316 @@ class Output(cowrie.core.output.Output):
         self.commenttext = CowrieConfig.get(
             "output_virustotal", "commenttext", fallback=COMMENT
         )
+        # finished reports are kept for cache_ttl seconds, files and urls
+        # that are new or queued at VT are checked again after cache_ttl_pending
+        self.cache_ttl = CowrieConfig.getint(
+            "output_virustotal", "cache_ttl", fallback=86400
+        )
+        self.cache_ttl_pending = CowrieConfig.getint(
+            "output_virustotal", "cache_ttl_pending", fallback=3600
+        )
+        self.cache = PersistentCache(
+            CowrieConfig.get(
+                "output_virustotal",
+                "cache_file",
+                fallback=os.path.join(
+                    CowrieConfig.get("honeypot", "state_path", fallback="."),
+                    "virustotal.sqlite",
+                ),
+            )
+        )
+        self.cache.purge()
+        self.inflight = Coalescer()
+        # public API keys are limited to 4 requests per minute
+        self.bucket = TokenBucket(
+            CowrieConfig.getint("output_virustotal", "rate_limit", fallback=4), 60
+        )
         self.agent = client.Agent(reactor)
 
     def stop(self) -> None:
         """
         Stop output plugin
         """
+        self.bucket.stop()
+        self.cache.close()
 
     def write(self, event: dict[str, Any]) -> None:
         if event["eventid"] == "cowrie.session.file_download":
             if self.scan_url and "url" in event:
-                log.msg("Checking url scan report at VT")
                 self.scanurl(event)
-            if self._is_new_shasum(event["shasum"]) and self.scan_file:
-                log.msg("Checking file scan report at VT")
+            if self.scan_file:
                 self.scanfile(event)
 
         elif event["eventid"] == "cowrie.session.file_upload":
-            if self._is_new_shasum(event["shasum"]) and self.scan_file:
-                log.msg("Checking file scan report at VT")
+            if self.scan_file:
                 self.scanfile(event)
 
-    def _is_new_shasum(self, shasum):
-        # Get the downloaded file's modification time
-        shasumfile = os.path.join(CowrieConfig.get("honeypot", "download_path"), shasum)
-        file_modification_time = datetime.datetime.fromtimestamp(
-            os.stat(shasumfile).st_mtime
+    @defer.inlineCallbacks
+    def _request(self, path: str, body: bytes, contentType: bytes | None = None) -> Any:
+        """
+        POST to the VT API once the rate limiter allows it.
+        Returns the decoded JSON response or None
+        """
+        yield self.bucket.acquire()
+        vtUrl = f"{VTAPI_URL}{path}".encode()
+        headers = http_headers.Headers({"User-Agent": [COWRIE_USER_AGENT]})
+        if contentType is not None:
+            headers.setRawHeaders("Accept", [b"*/*"])
+            headers.setRawHeaders("Content-Type", [contentType])
+        else:
+            headers.setRawHeaders(
+                "Content-Type", [b"application/x-www-form-urlencoded"]
+            )
+
+        response = yield self.agent.request(
+            b"POST", vtUrl, headers, StringProducer(body)
         )
+        if response.code != 200:
+            log.msg(f"VT {path} failed: {response.code} {response.phrase}")
+            return None
 
-        # Assumptions:
-        # 1. A downloaded file that was already downloaded before is not written instead of the first downloaded file
-        # 2. On that stage of the code, the file that needs to be scanned in VT is supposed to be downloaded already
-        #
-        # Check:
-        # If the file was first downloaded more than a "period of time" (e.g 1 min) ago -
-        # it has been apparently scanned before in VT and therefore is not going to be checked again
-        if file_modification_time < datetime.datetime.now() - TIME_SINCE_FIRST_DOWNLOAD:
-            log.msg(f"File with shasum '{shasum}' was downloaded before")
-            return False
-        return True
+        try:
+            result = yield client.readBody(response)
+        except client.PartialDownloadError as e:
+            # Google HTTP Server does not set Content-Length. Twisted marks it as partial
+            result = e.response
+
+        if self.debug:
+            log.msg(f"VT {path} result: {result}")
+        if result.strip() == b"[]":
+            log.err(f"VT {path} did not return results: {result}")
+            return None
+        return json.loads(result.decode("utf8"))
 
     def scanfile(self, event):
         """
         Check file scan report for a hash
         Argument is full event so we can access full file later on
         """
-        vtUrl = f"{VTAPI_URL}file/report".encode()
-        headers = http_headers.Headers({"User-Agent": [COWRIE_USER_AGENT]})
-        fields = {"apikey": self.apiKey, "resource": event["shasum"], "allinfo": 1}
-        body = StringProducer(urlencode(fields).encode("utf-8"))
-        d = self.agent.request(b"POST", vtUrl, headers, body)
-
-        def cbResponse(response):
-            """
-            Main response callback, check HTTP response code
-            """
-            if response.code == 200:
-                d = client.readBody(response)
-                d.addCallback(cbBody)
-                return d
-            else:
-                log.msg(f"VT scanfile failed: {response.code} {response.phrase}")
-
-        def cbBody(body):
-            """
-            Received body
-            """
-            return processResult(body)
-
-        def cbPartial(failure):
-            """
-            Google HTTP Server does not set Content-Length. Twisted marks it as partial
-            """
-            return processResult(failure.value.response)
+        shasum = event["shasum"]
+        cached = self.cache.get("file", shasum)
+        if cached is not None:
+            log.msg(f"VT: using cached file report for {shasum}")
+            self._log_file_report(event, cached)
+            return defer.succeed(None)
+
+        if ("file", shasum) not in self.inflight:
+            log.msg("Checking file scan report at VT")
+        d = self.inflight.run(("file", shasum), self._check_file, event)
+        d.addCallback(lambda j: self._log_file_report(event, j))
 
         def cbError(failure):
             log.msg("VT: Error in scanfile")
             failure.printTraceback()
 
-        def processResult(result):
-            """
-            Extract the information we need from the body
-            """
-            if self.debug:
-                log.msg(f"VT scanfile result: {result}")
-            result = result.decode("utf8")
-            j = json.loads(result)
-            log.msg("VT: {}".format(j["verbose_msg"]))
-            if j["response_code"] == 0:
-                log.msg(
-                    eventid="cowrie.virustotal.scanfile",
-                    format="VT: New file %(sha256)s",
-                    session=event["session"],
-                    sha256=j["resource"],
-                    is_new="true",
-                )
-
-                try:
-                    b = os.path.basename(urlparse(event["url"]).path)
-                    if b == "":
-                        fileName = event["shasum"]
-                    else:
-                        fileName = b
-                except KeyError:
-                    fileName = event["shasum"]
-
-                if self.upload is True:
-                    return self.postfile(event["outfile"], fileName)
-                else:
-                    return
-            elif j["response_code"] == 1:
-                log.msg("VT: response=1: this has been scanned before")
-                # Add detailed report to json log
-                scans_summary: dict[str, dict[str, str]] = {}
-                for feed, info in j["scans"].items():
-                    feed_key = feed.lower()
-                    scans_summary[feed_key] = {}
-                    scans_summary[feed_key]["detected"] = str(info["detected"]).lower()
-                    scans_summary[feed_key]["result"] = str(info["result"]).lower()
-                log.msg(
-                    eventid="cowrie.virustotal.scanfile",
-                    format="VT: Binary file with sha256 %(sha256)s was found malicious "
-                    "by %(positives)s out of %(total)s feeds (scanned on %(scan_date)s)",
-                    session=event["session"],
-                    positives=j["positives"],
-                    total=j["total"],
-                    scan_date=j["scan_date"],
-                    sha256=j["resource"],
-                    scans=scans_summary,
-                    is_new="false",
-                )
-                log.msg("VT: permalink: {}".format(j["permalink"]))
-            elif j["response_code"] == -2:
-                log.msg("VT: response=-2: this has been queued for analysis already")
-            else:
-                log.msg("VT: unexpected response code: {}".format(j["response_code"]))
-
-        d.addCallback(cbResponse)
         d.addErrback(cbError)
         return d
 
-    def postfile(self, artifact, fileName):
+    @defer.inlineCallbacks
+    def _check_file(self, event):
         """
-        Send a file to VirusTotal
+        Fetch the report for a file, upload it if VT has not seen it,
+        and cache the outcome
         """
-        vtUrl = f"{VTAPI_URL}file/scan".encode()
-        fields = {("apikey", self.apiKey)}
-        files = {("file", fileName, open(artifact, "rb"))}
-        if self.debug:
-            log.msg(f"submitting to VT: {files!r}")
-        contentType, body = encode_multipart_formdata(fields, files)
-        producer = StringProducer(body)
-        headers = http_headers.Headers(
+        shasum = event["shasum"]
+        fields = {"apikey": self.apiKey, "resource": shasum, "allinfo": 1}
+        j = yield self._request("file/report", urlencode(fields).encode("utf-8"))
+        if j is None:
+            return None
+
+        if j["response_code"] == 1:
+            self.cache.set("file", shasum, j, self.cache_ttl)
+            return j
+
+        if j["response_code"] != 0 or self.upload is not True:
+            return j
+
+        try:
+            b = os.path.basename(urlparse(event["url"]).path)
+            fileName = b if b != "" else shasum
+        except KeyError:
+            fileName = shasum
+        uploaded = yield self.postfile(event["outfile"], fileName)
+        if not uploaded:
+            return j
+
+        # New files we just uploaded are queued at VT from now on
+        self.cache.set(
+            "file",
+            shasum,
             {
-                "User-Agent": [COWRIE_USER_AGENT],
-                "Accept": ["*/*"],
-                "Content-Type": [contentType],
-            }
+                "response_code": -2,
+                "resource": shasum,
+                "verbose_msg": j.get("verbose_msg", ""),
+            },
+            self.cache_ttl_pending,
         )
+        return j
 
-        d = self.agent.request(b"POST", vtUrl, headers, producer)
+    def _log_file_report(self, event: dict[str, Any], j: dict[str, Any] | None) -> None:
+        """
+        Extract the information we need from the report
+        """
+        if j is None:
+            return
+        log.msg("VT: {}".format(j.get("verbose_msg", "")))
+        if j["response_code"] == 0:
+            log.msg(
+                eventid="cowrie.virustotal.scanfile",
+                format="VT: New file %(sha256)s",
+                session=event["session"],
+                sha256=j["resource"],
+                is_new="true",
+            )
+        elif j["response_code"] == 1:
+            log.msg("VT: response=1: this has been scanned before")
+            log.msg(
+                eventid="cowrie.virustotal.scanfile",
+                format="VT: Binary file with sha256 %(sha256)s was found malicious "
+                "by %(positives)s out of %(total)s feeds (scanned on %(scan_date)s)",
+                session=event["session"],
+                positives=j["positives"],
+                total=j["total"],
+                scan_date=j["scan_date"],
+                sha256=j["resource"],
+                scans=scans_summary(j),
+                is_new="false",
+            )
+            log.msg("VT: permalink: {}".format(j["permalink"]))
+        elif j["response_code"] == -2:
+            log.msg("VT: response=-2: this has been queued for analysis already")
+        else:
+            log.msg("VT: unexpected response code: {}".format(j["response_code"]))
 
-        def cbBody(body):
-            return processResult(body)
+    @defer.inlineCallbacks
+    def postfile(self, artifact, fileName):
+        """
+        Send a file to VirusTotal, True when VT accepted it
+        """
+        fields = {("apikey", self.apiKey)}
+        with open(artifact, "rb") as f:
+            files = {("file", fileName, f)}
+            if self.debug:
+                log.msg(f"submitting to VT: {files!r}")
+            contentType, body = encode_multipart_formdata(fields, files)
 
-        def cbPartial(failure):
-            """
-            Google HTTP Server does not set Content-Length. Twisted marks it as partial
-            """
-            return processResult(failure.value.response)
+        j = yield self._request("file/scan", body, contentType)
+        if j is None:
+            return False
+        # This is always a new resource, since we did the scan before
+        # so always create the comment
+        log.msg("response=0: posting comment")
+        if self.comment is True:
+            yield self.postcomment(j["resource"])
+        return True
 
-        def cbResponse(response):
-            if response.code == 200:
-                d = client.readBody(response)
-                d.addCallback(cbBody)
-                d.addErrback(cbPartial)
-                return d
-            else:
-                log.msg(f"VT postfile failed: {response.code} {response.phrase}")
+    def scanurl(self, event):
+        """
+        Check url scan report for a hash
+        """
+        url = event["url"]
+        cached = self.cache.get("url", url)
+        if cached is not None:
+            log.msg(f"output_virustotal: using cached report for url {url}")
+            self._log_url_report(event, cached)
+            return defer.succeed(None)
+
+        if ("url", url) not in self.inflight:
+            log.msg("Checking url scan report at VT")
+        d = self.inflight.run(("url", url), self._check_url, url)
+        d.addCallback(lambda j: self._log_url_report(event, j))
 
         def cbError(failure):
+            log.msg("VT: Error in scanurl")
             failure.printTraceback()
 
-        def processResult(result):
-            if self.debug:
-                log.msg(f"VT postfile result: {result}")
-            result = result.decode("utf8")
-            j = json.loads(result)
-            # This is always a new resource, since we did the scan before
-            # so always create the comment
-            log.msg("response=0: posting comment")
-            if self.comment is True:
-                return self.postcomment(j["resource"])
-            else:
-                return
-
-        d.addCallback(cbResponse)
         d.addErrback(cbError)
         return d
 
-    def scanurl(self, event):
-        """
-        Check url scan report for a hash
-        """
-        if event["url"] in self.url_cache:
-            log.msg(
-                "output_virustotal: url {} was already successfully submitted".format(
-                    event["url"]
-                )
-            )
-            return
-
-        vtUrl = f"{VTAPI_URL}url/report".encode()
-        headers = http_headers.Headers({"User-Agent": [COWRIE_USER_AGENT]})
+    @defer.inlineCallbacks
+    def _check_url(self, url):
         fields = {
             "apikey": self.apiKey,
-            "resource": event["url"],
+            "resource": url,
             "scan": 1,
             "allinfo": 1,
         }
-        body = StringProducer(urlencode(fields).encode("utf-8"))
-        d = self.agent.request(b"POST", vtUrl, headers, body)
-
-        def cbResponse(response):
-            """
-            Main response callback, checks HTTP response code
-            """
-            if response.code == 200:
-                log.msg(f"VT scanurl successful: {response.code} {response.phrase}")
-                d = client.readBody(response)
-                d.addCallback(cbBody)
-                return d
-            else:
-                log.msg(f"VT scanurl failed: {response.code} {response.phrase}")
-
-        def cbBody(body):
-            """
-            Received body
-            """
-            return processResult(body)
-
-        def cbPartial(failure):
-            """
-            Google HTTP Server does not set Content-Length. Twisted marks it as partial
-            """
-            return processResult(failure.value.response)
-
-        def cbError(failure):
-            log.msg("cbError")
-            failure.printTraceback()
-
-        def processResult(result):
-            """
-            Extract the information we need from the body
-            """
-            if self.debug:
-                log.msg(f"VT scanurl result: {result}")
-            if result == b"[]\n":
-                log.err(f"VT scanurl did not return results: {result}")
-                return
-            result = result.decode("utf8")
-            j = json.loads(result)
-
-            # we got a status=200 assume it was successfully submitted
-            self.url_cache[event["url"]] = datetime.datetime.now()
-
-            if j["response_code"] == 0:
-                log.msg(
-                    eventid="cowrie.virustotal.scanurl",
-                    format="VT: New URL %(url)s",
-                    session=event["session"],
-                    url=event["url"],
-                    is_new="true",
-                )
-                return d
-            elif j["response_code"] == 1 and "scans" not in j:
-                log.msg(
-                    "VT: response=1: this was submitted before but has not yet been scanned."
-                )
-            elif j["response_code"] == 1 and "scans" in j:
-                log.msg("VT: response=1: this has been scanned before")
-                # Add detailed report to json log
-                scans_summary: dict[str, dict[str, str]] = {}
-                for feed, info in j["scans"].items():
-                    feed_key = feed.lower()
-                    scans_summary[feed_key] = {}
-                    scans_summary[feed_key]["detected"] = str(info["detected"]).lower()
-                    scans_summary[feed_key]["result"] = str(info["result"]).lower()
-                log.msg(
-                    eventid="cowrie.virustotal.scanurl",
-                    format="VT: URL %(url)s was found malicious by "
-                    "%(positives)s out of %(total)s feeds (scanned on %(scan_date)s)",
-                    session=event["session"],
-                    positives=j["positives"],
-                    total=j["total"],
-                    scan_date=j["scan_date"],
-                    url=j["url"],
-                    scans=scans_summary,
-                    is_new="false",
-                )
-                log.msg("VT: permalink: {}".format(j["permalink"]))
-            elif j["response_code"] == -2:
-                log.msg("VT: response=-2: this has been queued for analysis already")
-                log.msg("VT: permalink: {}".format(j["permalink"]))
-            else:
-                log.msg("VT: unexpected response code: {}".format(j["response_code"]))
-
-        d.addCallback(cbResponse)
-        d.addErrback(cbError)
-        return d
-
+        j = yield self._request("url/report", urlencode(fields).encode("utf-8"))
+        if j is None:
+            return None
+        # we got a status=200 assume it was successfully submitted
+        if j["response_code"] == 1 and "scans" in j:
+            self.cache.set("url", url, j, self.cache_ttl)
+        else:
+            self.cache.set("url", url, j, self.cache_ttl_pending)
+        return j
+
+    def _log_url_report(self, event: dict[str, Any], j: dict[str, Any] | None) -> None:
+        """
+        Extract the information we need from the report
+        """
+        if j is None:
+            return
+        if j["response_code"] == 0:
+            log.msg(
+                eventid="cowrie.virustotal.scanurl",
+                format="VT: New URL %(url)s",
+                session=event["session"],
+                url=event["url"],
+                is_new="true",
+            )
+        elif j["response_code"] == 1 and "scans" not in j:
+            log.msg(
+                "VT: response=1: this was submitted before but has not yet been scanned."
+            )
+        elif j["response_code"] == 1 and "scans" in j:
+            log.msg("VT: response=1: this has been scanned before")
+            log.msg(
+                eventid="cowrie.virustotal.scanurl",
+                format="VT: URL %(url)s was found malicious by "
+                "%(positives)s out of %(total)s feeds (scanned on %(scan_date)s)",
+                session=event["session"],
+                positives=j["positives"],
+                total=j["total"],
+                scan_date=j["scan_date"],
+                url=j["url"],
+                scans=scans_summary(j),
+                is_new="false",
+            )
+            log.msg("VT: permalink: {}".format(j["permalink"]))
+        elif j["response_code"] == -2:
+            log.msg("VT: response=-2: this has been queued for analysis already")
+            log.msg("VT: permalink: {}".format(j.get("permalink")))
+        else:
+            log.msg("VT: unexpected response code: {}".format(j["response_code"]))
+
+    @defer.inlineCallbacks
     def postcomment(self, resource):
         """
         Send a comment to VirusTotal with Twisted
         """
-        vtUrl = f"{VTAPI_URL}comments/put".encode()
         parameters = {
             "resource": resource,
             "comment": self.commenttext,
             "apikey": self.apiKey,
         }
-        headers = http_headers.Headers({"User-Agent": [COWRIE_USER_AGENT]})
-        body = StringProducer(urlencode(parameters).encode("utf-8"))
-        d = self.agent.request(b"POST", vtUrl, headers, body)
-
-        def cbBody(body):
-            return processResult(body)
-
-        def cbPartial(failure):
-            """
-            Google HTTP Server does not set Content-Length. Twisted marks it as partial
-            """
-            return processResult(failure.value.response)
-
-        def cbResponse(response):
-            if response.code == 200:
-                d = client.readBody(response)
-                d.addCallback(cbBody)
-                d.addErrback(cbPartial)
-                return d
-            else:
-                log.msg(f"VT postcomment failed: {response.code} {response.phrase}")
+        j = yield self._request("comments/put", urlencode(parameters).encode("utf-8"))
+        if j is None:
+            return None
+        return j["response_code"]
 
-        def cbError(failure):
-            failure.printTraceback()
-
-        def processResult(result):
-            if self.debug:
-                log.msg(f"VT postcomment result: {result}")
-            result = result.decode("utf8")
-            j = json.loads(result)
-            return j["response_code"]
 
-        d.addCallback(cbResponse)
-        d.addErrback(cbError)
-        return d
+def scans_summary(j: dict[str, Any]) -> dict[str, dict[str, str]]:
+    """
+    Per feed detection summary for the json log
+    """
+    summary: dict[str, dict[str, str]] = {}
+    for feed, info in j["scans"].items():
+        feed_key = feed.lower()
+        summary[feed_key] = {}
+        summary[feed_key]["detected"] = str(info["detected"]).lower()
+        summary[feed_key]["result"] = str(info["result"]).lower()
+    return summary
 
 
 @implementer(IBodyProducer)
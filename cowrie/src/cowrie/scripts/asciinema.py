@@ -1,10 +1,15 @@
 #!/usr/bin/env python
 
 import getopt
+import hashlib
 import json
 import os
 import struct
 import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from cowrie.core.ttylog import TTYSTRUCT, is_compressed, ttylog_records
 
 OP_OPEN, OP_CLOSE, OP_WRITE, OP_EXEC = 1, 2, 3, 4
 TYPE_INPUT, TYPE_OUTPUT, TYPE_INTERACT = 1, 2, 3
@@ -29,22 +34,12 @@ def playlog(fd, settings):
     stdout = []
     thelog["stdout"] = stdout
 
-    ssize = struct.calcsize("<iLiiLL")
-
     currtty, prevtime, prefdir = 0, 0, 0
     sleeptime = 0.0
 
     color = None
 
-    while 1:
-        try:
-            (op, tty, length, direction, sec, usec) = struct.unpack(
-                "<iLiiLL", fd.read(ssize)
-            )
-            data = fd.read(length)
-        except struct.error:
-            break
-
+    for op, tty, _length, direction, sec, usec, data in ttylog_records(fd):
         if currtty == 0:
             currtty = tty
 
@@ -89,24 +84,172 @@ def playlog(fd, settings):
             json.dump(thelog, outfp, indent=4)
 
 
+def output_events(fd):
+    """
+    (timestamp, data) of every write to the output stream of a tty log
+    """
+    currtty, prefdir = 0, 0
+
+    for op, tty, _length, direction, sec, usec, data in ttylog_records(fd):
+        if currtty == 0:
+            currtty = tty
+
+        if tty == currtty and op == OP_WRITE:
+            # the first stream seen is considered 'output'
+            if prefdir == 0:
+                prefdir = direction
+            if direction == prefdir:
+                curtime = float(sec) + float(usec) / 1000000
+                data = data.replace(b"\n", b"\r\n").decode("UTF-8", "replace")
+                yield curtime, data
+
+        elif tty == currtty and op == OP_CLOSE:
+            break
+
+
+def is_ttylog(fd):
+    if is_compressed(fd):
+        return True
+    ssize = struct.calcsize(TTYSTRUCT)
+    head = fd.read(ssize)
+    fd.seek(0)
+    return len(head) == ssize and struct.unpack(TTYSTRUCT, head)[0] == OP_OPEN
+
+
+def file_sha256(path):
+    shasum = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            shasum.update(chunk)
+    return shasum.hexdigest()
+
+
+def converted_from(castfile):
+    """
+    SHA-256 of the tty log castfile was converted from, if any
+    """
+    try:
+        with open(castfile) as f:
+            return json.loads(f.readline()).get("cowrie_sha256")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def convert_v2(job):
+    """
+    Convert one tty log to an asciicast v2 file, written one event per
+    line as the log is read. Runs in the worker processes of batch mode.
+
+    @param job: (tty log, asciicast file) paths
+    @return: (tty log, status)
+    """
+    logfile, castfile = job
+    tmpfile = castfile + ".tmp"
+    try:
+        shasum = file_sha256(logfile)
+        if converted_from(castfile) == shasum:
+            return logfile, "up to date"
+
+        header = {
+            "version": 2,
+            "width": 80,
+            "height": 24,
+            "command": "/bin/bash",
+            "title": "Cowrie Recording",
+            "env": {"TERM": "xterm256-color", "SHELL": "/bin/bash"},
+            "cowrie_sha256": shasum,
+        }
+        with open(logfile, "rb") as fd:
+            if not is_ttylog(fd):
+                return logfile, "not a tty log"
+            os.makedirs(os.path.dirname(castfile) or ".", exist_ok=True)
+            with open(tmpfile, "w") as out:
+                start = None
+                for curtime, data in output_events(fd):
+                    if start is None:
+                        start = curtime
+                        header["timestamp"] = int(start)
+                        out.write(json.dumps(header) + "\n")
+                    out.write(json.dumps([round(curtime - start, 6), "o", data]) + "\n")
+                if start is None:
+                    out.write(json.dumps(header) + "\n")
+        os.replace(tmpfile, castfile)
+    except (OSError, ValueError, zlib.error) as e:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        return logfile, f"failed: {e}"
+    return logfile, "converted"
+
+
+def batch_jobs(paths, outdir):
+    """
+    (tty log, asciicast file) for every file under paths. Without outdir
+    the asciicast is written next to its tty log.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            logfiles = []
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                logfiles.extend(
+                    os.path.join(dirpath, name)
+                    for name in sorted(filenames)
+                    if not name.endswith((".cast", ".tmp"))
+                )
+            base = path
+        else:
+            logfiles = [path]
+            base = os.path.dirname(path)
+        for logfile in logfiles:
+            if outdir:
+                castfile = os.path.join(outdir, os.path.relpath(logfile, base))
+            else:
+                castfile = logfile
+            yield logfile, castfile + ".cast"
+
+
+def batch(paths, settings):
+    """
+    Convert all tty logs under paths across a pool of processes
+    """
+    jobs = list(batch_jobs(paths, settings["output"]))
+    with ProcessPoolExecutor(max_workers=settings["jobs"]) as pool:
+        for logfile, status in pool.map(convert_v2, jobs, chunksize=8):
+            print(f"{logfile}: {status}")
+
+
 def printhelp(verbose=False):
     print(
         f"usage: {os.path.basename(sys.argv[0])} [-c] [-o output] <tty-log-file> <tty-log-file>..."
     )
+    print(
+        f"       {os.path.basename(sys.argv[0])} -b [-j jobs] [-o outdir] <tty-log-dir|tty-log-file>..."
+    )
 
     if verbose:
         print(
             "  -c             colorify the output based on what streams are being received"
         )
         print("  -h             display this help")
-        print("  -o             write to the specified output file")
+        print(
+            "  -o             write to the specified output file, in batch mode"
+            + " write the\n"
+            + "                 .cast files under this directory instead of next"
+            + " to the logs"
+        )
+        print(
+            "  -b             batch mode: convert directory trees of tty logs to"
+            + " asciicast v2,\n"
+            + "                 skipping logs whose .cast file is already up to date"
+        )
+        print("  -j             number of worker processes (default: one per CPU)")
 
 
 def run():
-    settings = {"colorify": 0, "output": ""}
+    settings = {"colorify": 0, "output": "", "batch": False, "jobs": None}
 
     try:
-        optlist, args = getopt.getopt(sys.argv[1:], "hco:")
+        optlist, args = getopt.getopt(sys.argv[1:], "hcbj:o:")
     except getopt.GetoptError as error:
         sys.stderr.write(f"{sys.argv[0]}: {error}\n")
         printhelp()
@@ -119,11 +262,19 @@ def run():
             settings["colorify"] = True
         if o == "-o":
             settings["output"] = a
+        if o == "-b":
+            settings["batch"] = True
+        if o == "-j":
+            settings["jobs"] = int(a)
 
     if len(args) < 1:
         printhelp()
         sys.exit(2)
 
+    if settings["batch"]:
+        batch(args, settings)
+        return
+
     for logfile in args:
         try:
             logfd = open(logfile, "rb")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import getopt
+import os
+import sys
+
+from cowrie.core.catalog import Catalog, catalog_path
+
+
+def printhelp(verbose=False):
+    name = os.path.basename(sys.argv[0])
+    print(f"usage: {name} [-d db] index <cowrie.json>...")
+    print(f"       {name} [-d db] command|input|artifact|ip|session <term>")
+
+    if verbose:
+        print("  -d             catalog database (default from cowrie.cfg)")
+        print("  -h             display this help")
+        print("  index          add the events written to the logs since last time")
+        print("  command        command lines running the program <term>")
+        print("  input          command lines containing <term>")
+        print("  artifact       sessions that downloaded or uploaded SHA-256 <term>")
+        print("  ip             sessions from address <term>")
+        print("  session        TTY logs, commands and artifacts of session <term>")
+
+
+def show(rows):
+    for row in rows:
+        print("\t".join("" if v is None else str(v) for v in row))
+
+
+def run():
+    db = ""
+
+    try:
+        optlist, args = getopt.getopt(sys.argv[1:], "hd:")
+    except getopt.GetoptError as error:
+        sys.stderr.write(f"{sys.argv[0]}: {error}\n")
+        printhelp()
+        sys.exit(1)
+
+    for o, a in optlist:
+        if o == "-h":
+            printhelp(verbose=True)
+            sys.exit(0)
+        if o == "-d":
+            db = a
+
+    if len(args) < 2:
+        printhelp()
+        sys.exit(2)
+
+    catalog = Catalog(db or catalog_path())
+    action, terms = args[0], args[1:]
+
+    if action == "index":
+        for logfile in terms:
+            try:
+                count = catalog.index(logfile)
+            except OSError as e:
+                sys.stderr.write(f"{sys.argv[0]}: {e}\n")
+                continue
+            print(f"{logfile}: {count} events")
+    elif action == "command":
+        show(catalog.sessions_by_command(terms[0]))
+    elif action == "input":
+        show(catalog.sessions_by_input(" ".join(terms)))
+    elif action == "artifact":
+        show(catalog.sessions_by_artifact(terms[0]))
+    elif action == "ip":
+        show(catalog.sessions_by_ip(terms[0]))
+    elif action == "session":
+        found = catalog.session(terms[0])
+        if found["session"] is None:
+            sys.stderr.write(f"{sys.argv[0]}: no session {terms[0]}\n")
+            sys.exit(1)
+        show([found["session"]])
+        for part in ("ttylogs", "commands", "artifacts"):
+            print(f"\n{part}:")
+            show(found[part])
+    else:
+        printhelp()
+        sys.exit(2)
+
+    catalog.close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Write src/cowrie/commands/manifest.py, the list of the commands each
+module in cowrie.commands provides, with `make manifest`. Run it after
+adding a command.
+"""
+
+from __future__ import annotations
+
+from importlib import import_module
+import os
+import sys
+
+# The command modules import the shell, which needs to come first
+import cowrie.shell.protocol
+import cowrie.commands
+
+HEADER = '''"""
+Commands provided by each module in cowrie.commands, so that a module is
+only imported when one of its commands is first run.
+
+Generated by src/cowrie/scripts/commandmanifest.py, do not edit.
+"""
+
+from __future__ import annotations
+
+'''
+
+
+def generate() -> str:
+    """
+    Source of the manifest module
+    """
+    lines = [HEADER, "manifest: dict[str, tuple[str, ...]] = {\n"]
+    for module in cowrie.commands.__all__:
+        names = list(import_module(f"cowrie.commands.{module}").commands)
+        if len(names) == 1:
+            lines.append(f'    "{module}": ("{names[0]}",),\n')
+            continue
+        lines.append(f'    "{module}": (\n')
+        lines.extend(f'        "{name}",\n' for name in names)
+        lines.append("    ),\n")
+    lines.append("}\n")
+    return "".join(lines)
+
+
+def run() -> None:
+    path = os.path.join(os.path.dirname(cowrie.commands.__file__), "manifest.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(generate())
+    print(f"{sys.argv[0]}: wrote {path}")
+
+
+if __name__ == "__main__":
+    run()
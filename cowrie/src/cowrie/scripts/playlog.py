@@ -9,17 +9,15 @@ import struct
 import sys
 import time
 
+from cowrie.core.ttylog import is_compressed, ttylog_records
+
 OP_OPEN, OP_CLOSE, OP_WRITE, OP_EXEC = 1, 2, 3, 4
 TYPE_INPUT, TYPE_OUTPUT, TYPE_INTERACT = 1, 2, 3
 
 
-def playlog(fd, settings):
+def tail_records(fd, settings):
     ssize = struct.calcsize("<iLiiLL")
-    currtty, prevtime, prefdir = 0, 0, 0
-
-    color = None
-
-    stdout = sys.stdout.buffer
+    start = None
 
     while 1:
         try:
@@ -28,13 +26,32 @@ def playlog(fd, settings):
             )
             data = fd.read(length)
         except struct.error:
-            if settings["tail"]:
-                prevtime = 0
-                time.sleep(0.1)
-                settings["maxdelay"] = 0
-                continue
-            break
+            time.sleep(0.1)
+            settings["maxdelay"] = 0
+            continue
+        # Skip what happened before -s seconds into the session, like
+        # ttylog_records does
+        if start is None:
+            start = sec + usec / 1000000 + settings["start"]
+        if settings["start"] and sec + usec / 1000000 < start:
+            continue
+        yield op, tty, length, direction, sec, usec, data
 
+
+def playlog(fd, settings):
+    currtty, prevtime, prefdir = 0, 0, 0
+
+    color = None
+
+    stdout = sys.stdout.buffer
+
+    # Compressed logs are only complete once closed, follow raw logs only
+    if settings["tail"] and not is_compressed(fd):
+        records = tail_records(fd, settings)
+    else:
+        records = ttylog_records(fd, settings["start"])
+
+    for op, tty, _length, direction, sec, usec, data in records:
         if currtty == 0:
             currtty = tty
 
@@ -73,7 +90,7 @@ def playlog(fd, settings):
 
 def printhelp(brief=0):
     print(
-        f"Usage: {os.path.basename(sys.argv[0])} [-bfhi] [-m secs] [-w file] <tty-log-file> <tty-log-file>...\n"
+        f"Usage: {os.path.basename(sys.argv[0])} [-bfhi] [-m secs] [-s secs] [-w file] <tty-log-file> <tty-log-file>...\n"
     )
 
     if not brief:
@@ -83,6 +100,11 @@ def printhelp(brief=0):
             + " boredom or fast-forward\n"
             + "                 to the end. (default is 3.0)"
         )
+        print(
+            "  -s <seconds>   start playback this many seconds into the"
+            + " session, compressed\n"
+            + "                 logs seek there using their block index"
+        )
         print("  -i             show the input stream instead of output")
         print("  -b             show both input and output streams")
         print(
@@ -97,13 +119,14 @@ def run():
     settings = {
         "tail": 0,
         "maxdelay": 3.0,
+        "start": 0.0,
         "input_only": 0,
         "both_dirs": 0,
         "colorify": 0,
     }
 
     try:
-        optlist, args = getopt.getopt(sys.argv[1:], "fhibcm:w:", ["help"])
+        optlist, args = getopt.getopt(sys.argv[1:], "fhibcm:s:w:", ["help"])
     except getopt.GetoptError as error:
         print(f"Error: {error}\n")
         printhelp()
@@ -119,6 +142,8 @@ def run():
             settings["tail"] = 1
         elif o == "-m":
             settings["maxdelay"] = float(a)  # takes decimals
+        elif o == "-s":
+            settings["start"] = float(a)
         elif o == "-i":
             settings["input_only"] = 1
         elif o == "-b":
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import getopt
+import os
+import sys
+
+from cowrie.core.ttylog import ttylog_convert
+
+
+def printhelp(verbose=False):
+    print(
+        f"usage: {os.path.basename(sys.argv[0])} [-d] [-o output] <tty-log-file> <tty-log-file>..."
+    )
+
+    if verbose:
+        print("  -d             write the raw format instead of the compressed one")
+        print("  -h             display this help")
+        print(
+            "  -o             write to the specified output file, only with a"
+            + " single log.\n"
+            + "                 By default each log is replaced in place"
+        )
+
+
+def convert(logfile, output, compress):
+    tmpfile = output + ".tmp"
+    with open(logfile, "rb") as src, open(tmpfile, "wb") as dst:
+        ttylog_convert(src, dst, compress)
+    os.replace(tmpfile, output)
+
+
+def run():
+    settings = {"compress": True, "output": ""}
+
+    try:
+        optlist, args = getopt.getopt(sys.argv[1:], "hdo:")
+    except getopt.GetoptError as error:
+        sys.stderr.write(f"{sys.argv[0]}: {error}\n")
+        printhelp()
+        sys.exit(1)
+
+    for o, a in optlist:
+        if o == "-h":
+            printhelp(verbose=True)
+            sys.exit(0)
+        if o == "-d":
+            settings["compress"] = False
+        if o == "-o":
+            settings["output"] = a
+
+    if len(args) < 1 or (settings["output"] and len(args) > 1):
+        printhelp()
+        sys.exit(2)
+
+    for logfile in args:
+        try:
+            convert(logfile, settings["output"] or logfile, settings["compress"])
+        except OSError as e:
+            sys.stderr.write(f"{sys.argv[0]}: {e}\n")
+
+
+if __name__ == "__main__":
+    run()
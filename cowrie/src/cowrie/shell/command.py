@@ -7,21 +7,32 @@ This module contains code to run a command
 
 from __future__ import annotations
 
+from collections.abc import MutableMapping
+from importlib import import_module
 import os
 import re
 import shlex
 import stat
 import time
+import traceback
 
-from twisted.internet import error
+from twisted.internet import defer, error, task
 from twisted.python import failure, log
 
 from cowrie.core.config import CowrieConfig
+from cowrie.core.cache import LRUCache
+from cowrie.core.cooperator import cooperator
 from cowrie.shell import fs
-from typing import TYPE_CHECKING
+from typing import Any, TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Iterator
+
+    from cowrie.shell.profiling import CommandProfile
+
+# Output of memoized commands, shared by all sessions: the stdout and
+# stderr writes of one run, keyed by HoneyPotCommand.memoKey()
+outputCache = LRUCache(CowrieConfig.getint("shell", "output_cache_size", fallback=256))
 
 
 class HoneyPotCommand:
@@ -31,6 +42,22 @@ class HoneyPotCommand:
 
     safeoutfile: str = ""
 
+    # Set by commands without side effects whose output only depends on
+    # their arguments, the configuration, the emulated server and the
+    # environment variables in memoenv, see memoKey()
+    memoize: bool = False
+    memoenv: tuple[str, ...] = ()
+
+    # Runs the work of commands that take many steps, see cooperate()
+    cooperator: task.Cooperator = cooperator
+    cooperativeTask: task.CooperativeTask | None = None
+
+    # Set by call_command when command profiling is on
+    profile: CommandProfile | None = None
+
+    # writefn while memoized() records the output
+    recordedWritefn: Callable[[bytes], None] | None = None
+
     def __init__(self, protocol, *args):
         self.protocol = protocol
         self.args = list(args)
@@ -40,6 +67,7 @@ class HoneyPotCommand:
         self.input_data: None | (
             bytes
         ) = None  # used to store STDIN data passed via PIPE
+        self.pp = self.protocol.pp
         self.writefn: Callable[[bytes], None] = self.protocol.pp.outReceived
         self.errorWritefn: Callable[[bytes], None] = self.protocol.pp.errReceived
         # MS-DOS style redirect handling, inside the command
@@ -101,30 +129,66 @@ class HoneyPotCommand:
                     self.safeoutfile = ""
 
                 else:
-                    with open(self.safeoutfile, "ab"):
-                        self.fs.update_realfile(
-                            self.fs.getfile(self.outfile), self.safeoutfile
-                        )
+                    self.protocol.captures.open(self.safeoutfile)
+                    self.fs.update_realfile(
+                        self.fs.getfile(self.outfile), self.safeoutfile
+                    )
             else:
                 self.safeoutfile = p[fs.A_REALFILE]
 
+    @classmethod
+    def stdin_limit(cls, args: list[str]) -> tuple[int, int]:
+        """
+        Most bytes and lines of standard input the command reads when run
+        with args, 0 for all of it. Output piped into it past that point
+        is dropped.
+        """
+        return 0, 0
+
+    def outputClosed(self) -> bool:
+        """
+        True when stdout is a pipe whose reader takes no more input.
+        Commands that keep writing can stop early.
+        """
+        return self.stdoutIsPipeline() and self.pp.outputClosed()
+
+    def outputPaused(self) -> bool:
+        """
+        True when stdout is the terminal and output written now would be
+        dropped. Commands that keep writing should wait or stop.
+        """
+        return self.stdoutIsPipeline() and self.pp.outputPaused()
+
+    def stdoutIsPipeline(self) -> bool:
+        """
+        True when stdout goes to the next command or the terminal, not
+        to a file
+        """
+        writefn = self.recordedWritefn or self.writefn
+        return writefn == self.pp.outReceived
+
     def write(self, data: str) -> None:
         """
         Write a string to the user on stdout
         """
-        self.writefn(data.encode("utf8"))
+        self.writeBytes(data.encode("utf8"))
 
     def writeBytes(self, data: bytes) -> None:
         """
         Like write() but input is bytes
         """
+        if self.profile is not None:
+            self.profile.output += len(data)
         self.writefn(data)
 
     def errorWrite(self, data: str) -> None:
         """
         Write errors to the user on stderr
         """
-        self.errorWritefn(data.encode("utf8"))
+        encoded = data.encode("utf8")
+        if self.profile is not None:
+            self.profile.output += len(encoded)
+        self.errorWritefn(encoded)
 
     def check_arguments(self, application, args):
         files = []
@@ -142,9 +206,7 @@ class HoneyPotCommand:
         self.input_data = data
 
     def write_to_file(self, data: bytes) -> None:
-        with open(self.safeoutfile, "ab") as f:
-            f.write(data)
-        self.writtenBytes += len(data)
+        self.writtenBytes += self.protocol.captures.open(self.safeoutfile).write(data)
         self.fs.update_size(self.outfile, self.writtenBytes)
 
     def write_to_failed(self, data: bytes) -> None:
@@ -152,22 +214,125 @@ class HoneyPotCommand:
 
     def start(self) -> None:
         if self.writefn != self.write_to_failed:
-            self.call()
+            self.memoized(self.call)
         self.exit()
 
+    def memoKey(self) -> tuple[Any, ...] | None:
+        """
+        Key under which the output of this run is shared with other runs
+        and sessions, None when the command has to run
+        """
+        if not self.memoize:
+            return None
+        return (
+            type(self),
+            tuple(self.args),
+            self.fs.arch,
+            self.protocol.hostname,
+            tuple(self.environ.get(name) for name in self.memoenv),
+        )
+
+    def memoized(self, render: Callable[[], None]) -> None:
+        """
+        Run render, or replay what it wrote when an earlier run had the
+        same memoKey()
+        """
+        key = self.memoKey() if outputCache.maxsize else None
+        if key is None:
+            render()
+            return
+
+        found, output = outputCache.get(key)
+        if found:
+            for stderr, data in output:
+                if self.profile is not None:
+                    self.profile.output += len(data)
+                if stderr:
+                    self.errorWritefn(data)
+                else:
+                    self.writefn(data)
+            return
+
+        writes: list[tuple[bool, bytes]] = []
+        writefn, errorWritefn = self.writefn, self.errorWritefn
+
+        def record(data: bytes) -> None:
+            writes.append((False, data))
+            writefn(data)
+
+        def recordError(data: bytes) -> None:
+            writes.append((True, data))
+            errorWritefn(data)
+
+        self.writefn, self.errorWritefn = record, recordError
+        self.recordedWritefn = writefn
+        try:
+            render()
+        finally:
+            self.writefn, self.errorWritefn = writefn, errorWritefn
+            self.recordedWritefn = None
+        # Output cut short by a closed pipe is not kept
+        if not (self.outputClosed() or self.outputPaused()):
+            outputCache.set(key, tuple(writes))
+
     def call(self) -> None:
         self.write(f"Hello World! [{self.args!r}]\n")
 
+    def cooperate(self, work: Iterator[Any]) -> None:
+        """
+        Run work, an iterator doing part of the command on each step, then
+        exit. Output for the terminal or a file is produced a few steps at
+        a time between the work of other sessions, waiting while the
+        terminal has as much queued as it takes. Output read by the next
+        command in a pipeline or by a command substitution is produced at
+        once, as those read it when this command returns.
+        """
+        if self.pp.next_command is not None or self.pp.redirect:
+            for _ in work:
+                pass
+            self.exit()
+            return
+
+        if self.profile is not None:
+            work = self.profile.timed(work)
+
+        def steps() -> Iterator[Any]:
+            for step in work:
+                if self.protocol.terminal is None:
+                    return
+                yield step
+                if self.outputPaused():
+                    drained: defer.Deferred[None] = defer.Deferred()
+                    self.protocol.terminal.afterOutput(drained.callback, None)
+                    yield drained
+
+        def done(result: Any) -> None:
+            self.cooperativeTask = None
+            self.exit()
+
+        def failed(reason: failure.Failure) -> None:
+            if reason.check(task.TaskStopped):
+                return
+            log.err(reason, f"{self} failed")
+            done(None)
+
+        self.cooperativeTask = self.cooperator.cooperate(steps())
+        self.cooperativeTask.whenDone().addCallbacks(done, failed)
+
     def exit(self) -> None:
         """
         Sometimes client is disconnected and command exits after. So cmdstack is gone
         """
+        if self.profile is not None:
+            self.profile.exited()
+
         if (
             self.protocol
             and self.protocol.terminal
             and hasattr(self, "safeoutfile")
             and self.safeoutfile
         ):
+            self.protocol.captures.close(self.safeoutfile)
             if hasattr(self, "outfile") and self.outfile:
                 self.protocol.terminal.redirFiles.add((self.safeoutfile, self.outfile))
             else:
@@ -182,12 +347,15 @@ class HoneyPotCommand:
             ret = failure.Failure(error.ProcessDone(status=""))
             # The session could be disconnected already, when his happens .transport is gone
             try:
-                self.protocol.terminal.transport.processEnded(ret)
+                self.protocol.terminal.processEnded(ret)
             except AttributeError:
                 pass
 
     def handle_CTRL_C(self) -> None:
         log.msg("Received CTRL-C, exiting..")
+        if self.cooperativeTask is not None:
+            self.cooperativeTask.stop()
+            self.cooperativeTask = None
         self.write("^C\n")
         self.exit()
 
@@ -208,3 +376,57 @@ class HoneyPotCommand:
 
     def __repr__(self) -> str:
         return str(self.__class__.__name__)
+
+
+class CommandRegistry(MutableMapping[str, Any]):
+    """
+    Command classes by name and by path. The module of a command, as
+    listed in cowrie.commands.manifest, is imported the first time the
+    command is looked up or tested for. A command whose module fails to
+    import is left out. Commands can also be added at runtime.
+    """
+
+    def __init__(self, manifest: dict[str, tuple[str, ...]]) -> None:
+        # Module of each command whose module is not imported yet
+        self.pending: dict[str, str] = {
+            name: module for module, names in manifest.items() for name in names
+        }
+        self.loaded: dict[str, Any] = {}
+
+    def load(self, module: str) -> None:
+        names = [name for name, m in self.pending.items() if m == module]
+        for name in names:
+            del self.pending[name]
+        try:
+            commands = import_module(f"cowrie.commands.{module}").commands
+        except ImportError as e:
+            log.err(f"Failed to import command {module}: {e}: {traceback.format_exc()}")
+            return
+        for name in names:
+            if name in commands:
+                self.loaded[name] = commands[name]
+
+    def __getitem__(self, name: str) -> Any:
+        if name in self.pending:
+            self.load(self.pending[name])
+        return self.loaded[name]
+
+    def __setitem__(self, name: str, cmdclass: Any) -> None:
+        self.pending.pop(name, None)
+        self.loaded[name] = cmdclass
+
+    def __delitem__(self, name: str) -> None:
+        if self.pending.pop(name, None) is None:
+            del self.loaded[name]
+
+    def __contains__(self, name: object) -> bool:
+        if name in self.pending:
+            self.load(self.pending[name])  # type: ignore[index]
+        return name in self.loaded
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.loaded
+        yield from self.pending
+
+    def __len__(self) -> int:
+        return len(self.loaded) + len(self.pending)
@@ -7,7 +7,9 @@ from __future__ import annotations
 
 import errno
 import fnmatch
+import functools
 import hashlib
+import itertools
 import os
 from pathlib import Path
 import pickle
@@ -19,6 +21,7 @@ from typing import Any
 
 from twisted.python import log
 
+from cowrie.core.artifact import sha256_file, store
 from cowrie.core.config import CowrieConfig
 
 (
@@ -38,6 +41,100 @@ T_LINK, T_DIR, T_FILE, T_BLK, T_CHR, T_SOCK, T_FIFO = list(range(0, 7))
 
 SPECIAL_PATHS: list[str] = ["/sys", "/proc", "/dev/pts"]
 
+# Characters that make a word a pattern to match against the filesystem
+GLOB_MAGIC = re.compile(r"[*?[]")
+
+# Pattern characters quoted on the command line stand for themselves. The
+# shell hands them to Glob.expand() as these private use characters.
+QUOTED: dict[str, str] = {c: chr(0xF700 + ord(c)) for c in "*?[{},"}
+_UNQUOTE = {ord(q): c for c, q in QUOTED.items()}
+_ESCAPE = {**_UNQUOTE, **{ord(QUOTED[c]): f"[{c}]" for c in "*?["}}
+
+# Most words a brace expression expands into, deepest nesting of braces
+# and most characters read looking for them. Words going past any of
+# these are left as they are.
+MAX_BRACE_WORDS: int = 1024
+MAX_BRACE_DEPTH: int = 32
+MAX_BRACE_SCAN: int = 65536
+
+
+class _BraceLimit(Exception):
+    pass
+
+
+def expand_braces(word: str) -> list[str]:
+    """
+    Words of a brace expression like bash makes them, a{b,c{d,e}}f gives
+    abf acdf acef. Only comma separated lists are expanded, not sequences.
+    """
+    if "{" not in word:
+        return [word]
+    budget = MAX_BRACE_SCAN
+
+    def group(text: str, start: int) -> tuple[list[str], int] | None:
+        """
+        Alternatives of the list opened at text[start] and the position
+        of its closing brace. As in bash, a closing brace before the
+        first comma is an ordinary character.
+        """
+        nonlocal budget
+        level = 0
+        commas = [start]
+        i = start + 1
+        while i < len(text):
+            c = text[i]
+            if c == "{":
+                level += 1
+            elif c == "}" and level:
+                level -= 1
+            elif c == "}" and len(commas) > 1:
+                break
+            elif c == "," and not level:
+                commas.append(i)
+            i += 1
+        budget -= i - start
+        if budget < 0:
+            raise _BraceLimit
+        if i == len(text):
+            return None
+        return [text[a + 1 : b] for a, b in itertools.pairwise([*commas, i])], i
+
+    def expand(text: str, depth: int) -> list[str]:
+        if depth > MAX_BRACE_DEPTH:
+            raise _BraceLimit
+        start = text.find("{")
+        found = None
+        while start != -1 and found is None:
+            # bash skips an opening brace that starts a word when it is
+            # followed by a space or a closing brace
+            if start or text[1:2] not in ("}", " ", "\t"):
+                found = group(text, start)
+            if found is None:
+                start = text.find("{", start + 1)
+        if found is None:
+            return [text]
+        alternatives, end = found
+        words = [w for x in alternatives for w in expand(x, depth + 1)]
+        rest = expand(text[end + 1 :], depth + 1)
+        if len(words) * len(rest) > MAX_BRACE_WORDS:
+            raise _BraceLimit
+        return [text[:start] + w + r for w in words for r in rest]
+
+    try:
+        return expand(word, 0)
+    except _BraceLimit:
+        return [word]
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_pattern(pattern: str) -> Any:
+    """
+    Match function of a shell pattern for one path component. fnmatch
+    makes its stars match without backtracking, so patterns like
+    *a*a*a*a*b take linear time on any name.
+    """
+    return re.compile(fnmatch.translate(pattern)).match
+
 
 class _statobj:
     """
@@ -123,10 +220,19 @@ class HoneyPotFilesystem:
         # Keep track of open file descriptors
         self.tempfiles: dict[int, str] = {}
         self.filenames: dict[int, str] = {}
+        # Running SHA-256 and write offset of each upload. The hash is
+        # dropped when a client writes out of order, the file is then
+        # hashed from disk on close.
+        self.hashes: dict[int, Any] = {}
+        self.offsets: dict[int, int] = {}
 
         # Keep count of new files, so we can have an artificial limit
         self.newcount: int = 0
 
+        # Bumped whenever an entry is added, removed or renamed, so that
+        # lookups cached against the tree know when to start over
+        self.generation: int = 0
+
         # Get the honeyfs path from the config file and explore it for file
         # contents:
         self.init_honeyfs(CowrieConfig.get("honeypot", "contents_path"))
@@ -183,30 +289,7 @@ class HoneyPotFilesystem:
         """
         Resolve_path with wildcard support (globbing)
         """
-        pieces: list[str] = path.rstrip("/").split("/")
-        cwdpieces: list[str]
-        if len(pieces[0]):
-            cwdpieces = [x for x in cwd.split("/") if len(x) and x is not None]
-            path = path[1:]
-        else:
-            cwdpieces, pieces = [], pieces[1:]
-        found: list[str] = []
-
-        def foo(p, cwd):
-            if not p:
-                found.append("/{}".format("/".join(cwd)))
-            elif p[0] == ".":
-                foo(p[1:], cwd)
-            elif p[0] == "..":
-                foo(p[1:], cwd[:-1])
-            else:
-                names = [x[A_NAME] for x in self.get_path("/".join(cwd))]
-                matches = [x for x in names if fnmatch.fnmatchcase(x, p[0])]
-                for match in matches:
-                    foo(p[1:], [*cwd, match])
-
-        foo(pieces, cwdpieces)
-        return found
+        return Glob(self, cwd).resolve(path)
 
     def get_path(self, path: str, follow_symlinks: bool = True) -> Any:
         """
@@ -354,6 +437,7 @@ class HoneyPotFilesystem:
             _dir.remove(next(x for x in _dir if x[A_NAME] == outfile))
         _dir.append([outfile, T_FILE, uid, gid, size, mode, ctime, [], None, None])
         self.newcount += 1
+        self.generation += 1
         return True
 
     def mkdir(
@@ -379,6 +463,7 @@ class HoneyPotFilesystem:
             [os.path.basename(path), T_DIR, uid, gid, size, mode, ctime, [], None, None]
         )
         self.newcount += 1
+        self.generation += 1
 
     def isfile(self, path: str) -> bool:
         """
@@ -461,6 +546,8 @@ class HoneyPotFilesystem:
             self.update_realfile(self.getfile(filename), hostfile)
             self.tempfiles[fd] = hostfile
             self.filenames[fd] = filename
+            self.hashes[fd] = hashlib.sha256()
+            self.offsets[fd] = 0
             return fd
 
         # TODO: throw exception
@@ -475,21 +562,31 @@ class HoneyPotFilesystem:
         raise NotImplementedError
 
     def write(self, fd: int, string: bytes) -> int:
-        return os.write(fd, string)
+        written = os.write(fd, string)
+        if self.hashes.get(fd) is not None:
+            # Sequential writes only: the hash covers bytes 0 to offset
+            if os.lseek(fd, 0, os.SEEK_CUR) - written == self.offsets[fd]:
+                self.hashes[fd].update(string[:written])
+                self.offsets[fd] += written
+            else:
+                self.hashes[fd] = None
+        return written
 
     def close(self, fd: int) -> None:
         if not fd:
             return
         if self.tempfiles[fd] is not None:
-            with open(self.tempfiles[fd], "rb") as f:
-                shasum: str = hashlib.sha256(f.read()).hexdigest()
-            shasumfile: str = (
-                CowrieConfig.get("honeypot", "download_path") + "/" + shasum
-            )
-            if os.path.exists(shasumfile):
-                os.remove(self.tempfiles[fd])
+            inputhash = self.hashes.pop(fd, None)
+            size = self.offsets.pop(fd, 0)
+            if inputhash is not None and size == os.fstat(fd).st_size:
+                shasum: str = inputhash.hexdigest()
             else:
-                os.rename(self.tempfiles[fd], shasumfile)
+                shasum = sha256_file(self.tempfiles[fd])
+            shasumfile, _ = store(
+                self.tempfiles[fd],
+                shasum,
+                CowrieConfig.get("honeypot", "download_path"),
+            )
             self.update_realfile(self.getfile(self.filenames[fd]), shasumfile)
             log.msg(
                 format='SFTP Uploaded file "%(filename)s" to %(outfile)s',
@@ -531,6 +628,7 @@ class HoneyPotFilesystem:
         for i in pdir[:]:
             if i[A_NAME] == name:
                 pdir.remove(i)
+                self.generation += 1
                 return True
         return False
 
@@ -560,6 +658,7 @@ class HoneyPotFilesystem:
         if not p:
             raise OSError(errno.ENOENT, os.strerror(errno.ENOENT))
         self.get_path(os.path.dirname(path)).remove(p)
+        self.generation += 1
 
     def readlink(self, path: str) -> str:
         p: list[Any] | None = self.getfile(path, follow_symlinks=False)
@@ -583,6 +682,7 @@ class HoneyPotFilesystem:
         self.get_path(os.path.dirname(oldpath)).remove(old)
         old[A_NAME] = os.path.basename(newpath)
         self.get_path(os.path.dirname(newpath)).append(old)
+        self.generation += 1
 
     def listdir(self, path: str) -> list[str]:
         names: list[str] = [x[A_NAME] for x in self.get_path(path)]
@@ -624,3 +724,153 @@ class HoneyPotFilesystem:
         if f[A_TYPE] != T_FILE:
             return
         f[A_SIZE] = size
+
+
+def _join(parent: str, name: str) -> str:
+    if not parent or parent.endswith("/"):
+        return parent + name
+    return f"{parent}/{name}"
+
+
+class Glob:
+    """
+    Pathname expansion of the words of a command line. Directory listings
+    are read once and kept for the life of the instance, so make one per
+    command line: it does not see later changes to the filesystem.
+    """
+
+    def __init__(self, fs: HoneyPotFilesystem, cwd: str) -> None:
+        self.fs = fs
+        self.cwd = cwd
+        self.listings: dict[str, dict[str, list[Any]] | None] = {}
+        # Entries found in listings, by path
+        self.entries: dict[str, list[Any]] = {}
+
+    def resolve(self, word: str) -> list[str]:
+        """
+        Absolute paths of the existing files word names
+        """
+        return [path for word in expand_braces(word) for path, _ in self.glob(word)]
+
+    def expand(self, word: str) -> list[str]:
+        """
+        The words bash turns word into: its brace expansion with each
+        pattern replaced by the matching paths, as typed, or kept when
+        nothing matches. Characters of word that were quoted are given
+        as their QUOTED counterparts.
+        """
+        found: list[str] = []
+        for expanded in expand_braces(word):
+            literal = expanded.translate(_UNQUOTE)
+            if not GLOB_MAGIC.search(expanded):
+                found.append(literal)
+                continue
+            matches = [typed for _, typed in self.glob(expanded.translate(_ESCAPE))]
+            found.extend(matches or [literal])
+        return found
+
+    def listing(self, path: str) -> dict[str, list[Any]] | None:
+        """
+        Entries of directory path by name, None when it is not a directory
+        """
+        if path not in self.listings:
+            f = self.entries.get(path)
+            if f is None or f[A_TYPE] == T_LINK:
+                f = self.fs.getfile(path)
+            if f is None or f[A_TYPE] != T_DIR:
+                self.listings[path] = None
+            else:
+                self.listings[path] = {x[A_NAME]: x for x in f[A_CONTENTS]}
+        return self.listings[path]
+
+    def glob(self, word: str) -> list[tuple[str, str]]:
+        """
+        Existing paths matching word, which has no braces, as absolute
+        paths and as typed, sorted by the latter like bash sorts them
+        """
+        if word == "~" or word.startswith("~/"):
+            word = self.fs.home + word[1:]
+        if not GLOB_MAGIC.search(word):
+            path = self.resolve_path(word)
+            return [(path, word)] if path and self.fs.lexists(path) else []
+
+        segments: list[str] = []
+        for segment in word.split("/"):
+            if segment and not (segment == "**" and segments[-1:] == ["**"]):
+                segments.append(segment)
+
+        # Candidate paths after each segment, absolute path to as typed
+        paths: dict[str, str] = {"/": "/"} if word.startswith("/") else {self.cwd: ""}
+        for n, segment in enumerate(segments):
+            last = n == len(segments) - 1
+            found: dict[str, str] = {}
+            for path, typed in paths.items():
+                entries = self.listing(path)
+                if entries is None:
+                    continue
+                if segment in (".", ".."):
+                    found.setdefault(
+                        self.fs.resolve_path(segment, path), _join(typed, segment)
+                    )
+                elif segment == "**":
+                    self.descend(path, typed, last, found)
+                elif not GLOB_MAGIC.search(segment):
+                    if segment in entries:
+                        self.add(found, path, typed, entries[segment])
+                else:
+                    match = compile_pattern(segment)
+                    hidden = segment.startswith(".")
+                    for name in filter(match, entries):
+                        if hidden or name[0] != ".":
+                            self.add(found, path, typed, entries[name])
+            paths = found
+
+        if word.endswith("/"):
+            return sorted(
+                (
+                    (path, typed + "/")
+                    for path, typed in paths.items()
+                    if self.listing(path) is not None
+                ),
+                key=lambda x: x[1],
+            )
+        return sorted(paths.items(), key=lambda x: x[1])
+
+    def descend(self, path: str, typed: str, last: bool, found: dict[str, str]) -> None:
+        """
+        Add what ** matches below path to found: every directory, not
+        following symbolic links, or every entry when it ends the word
+        """
+        if not last:
+            found.setdefault(path, typed)
+        stack = [(path, typed)]
+        while stack:
+            path, typed = stack.pop()
+            entries = self.listing(path)
+            if entries is None:
+                continue
+            children = []
+            for name, entry in entries.items():
+                if name.startswith("."):
+                    continue
+                if entry[A_TYPE] == T_DIR:
+                    children.append(self.add(found, path, typed, entry))
+                elif last:
+                    self.add(found, path, typed, entry)
+            stack.extend(reversed(children))
+
+    def add(
+        self, found: dict[str, str], path: str, typed: str, entry: list[Any]
+    ) -> tuple[str, str]:
+        """
+        Add entry of directory path to found
+        """
+        child = _join(path, entry[A_NAME])
+        self.entries[child] = entry
+        found.setdefault(child, _join(typed, entry[A_NAME]))
+        return child, found[child]
+
+    def resolve_path(self, word: str) -> str:
+        if not word:
+            return ""
+        return self.fs.resolve_path(word, self.cwd)
@@ -15,9 +15,111 @@ from twisted.python import failure, log
 from twisted.python.compat import iterbytes
 
 from cowrie.core.config import CowrieConfig
+from cowrie.core.cache import LRUCache
 from cowrie.shell import fs
 from cowrie.shell import protocol
 
+ENV_RE = re.compile(r"^\$([_a-zA-Z0-9]+)$")
+ENV_BRACES_RE = re.compile(r"^\${([_a-zA-Z0-9]+)}$")
+GLOB_RE = re.compile(r"[*?[{]")
+
+# Tokenized command lines, shared by all sessions. Bots send the same
+# long one-liners over and over, each is only run through shlex once.
+tokenCache = LRUCache(CowrieConfig.getint("shell", "token_cache_size", fallback=1024))
+
+
+class GlobWord(str):
+    """
+    A word with wildcards or braces that are not quoted. pattern is the
+    word with its quoted pattern characters as fs.QUOTED characters.
+    """
+
+    pattern: str
+
+
+def lex(line: str) -> tuple[list[str], ValueError | None]:
+    """
+    shlex tokens of line and the error that stopped the lexer early
+    """
+    lexer = shlex.shlex(instream=line, punctuation_chars=True, posix=True)
+    # Add these special characters that are not in the default lexer
+    lexer.wordchars += "@%{}[]=$:+^,()`"
+    tokens: list[str] = []
+    err: ValueError | None = None
+    try:
+        while (tok := lexer.get_token()) is not None:
+            tokens.append(tok)
+    except ValueError as e:
+        err = e
+    return tokens, err
+
+
+def mark_quoted(line: str) -> str:
+    """
+    line with the pattern characters that are quoted or escaped replaced
+    by their fs.QUOTED counterparts. The lexer splits it into the same
+    words as line.
+    """
+    marked: list[str] = []
+    quote = ""
+    escaped = False
+    for c in line:
+        if escaped:
+            escaped = False
+            c = fs.QUOTED.get(c, c)
+        elif c == "\\" and quote != "'":
+            escaped = True
+        elif quote:
+            if c == quote:
+                quote = ""
+            else:
+                c = fs.QUOTED.get(c, c)
+        elif c in "'\"":
+            quote = c
+        marked.append(c)
+    return "".join(marked)
+
+
+def tokenize(line: str) -> tuple[tuple[str, ...], ValueError | None]:
+    """
+    shlex tokens of a command line and the error that stopped the lexer
+    early, if any. Words to expand against the filesystem are GlobWords.
+    Results are cached by line.
+    """
+    found, parsed = tokenCache.get(line)
+    if found:
+        return parsed
+    tokens, err = lex(line)
+    marked = mark_quoted(line)
+    patterns = lex(marked)[0] if marked != line else tokens
+    words: list[str] = []
+    for tok, pattern in zip(tokens, patterns, strict=True):
+        if GLOB_RE.search(pattern):
+            word = GlobWord(tok)
+            word.pattern = pattern
+            tok = word
+        words.append(tok)
+    parsed = (tuple(words), err)
+    tokenCache.set(line, parsed)
+    return parsed
+
+
+class TokenReplay:
+    """
+    Cached tokens of a line behind the get_token() interface of shlex,
+    raising the lexer's error, if any, where the lexer raised it
+    """
+
+    def __init__(self, line: str) -> None:
+        tokens, self.error = tokenize(line)
+        self.tokens = iter(tokens)
+
+    def get_token(self) -> str | None:
+        tok = next(self.tokens, None)
+        if tok is None and self.error is not None:
+            raise ValueError(*self.error.args)
+        return tok
+
 
 class HoneyPotShell:
     def __init__(
@@ -31,16 +133,14 @@ class HoneyPotShell:
         if hasattr(protocol.user, "windowSize"):
             self.environ["COLUMNS"] = str(protocol.user.windowSize[1])
             self.environ["LINES"] = str(protocol.user.windowSize[0])
-        self.lexer: shlex.shlex | None = None
+        self.lexer: TokenReplay | None = None
 
         # this is the first prompt after starting
         self.showPrompt()
 
     def lineReceived(self, line: str) -> None:
         log.msg(eventid="cowrie.command.input", input=line, format="CMD: %(input)s")
-        self.lexer = shlex.shlex(instream=line, punctuation_chars=True, posix=True)
-        # Add these special characters that are not in the default lexer
-        self.lexer.wordchars += "@%{}=$:+^,()`"
+        self.lexer = TokenReplay(line)
 
         tokens: list[str] = []
 
@@ -90,8 +190,7 @@ class HoneyPotShell:
                 elif "$(" in tok or "`" in tok:
                     tok = self.do_command_substitution(tok)
                 elif tok.startswith("${"):
-                    envRex = re.compile(r"^\${([_a-zA-Z0-9]+)}$")
-                    envSearch = envRex.search(tok)
+                    envSearch = ENV_BRACES_RE.search(tok)
                     if envSearch is not None:
                         envMatch = envSearch.group(1)
                         if envMatch in list(self.environ.keys()):
@@ -99,8 +198,7 @@ class HoneyPotShell:
                         else:
                             continue
                 elif tok.startswith("$"):
-                    envRex = re.compile(r"^\$([_a-zA-Z0-9]+)$")
-                    envSearch = envRex.search(tok)
+                    envSearch = ENV_RE.search(tok)
                     if envSearch is not None:
                         envMatch = envSearch.group(1)
                         if envMatch in list(self.environ.keys()):
@@ -284,8 +382,7 @@ class HoneyPotShell:
     def _execute_subshell_with_full_output(self, cmd: str) -> str:
         """Execute subshell commands and capture ALL output, not just the last command."""
         # Split commands by separators and execute each one
-        lexer = shlex.shlex(instream=cmd, punctuation_chars=True, posix=True)
-        lexer.wordchars += "@%{}=$:+^,()`"
+        lexer = TokenReplay(cmd)
 
         accumulated_output = ""
         current_cmd_tokens: list[str] = []
@@ -346,22 +443,17 @@ class HoneyPotShell:
             else:
                 self.showPrompt()
 
-        def parse_arguments(arguments: list[str]) -> list[str]:
-            parsed_arguments = []
-            for arg in arguments:
-                parsed_arguments.append(arg)
-
-            return parsed_arguments
+        glob = fs.Glob(self.protocol.fs, self.protocol.cwd)
 
-        def parse_file_arguments(arguments: str) -> list[str]:
+        def parse_file_arguments(arguments: list[str]) -> list[str]:
             """
-            Look up arguments in the file system
+            Expand wildcards and braces, sharing directory listings
+            between all arguments of the command line
             """
             parsed_arguments = []
             for arg in arguments:
-                matches = self.protocol.fs.resolve_path_wc(arg, self.protocol.cwd)
-                if matches:
-                    parsed_arguments.extend(matches)
+                if isinstance(arg, GlobWord):
+                    parsed_arguments.extend(glob.expand(arg.pattern))
                 else:
                     parsed_arguments.append(arg)
 
@@ -377,7 +469,7 @@ class HoneyPotShell:
                     # else close connection
                     if len(self.protocol.cmdstack) == 1:
                         ret = failure.Failure(error.ProcessDone(status=""))
-                        self.protocol.terminal.transport.processEnded(ret)
+                        self.protocol.terminal.processEnded(ret)
                     else:
                         return
             else:
@@ -416,9 +508,7 @@ class HoneyPotShell:
             multipleCmdArgs.append(cmdAndArgs[start:pipe_indice])
             start = pipe_indice + 1
 
-        cmd["rargs"] = parse_arguments(multipleCmdArgs.pop(0))
-        # parse_file_arguments parses too much. should not parse every argument
-        # cmd['rargs'] = parse_file_arguments(multipleCmdArgs.pop(0))
+        cmd["rargs"] = parse_file_arguments(multipleCmdArgs.pop(0))
         cmd_array.append(cmd)
         cmd = {}
 
@@ -426,7 +516,7 @@ class HoneyPotShell:
             if not value:  # Skip empty command lists
                 continue
             cmd["command"] = value.pop(0)
-            cmd["rargs"] = parse_arguments(value)
+            cmd["rargs"] = parse_file_arguments(value)
             cmd_array.append(cmd)
             cmd = {}
 
@@ -472,7 +562,7 @@ class HoneyPotShell:
                     and not self.cmdpending
                 ):
                     stat = failure.Failure(error.ProcessDone(status=""))
-                    self.protocol.terminal.transport.processEnded(stat)
+                    self.protocol.terminal.processEnded(stat)
 
                 runOrPrompt()
                 pp = None  # Got a error. Don't run any piped commands
@@ -532,7 +622,7 @@ class HoneyPotShell:
     def handle_CTRL_D(self) -> None:
         log.msg("Received CTRL-D, exiting..")
         stat = failure.Failure(error.ProcessDone(status=""))
-        self.protocol.terminal.transport.processEnded(stat)
+        self.protocol.terminal.processEnded(stat)
 
     def handle_TAB(self) -> None:
         """
@@ -627,6 +717,12 @@ class StdOutStdErrEmulationProtocol:
 
     __author__ = "davegermiquet"
 
+    # Most bytes buffered between two commands of a pipeline, or captured
+    # for a command substitution. Output past it is dropped.
+    pipe_buffer_size: int = CowrieConfig.getint(
+        "shell", "pipe_buffer_size", fallback=16777216
+    )
+
     def __init__(
         self, protocol, cmd, cmdargs, input_data, next_command, redirect=False
     ):
@@ -635,10 +731,25 @@ class StdOutStdErrEmulationProtocol:
         self.input_data: bytes = input_data
         self.next_command = next_command
         self.data: bytes = b""
-        self.redirected_data: bytes = b""
         self.err_data: bytes = b""
         self.protocol = protocol
         self.redirect = redirect  # dont send to terminal if enabled
+        # Output of the previous command in the pipeline, joined into
+        # input_data once when this command is called. No more is kept
+        # than the command reads, as told by its stdin_limit().
+        self.pipe: list[bytes] = []
+        self.pipe_size: int = 0
+        self.pipe_lines: int = 0
+        self.pipe_closed: bool = False
+        self.max_bytes, self.max_lines = cmd.stdin_limit(cmdargs)
+        if not self.max_bytes or self.max_bytes > self.pipe_buffer_size:
+            self.max_bytes = self.pipe_buffer_size
+        self.redirected: list[bytes] = []
+        self.redirected_size: int = 0
+
+    @property
+    def redirected_data(self) -> bytes:
+        return b"".join(self.redirected)
 
     def connectionMade(self) -> None:
         self.input_data = b""
@@ -646,7 +757,7 @@ class StdOutStdErrEmulationProtocol:
     def outReceived(self, data: bytes) -> None:
         """
         Invoked when a command in the chain called 'write' method
-        If we have a next command, pass the data via input_data field
+        If we have a next command, pass the data through its pipe
         Else print data to the terminal
         """
         self.data = data
@@ -657,13 +768,48 @@ class StdOutStdErrEmulationProtocol:
                     self.protocol.terminal.write(data)
                 else:
                     log.msg("Connection was probably lost. Could not write to terminal")
-            else:
-                self.redirected_data += self.data
+            elif self.redirected_size < self.pipe_buffer_size:
+                data = data[: self.pipe_buffer_size - self.redirected_size]
+                self.redirected.append(data)
+                self.redirected_size += len(data)
         else:
-            if self.next_command.input_data is None:
-                self.next_command.input_data = self.data
-            else:
-                self.next_command.input_data += self.data
+            self.next_command.pipeReceived(data)
+
+    def pipeReceived(self, data: bytes) -> None:
+        """
+        Buffer output of the previous command in the pipeline. The pipe
+        closes when this command has all the input it reads, or when the
+        buffer is full.
+        """
+        if self.pipe_closed:
+            return
+        if self.pipe_size + len(data) >= self.max_bytes:
+            data = data[: self.max_bytes - self.pipe_size]
+            self.pipe_closed = True
+        if self.max_lines:
+            self.pipe_lines += data.count(b"\n")
+            if self.pipe_lines >= self.max_lines:
+                self.pipe_closed = True
+        self.pipe.append(data)
+        self.pipe_size += len(data)
+
+    def outputClosed(self) -> bool:
+        """
+        True when the next command in the pipeline reads no more output
+        """
+        return self.next_command is not None and self.next_command.pipe_closed
+
+    def outputPaused(self) -> bool:
+        """
+        True when output goes to the terminal and it has as much queued
+        for the client as it takes
+        """
+        return (
+            self.next_command is None
+            and not self.redirect
+            and self.protocol.terminal is not None
+            and self.protocol.terminal.outputFull()
+        )
 
     def insert_command(self, command):
         """
@@ -686,7 +832,15 @@ class StdOutStdErrEmulationProtocol:
         """
 
         if self.next_command:
-            # self.next_command.input_data = self.data
+            if self.next_command.pipe:
+                data = b"".join(self.next_command.pipe)
+                if self.next_command.input_data is None:
+                    self.next_command.input_data = data
+                else:
+                    self.next_command.input_data += data
+                self.next_command.pipe = []
+            # Output written after this point can't reach the next command
+            self.next_command.pipe_closed = True
             npcmd = self.next_command.cmd
             npcmdargs = self.next_command.cmdargs
             self.protocol.call_command(self.next_command, npcmd, *npcmdargs)
@@ -0,0 +1,98 @@
+"""
+Index of all paths in a fake filesystem, the database behind find and
+locate.
+
+The index of the filesystem image is built once per process and shared
+by all sessions that did not change their filesystem. A session that did
+gets its own index, rebuilt on the first search after each change, as
+told by HoneyPotFilesystem.generation.
+"""
+
+from __future__ import annotations
+
+import weakref
+from typing import Any, TYPE_CHECKING
+
+from cowrie.core.config import CowrieConfig
+from cowrie.shell.fs import A_CONTENTS, A_NAME, A_TYPE, T_DIR
+
+if TYPE_CHECKING:
+    from cowrie.shell.fs import HoneyPotFilesystem
+
+
+class PathIndex:
+    """
+    Paths of a tree in the order find lists them, depth first with the
+    entries of each directory in directory order. The subtree of the
+    entry at position i is range(i, ends[i]).
+    """
+
+    def __init__(self, root: list[Any]) -> None:
+        self.paths: list[str] = []
+        self.types: list[int] = []
+        self.depths: list[int] = []
+        self.ends: list[int] = []
+        self.positions: dict[str, int] = {}
+
+        # Iterative, a session can nest directories deeper than the
+        # recursion limit
+        self.add("/", T_DIR, 0)
+        stack: list[tuple[int, str, int, Any]] = [(0, "", 1, iter(root[A_CONTENTS]))]
+        while stack:
+            position, parent, depth, entries = stack[-1]
+            entry = next(entries, None)
+            if entry is None:
+                self.ends[position] = len(self.paths)
+                stack.pop()
+                continue
+            path = f"{parent}/{entry[A_NAME]}"
+            self.add(path, entry[A_TYPE], depth)
+            if entry[A_TYPE] == T_DIR:
+                stack.append(
+                    (len(self.paths) - 1, path, depth + 1, iter(entry[A_CONTENTS]))
+                )
+
+    def add(self, path: str, kind: int, depth: int) -> None:
+        self.positions[path] = len(self.paths)
+        self.paths.append(path)
+        self.types.append(kind)
+        self.depths.append(depth)
+        self.ends.append(len(self.paths))
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def subtree(self, path: str) -> range:
+        """
+        Positions of path and everything below it, empty when path is not
+        in the index
+        """
+        position = self.positions.get(path)
+        if position is None:
+            return range(0)
+        return range(position, self.ends[position])
+
+
+# Index of each filesystem image and of each changed session filesystem
+# with the generation it was built at
+images: dict[str, PathIndex] = {}
+sessions: weakref.WeakKeyDictionary[HoneyPotFilesystem, tuple[int, PathIndex]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def path_index(fs: HoneyPotFilesystem) -> PathIndex:
+    """
+    Index of the current tree of fs
+    """
+    if fs.generation == 0:
+        image = CowrieConfig.get("shell", "filesystem")
+        if image not in images:
+            images[image] = PathIndex(fs.fs)
+        return images[image]
+
+    generation, index = sessions.get(fs, (-1, None))
+    if index is None or generation != fs.generation:
+        index = PathIndex(fs.fs)
+        sessions[fs] = (fs.generation, index)
+    return index
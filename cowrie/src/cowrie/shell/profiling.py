@@ -0,0 +1,204 @@
+"""
+Per command execution profiling.
+
+With profiling on, each emulated command run through call_command records
+its run time from start() to exit(), the CPU time spent in start() and in
+its cooperative steps, the bytes it wrote and a run count, labelled with
+the command class. These are exported through the metrics surface and
+CommandProfileReporter logs the commands that used the most CPU time
+every interval.
+
+[monitor]
+command_profiling = true
+command_profile_interval = 300
+command_profile_top = 10
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, TYPE_CHECKING
+
+from twisted.application import service
+from twisted.internet import task
+from twisted.python import log
+
+from cowrie.core.config import CowrieConfig
+from cowrie.core.metrics import metrics
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from cowrie.shell.command import HoneyPotCommand
+
+COMMAND_BUCKETS: tuple[float, ...] = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    5.0,
+    30.0,
+    300.0,
+)
+
+enabled: bool = CowrieConfig.getboolean("monitor", "command_profiling", fallback=False)
+
+command_seconds = metrics.histogram(
+    "command_seconds",
+    "Emulated command run time from start() to exit()",
+    COMMAND_BUCKETS,
+)
+command_cpu_seconds = metrics.histogram(
+    "command_cpu_seconds", "CPU time used by an emulated command", COMMAND_BUCKETS
+)
+command_output_bytes = metrics.counter(
+    "command_output_bytes_total", "Bytes written by emulated commands"
+)
+command_invocations = metrics.counter(
+    "command_invocations_total", "Emulated command runs"
+)
+
+# Totals per command class since the last summary: runs, CPU time, run
+# time, longest run time and output bytes
+interval: dict[str, list[Any]] = {}
+
+
+class CommandProfile:
+    """
+    Measurements of one command run. The run is recorded once start()
+    has returned and the command has exited, in either order.
+    """
+
+    __slots__ = ("cpu", "ended", "name", "output", "running", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.started: float = time.perf_counter()
+        self.ended: float | None = None
+        self.cpu: float = 0.0
+        self.output: int = 0
+        self.running: bool = True
+
+    def timed(self, work: Iterator[Any]) -> Iterator[Any]:
+        """
+        Steps of work, adding the CPU time of each to this run
+        """
+        while True:
+            cpu = time.thread_time()
+            try:
+                step = next(work)
+            except StopIteration:
+                return
+            finally:
+                self.cpu += time.thread_time() - cpu
+            yield step
+
+    def exited(self) -> None:
+        # CTRL-C can exit a command that exits by itself later
+        if self.ended is not None:
+            return
+        self.ended = time.perf_counter()
+        if not self.running:
+            self.record()
+
+    def returned(self) -> None:
+        self.running = False
+        if self.ended is not None:
+            self.record()
+
+    def record(self) -> None:
+        wall = self.ended - self.started  # type: ignore[operator]
+        command_seconds.observe(wall, command=self.name)
+        command_cpu_seconds.observe(self.cpu, command=self.name)
+        command_output_bytes.inc(self.output, command=self.name)
+        command_invocations.inc(command=self.name)
+
+        totals = interval.get(self.name)
+        if totals is None:
+            totals = interval[self.name] = [0, 0.0, 0.0, 0.0, 0]
+        totals[0] += 1
+        totals[1] += self.cpu
+        totals[2] += wall
+        totals[3] = max(totals[3], wall)
+        totals[4] += self.output
+
+
+def start(cmd: HoneyPotCommand) -> None:
+    """
+    Run cmd.start() with a profile attached to cmd
+    """
+    profile = cmd.profile = CommandProfile(type(cmd).__name__)
+    cpu = time.thread_time()
+    try:
+        cmd.start()
+    finally:
+        profile.cpu += time.thread_time() - cpu
+        profile.returned()
+
+
+def summary(top: int) -> str:
+    """
+    Ranked table of the top commands since the last summary, most CPU
+    time first
+    """
+    rows = sorted(interval.items(), key=lambda item: item[1][1], reverse=True)
+    lines = [
+        "{:<24} {:>8} {:>10} {:>10} {:>10} {:>10} {:>12}".format(
+            "command",
+            "runs",
+            "cpu(s)",
+            "cpu(ms)",
+            "mean(ms)",
+            "max(ms)",
+            "bytes",
+        )
+    ]
+    for name, (runs, cpu, wall, longest, output) in rows[:top]:
+        lines.append(
+            f"{name:<24} {runs:>8} {cpu:>10.3f} {cpu / runs * 1000:>10.3f} "
+            f"{wall / runs * 1000:>10.3f} {longest * 1000:>10.3f} {output:>12}"
+        )
+    return "\n".join(lines)
+
+
+class CommandProfileReporter(service.Service):
+    """
+    Periodically log the commands that used the most CPU time
+    """
+
+    def __init__(self) -> None:
+        self.interval: float = CowrieConfig.getfloat(
+            "monitor", "command_profile_interval", fallback=300.0
+        )
+        self.top: int = CowrieConfig.getint(
+            "monitor", "command_profile_top", fallback=10
+        )
+        self._loop = task.LoopingCall(self.report)
+
+    def startService(self) -> None:
+        service.Service.startService(self)
+        interval.clear()
+        self._loop.start(self.interval, now=False)
+
+    def stopService(self) -> None:
+        if self._loop.running:
+            self._loop.stop()
+        service.Service.stopService(self)
+
+    def report(self) -> None:
+        if not interval:
+            return
+        log.msg(
+            f"Top commands by CPU time over the last {self.interval:g}s:\n"
+            + summary(self.top)
+        )
+        interval.clear()
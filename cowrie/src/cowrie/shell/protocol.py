@@ -4,12 +4,9 @@
 
 from __future__ import annotations
 
-from importlib import import_module
 import os
 import socket
-import sys
 import time
-import traceback
 from typing import ClassVar
 
 from twisted.conch import recvline
@@ -19,9 +16,10 @@ from twisted.internet.protocol import connectionDone
 from twisted.protocols.policies import TimeoutMixin
 from twisted.python import failure, log
 
-import cowrie.commands
+from cowrie.commands.manifest import manifest
+from cowrie.core.capture import CaptureFiles
 from cowrie.core.config import CowrieConfig
-from cowrie.shell import command, honeypot
+from cowrie.shell import command, honeypot, profiling
 
 
 class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
@@ -29,22 +27,13 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
     Base protocol for interactive and non-interactive use
     """
 
-    commands: ClassVar[dict] = {}
-    for c in cowrie.commands.__all__:
-        try:
-            module = import_module(f"cowrie.commands.{c}")
-            commands.update(module.commands)
-        except ImportError as e:
-            exc_type, exc_value, exc_traceback = sys.exc_info()
-            log.err(
-                "Failed to import command {}: {}: {}".format(
-                    c,
-                    e,
-                    "".join(
-                        traceback.format_exception(exc_type, exc_value, exc_traceback)
-                    ),
-                )
-            )
+    # Command classes by name and path, each module is imported when one
+    # of its commands is first looked up
+    commands: ClassVar[command.CommandRegistry] = command.CommandRegistry(manifest)
+
+    # Emulated path of each file under data_path/txtcmds to a command
+    # printing its contents, loaded on first use by loadTxtcmds()
+    txtcmds: ClassVar[dict[str, type] | None] = None
 
     def __init__(self, avatar):
         self.user = avatar
@@ -67,6 +56,14 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
         self.data = None
         self.password_input = False
         self.cmdstack = []
+        # stdin and redirect captures of this session
+        self.captures = CaptureFiles(
+            CowrieConfig.getint("honeypot", "download_limit_size", fallback=0)
+        )
+        # getCommand() results, valid while the filesystem generation and
+        # the number of known commands are unchanged
+        self.resolved: dict[tuple, type | None] = {}
+        self.resolvedGeneration: tuple[int, int] = (-1, 0)
 
     def getProtoTransport(self):
         """
@@ -118,7 +115,7 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
         this logs out when connection times out
         """
         ret = failure.Failure(error.ProcessTerminated(exitCode=1))
-        self.terminal.transport.processEnded(ret)
+        self.terminal.processEnded(ret)
 
     def connectionLost(self, reason: failure.Failure = connectionDone) -> None:
         """
@@ -127,6 +124,7 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
         this Protocol. The connection has been closed.
         """
         self.setTimeout(None)
+        self.captures.close_all()
         insults.TerminalProtocol.connectionLost(self, reason)
         self.terminal = None  # (this should be done by super above)
         self.cmdstack = []
@@ -135,15 +133,33 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
         self.user = None
         self.environ = None
 
-    def txtcmd(self, txt: str) -> object:
+    @staticmethod
+    def txtcmd(txt: str, output: str) -> type:
         class Command_txtcmd(command.HoneyPotCommand):
             def call(self):
                 log.msg(f'Reading txtcmd from "{txt}"')
-                with open(txt, encoding="utf-8") as f:
-                    self.write(f.read())
+                self.write(output)
 
         return Command_txtcmd
 
+    @classmethod
+    def loadTxtcmds(cls) -> dict[str, type]:
+        """
+        Read all text commands once per process
+        """
+        if HoneyPotBaseProtocol.txtcmds is None:
+            txtcmds = {}
+            root = os.path.join(CowrieConfig.get("honeypot", "data_path"), "txtcmds")
+            for path, _directories, filenames in os.walk(root):
+                for filename in filenames:
+                    txt = os.path.join(path, filename)
+                    with open(txt, encoding="utf-8") as f:
+                        txtcmds["/" + os.path.relpath(txt, root)] = cls.txtcmd(
+                            txt, f.read()
+                        )
+            HoneyPotBaseProtocol.txtcmds = txtcmds
+        return HoneyPotBaseProtocol.txtcmds
+
     def isCommand(self, cmd):
         """
         Check if cmd (the argument of a command) is a command, too.
@@ -153,9 +169,30 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
     def getCommand(self, cmd, paths):
         if not cmd.strip():
             return None
+        cmdclass = self.commands.get(cmd)
+        if cmdclass is not None:
+            return cmdclass
+
+        # Files created or removed in the session and commands added at
+        # runtime, such as by apt-get install, invalidate earlier results
+        generation = (self.fs.generation, len(self.commands))
+        if generation != self.resolvedGeneration:
+            self.resolved = {}
+            self.resolvedGeneration = generation
+        key = (cmd, self.cwd, tuple(paths))
+        if key not in self.resolved:
+            self.resolved[key] = self.resolveCommand(cmd, paths)
+        cmdclass = self.resolved[key]
+        if cmdclass is None:
+            log.msg(f"Can't find command {cmd}")
+        return cmdclass
+
+    def resolveCommand(self, cmd, paths):
+        """
+        Look cmd up in the filesystem, then in the text commands and the
+        commands known by path
+        """
         path = None
-        if cmd in self.commands:
-            return self.commands[cmd]
         if cmd[0] in (".", "/"):
             path = self.fs.resolve_path(cmd, self.cwd)
             if not self.fs.exists(path):
@@ -166,17 +203,11 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
                     path = i
                     break
 
-        txt = os.path.normpath(
-            "{}/txtcmds/{}".format(CowrieConfig.get("honeypot", "data_path"), path)
-        )
-        if os.path.exists(txt) and os.path.isfile(txt):
-            return self.txtcmd(txt)
+        txtcmds = self.loadTxtcmds()
+        if path in txtcmds:
+            return txtcmds[path]
 
-        if path in self.commands:
-            return self.commands[path]
-
-        log.msg(f"Can't find command {cmd}")
-        return None
+        return self.commands.get(path)
 
     def lineReceived(self, line: bytes) -> None:
         """
@@ -191,14 +222,17 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
         else:
             log.msg(f"discarding input {string}")
             stat = failure.Failure(error.ProcessDone(status=""))
-            self.terminal.transport.processEnded(stat)
+            self.terminal.processEnded(stat)
 
     def call_command(self, pp, cmd, *args):
         self.pp = pp
         obj = cmd(self, *args)
         obj.set_input_data(pp.input_data)
         self.cmdstack.append(obj)
-        obj.start()
+        if profiling.enabled:
+            profiling.start(obj)
+        else:
+            obj.start()
 
         if self.pp:
             self.pp.outConnectionLost()
@@ -217,7 +251,7 @@ class HoneyPotBaseProtocol(insults.TerminalProtocol, TimeoutMixin):
         TODO: this should probably not go through transport, but use processprotocol to close stdin
         """
         ret = failure.Failure(error.ProcessTerminated(exitCode=0))
-        self.terminal.transport.processEnded(ret)
+        self.terminal.processEnded(ret)
 
 
 class HoneyPotExecProtocol(HoneyPotBaseProtocol):
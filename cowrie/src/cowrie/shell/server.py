@@ -30,18 +30,52 @@
 from __future__ import annotations
 
 import json
+import os
 import random
 from configparser import NoOptionError
+from types import MappingProxyType
 
 from twisted.python import log
 
 from cowrie.core.config import CowrieConfig
 from cowrie.shell import fs
-from typing import TYPE_CHECKING
+from typing import Any, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from twisted.cred.portal import IRealm
 
+# Command output files parsed once per process and shared by all
+# sessions, by path: the version of the file they were read from and
+# their contents, frozen so that no session can change them
+commandOutputs: dict[str, tuple[tuple[str, int, int], Any]] = {}
+
+
+def freeze(value: Any) -> Any:
+    """
+    Read only copy of parsed JSON: objects become mapping proxies and
+    arrays tuples
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def command_output(path: str) -> tuple[tuple[str, int, int], Any]:
+    """
+    Frozen contents of the command output file at path and the version
+    they are from, its path, modification time and size. The file is
+    only parsed again when it changed.
+    """
+    st = os.stat(path)
+    version = (path, st.st_mtime_ns, st.st_size)
+    cached = commandOutputs.get(path)
+    if cached is None or cached[0] != version:
+        with open(path, encoding="utf-8") as f:
+            cached = commandOutputs[path] = (version, freeze(json.load(f)))
+    return cached
+
 
 class CowrieServer:
     """
@@ -56,6 +90,7 @@ class CowrieServer:
     def __init__(self, realm: IRealm) -> None:
         self.fs = None
         self.process = None
+        self.processVersion: tuple[str, int, int] | None = None
         self.hostname: str = CowrieConfig.get("honeypot", "hostname", fallback="svr04")
         try:
             arches = [
@@ -72,11 +107,10 @@ class CowrieServer:
 
     def getCommandOutput(self, file):
         """
-        Reads process output from JSON file.
+        Reads process output from JSON file, shared read only with all
+        other sessions
         """
-        with open(file, encoding="utf-8") as f:
-            cmdoutput = json.load(f)
-        return cmdoutput
+        return command_output(file)[1]
 
     def initFileSystem(self, home):
         """
@@ -85,8 +119,10 @@ class CowrieServer:
         self.fs = fs.HoneyPotFilesystem(self.arch, home)
 
         try:
-            self.process = self.getCommandOutput(
+            self.processVersion, cmdoutput = command_output(
                 CowrieConfig.get("shell", "processes")
-            )["command"]["ps"]
+            )
+            self.process = cmdoutput["command"]["ps"]
         except NoOptionError:
             self.process = None
+            self.processVersion = None
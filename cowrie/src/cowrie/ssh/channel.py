@@ -63,7 +63,7 @@ class CowrieSSHChannel(channel.SSHChannel):
             ttylog=self.ttylogFile,
             format="Opening TTY Log: %(ttylog)s",
         )
-        ttylog.ttylog_open(self.ttylogFile, time.time())
+        self.ttylogWriter = ttylog.TTYLogWriter(self.ttylogFile, time.time())
         channel.SSHChannel.channelOpen(self, specificData)
 
     def closed(self) -> None:
@@ -74,7 +74,7 @@ class CowrieSSHChannel(channel.SSHChannel):
             size=self.bytesReceived + self.bytesWritten,
             duration=f"{time.time() - self.startTime:.1f}",
         )
-        ttylog.ttylog_close(self.ttylogFile, time.time())
+        self.ttylogWriter.close(time.time())
         channel.SSHChannel.closed(self)
 
     def dataReceived(self, data: bytes) -> None:
@@ -91,9 +91,7 @@ class CowrieSSHChannel(channel.SSHChannel):
             return
 
         if self.ttylogEnabled:
-            ttylog.ttylog_write(
-                self.ttylogFile, len(data), ttylog.TYPE_INPUT, time.time(), data
-            )
+            self.ttylogWriter.write(len(data), ttylog.TYPE_INPUT, time.time(), data)
 
         channel.SSHChannel.dataReceived(self, data)
 
@@ -105,9 +103,7 @@ class CowrieSSHChannel(channel.SSHChannel):
         @param data: Data sent to the client from the server
         """
         if self.ttylogEnabled:
-            ttylog.ttylog_write(
-                self.ttylogFile, len(data), ttylog.TYPE_OUTPUT, time.time(), data
-            )
+            self.ttylogWriter.write(len(data), ttylog.TYPE_OUTPUT, time.time(), data)
             self.bytesWritten += len(data)
 
         channel.SSHChannel.write(self, data)
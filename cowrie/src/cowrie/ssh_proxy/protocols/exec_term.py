@@ -68,19 +68,17 @@ class ExecTerm(base_protocol.BaseProtocol):
                 self.transportId,
                 self.channelId,
             )
-            ttylog.ttylog_open(self.ttylogFile, self.startTime)
+            self.ttylogWriter = ttylog.TTYLogWriter(self.ttylogFile, self.startTime)
 
     def parse_packet(self, parent: str, data: bytes) -> None:
         if self.ttylogEnabled:
-            ttylog.ttylog_write(
-                self.ttylogFile, len(data), ttylog.TYPE_OUTPUT, time.time(), data
-            )
+            self.ttylogWriter.write(len(data), ttylog.TYPE_OUTPUT, time.time(), data)
             self.ttylogSize += len(data)
 
     def channel_closed(self):
         if self.ttylogEnabled:
-            ttylog.ttylog_close(self.ttylogFile, time.time())
-            shasum = ttylog.ttylog_inputhash(self.ttylogFile)
+            self.ttylogWriter.close(time.time())
+            shasum = self.ttylogWriter.hexdigest()
             shasumfile = os.path.join(self.ttylogPath, shasum)
 
             if os.path.exists(shasumfile):
@@ -61,12 +61,12 @@ class Term(base_protocol.BaseProtocol):
             self.ttylogFile = "{}/{}-{}-{}i.log".format(
                 self.ttylogPath, time.strftime("%Y%m%d-%H%M%S"), uuid, self.channelId
             )
-            ttylog.ttylog_open(self.ttylogFile, self.startTime)
+            self.ttylogWriter = ttylog.TTYLogWriter(self.ttylogFile, self.startTime)
 
     def channel_closed(self) -> None:
         if self.ttylogEnabled:
-            ttylog.ttylog_close(self.ttylogFile, time.time())
-            shasum = ttylog.ttylog_inputhash(self.ttylogFile)
+            self.ttylogWriter.close(time.time())
+            shasum = self.ttylogWriter.hexdigest()
             shasumfile = os.path.join(self.ttylogPath, shasum)
 
             if os.path.exists(shasumfile):
@@ -165,12 +165,8 @@ class Term(base_protocol.BaseProtocol):
 
             if self.ttylogEnabled:
                 self.ttylogSize += len(data)
-                ttylog.ttylog_write(
-                    self.ttylogFile,
-                    len(data),
-                    ttylog.TYPE_OUTPUT,
-                    time.time(),
-                    data,
+                self.ttylogWriter.write(
+                    len(data), ttylog.TYPE_OUTPUT, time.time(), data
                 )
 
         elif parent == "[CLIENT]":
@@ -217,10 +213,4 @@ class Term(base_protocol.BaseProtocol):
 
             if self.ttylogEnabled:
                 self.ttylogSize += len(data)
-                ttylog.ttylog_write(
-                    self.ttylogFile,
-                    len(data),
-                    ttylog.TYPE_INPUT,
-                    time.time(),
-                    data,
-                )
+                self.ttylogWriter.write(len(data), ttylog.TYPE_INPUT, time.time(), data)
@@ -97,15 +97,15 @@ class TelnetHandler:
             self.ttylogFile = "{}/telnet-{}.log".format(
                 self.ttylogPath, time.strftime("%Y%m%d-%H%M%S")
             )
-            ttylog.ttylog_open(self.ttylogFile, self.startTime)
+            self.ttylogWriter = ttylog.TTYLogWriter(self.ttylogFile, self.startTime)
 
     def setClient(self, client):
         self.client = client
 
     def close(self):
         if self.ttylogEnabled:
-            ttylog.ttylog_close(self.ttylogFile, time.time())
-            shasum = ttylog.ttylog_inputhash(self.ttylogFile)
+            self.ttylogWriter.close(time.time())
+            shasum = self.ttylogWriter.hexdigest()
             shasumfile = os.path.join(self.ttylogPath, shasum)
 
             if os.path.exists(shasumfile):
@@ -148,8 +148,7 @@ class TelnetHandler:
                 cleanData = data.replace(
                     b"\x00", b"\n"
                 )  # some frontends send 0xFF instead of newline
-                ttylog.ttylog_write(
-                    self.ttylogFile,
+                self.ttylogWriter.write(
                     len(cleanData),
                     ttylog.TYPE_INPUT,
                     time.time(),
@@ -167,9 +166,7 @@ class TelnetHandler:
             log.msg("to_frontend - " + data.decode("unicode-escape"))
 
         if self.ttylogEnabled and self.authStarted:
-            ttylog.ttylog_write(
-                self.ttylogFile, len(data), ttylog.TYPE_OUTPUT, time.time(), data
-            )
+            self.ttylogWriter.write(len(data), ttylog.TYPE_OUTPUT, time.time(), data)
             # self.ttylogSize += len(data)
 
     def addPacket(self, parent: str, data: bytes) -> None:
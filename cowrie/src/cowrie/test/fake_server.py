@@ -19,6 +19,7 @@ class FakeServer:
 
         self.fs = fs.HoneyPotFilesystem("arch", "/root")
         self.process = None
+        self.processVersion = None
 
 
 class FakeAvatar:
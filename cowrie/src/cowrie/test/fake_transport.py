@@ -109,6 +109,12 @@ class FakeTransport(proto_helpers.StringTransport):
     def abortConnection(self):
         self.aborting = True
 
+    def outputFull(self):
+        return False
+
+    def processEnded(self, reason):
+        self.transport.processEnded(reason)
+
     def resetModes(self, modes):
         for m in modes:
             try:
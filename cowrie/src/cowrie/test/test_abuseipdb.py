@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+import pickle
+import tempfile
+import unittest
+from collections import deque
+
+from cowrie.output import abuseipdb
+
+os.environ["COWRIE_OUTPUT_ABUSEIPDB_TOLERANCE_WINDOW"] = "120"
+os.environ["COWRIE_OUTPUT_ABUSEIPDB_REREPORT_AFTER"] = "24"
+
+WINDOW = 120 * 60
+REREPORT = 24 * 3600
+T0 = 1_700_000_000.0
+
+
+class LogBookTests(unittest.TestCase):
+    """Tests for the LogBook in cowrie/output/abuseipdb.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.logbook = abuseipdb.LogBook(3, self.tmpdir.name)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def dump(self, logbook: abuseipdb.LogBook, compact: bool = False) -> None:
+        changes = [
+            (ip, logbook.records[ip].to_list() if ip in logbook.records else None)
+            for ip in logbook.dirty
+        ]
+        logbook.dirty.clear()
+        logbook.write_dump_file(logbook.state(), changes, compact)
+
+    def test_counts_within_window(self) -> None:
+        for i in range(3):
+            record = self.logbook.attempt("1.2.3.4", T0 + i * 60)
+        assert record is not None
+        self.assertEqual(record.count(), 3)
+        self.assertEqual(record.first, T0)
+        self.assertEqual(record.last, T0 + 120)
+
+    def test_old_attempts_leave_window(self) -> None:
+        self.logbook.attempt("1.2.3.4", T0)
+        self.logbook.attempt("1.2.3.4", T0 + 1)
+        record = self.logbook.attempt("1.2.3.4", T0 + 2 * WINDOW)
+        assert record is not None
+        self.assertEqual(record.count(), 1)
+        self.assertEqual(record.first, T0 + 2 * WINDOW)
+
+    def test_expire_only_idle(self) -> None:
+        self.logbook.attempt("1.1.1.1", T0)
+        self.logbook.attempt("2.2.2.2", T0)
+        self.logbook.attempt("2.2.2.2", T0 + WINDOW)
+        self.logbook.expire(T0 + WINDOW + 1200)
+        self.assertNotIn("1.1.1.1", self.logbook)
+        self.assertIn("2.2.2.2", self.logbook)
+        self.assertEqual(self.logbook["2.2.2.2"].count(), 1)
+        self.logbook.expire(T0 + 3 * WINDOW)
+        self.assertEqual(len(self.logbook), 0)
+        self.assertEqual(len(self.logbook.wheel), 0)
+
+    def test_rereport(self) -> None:
+        self.logbook.mark_reported("1.2.3.4", T0)
+        self.assertIsNone(self.logbook.attempt("1.2.3.4", T0 + 60))
+        self.assertFalse(self.logbook.can_rereport("1.2.3.4", T0 + 60))
+        self.logbook.expire(T0 + REREPORT / 2)
+        self.assertIn("1.2.3.4", self.logbook)
+        self.logbook.expire(T0 + REREPORT + 120)
+        self.assertNotIn("1.2.3.4", self.logbook)
+
+    def test_dump_and_load(self) -> None:
+        self.logbook.attempt("1.1.1.1", T0)
+        self.logbook.mark_reported("2.2.2.2", T0)
+        self.dump(self.logbook, compact=True)
+        self.logbook.attempt("1.1.1.1", T0 + 10)
+        self.logbook.attempt("3.3.3.3", T0 + 10)
+        self.logbook.sleeping = True
+        self.logbook.sleep_until = T0 + 100
+        self.dump(self.logbook)
+
+        restored = abuseipdb.LogBook(3, self.tmpdir.name)
+        restored.load()
+        self.assertEqual(restored["1.1.1.1"].count(), 2)
+        self.assertEqual(restored["2.2.2.2"].reported, T0)
+        self.assertIn("3.3.3.3", restored)
+        self.assertTrue(restored.sleeping)
+        self.assertEqual(restored.sleep_until, T0 + 100)
+        # Loading folds the journal into the snapshot
+        self.assertFalse(restored.journal_file.exists())
+
+    def test_journal_deletes(self) -> None:
+        self.logbook.attempt("1.1.1.1", T0)
+        self.dump(self.logbook)
+        self.logbook.expire(T0 + 2 * WINDOW)
+        self.dump(self.logbook)
+        restored = abuseipdb.LogBook(3, self.tmpdir.name)
+        restored.load()
+        self.assertNotIn("1.1.1.1", restored)
+
+    def test_legacy_dump(self) -> None:
+        with open(os.path.join(self.tmpdir.name, abuseipdb.DUMP_FILE), "wb") as f:
+            pickle.dump(
+                {
+                    "sleeping": False,
+                    "sleep_until": 0,
+                    "tolerated": 3,
+                    "1.1.1.1": deque([T0, T0 + 60], maxlen=3),
+                    "2.2.2.2": (None, T0),
+                },
+                f,
+            )
+        self.logbook.load()
+        self.assertEqual(self.logbook["1.1.1.1"].count(), 2)
+        self.assertEqual(self.logbook["1.1.1.1"].first, T0)
+        self.assertEqual(self.logbook["2.2.2.2"].reported, T0)
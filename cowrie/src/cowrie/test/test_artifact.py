@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cowrie.core import artifact
+from cowrie.shell import fs
+from cowrie.test.fake_server import FakeServer
+
+
+class ArtifactTests(unittest.TestCase):
+    """Tests for cowrie/core/artifact.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(artifact.Artifact, "artifactDir", self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_hashed_while_written(self) -> None:
+        chunks = [os.urandom(65536) for _ in range(16)]
+        shasum = hashlib.sha256(b"".join(chunks)).hexdigest()
+        a = artifact.Artifact("test")
+        for chunk in chunks:
+            a.write(chunk)
+        with mock.patch("hashlib.sha256") as sha256:
+            self.assertEqual(
+                a.close(), (shasum, os.path.join(self.tmpdir.name, shasum))
+            )
+        sha256.assert_not_called()
+        self.assertFalse(os.path.exists(a.tempFilename))
+
+        # The same content again is a duplicate
+        with artifact.Artifact("test") as b:
+            for chunk in chunks:
+                b.write(chunk)
+        self.assertEqual(b.shasum, shasum)
+        self.assertEqual(os.listdir(self.tmpdir.name), [shasum])
+
+    def test_empty(self) -> None:
+        a = artifact.Artifact("test")
+        self.assertIsNone(a.close())
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+
+class SFTPUploadTests(unittest.TestCase):
+    """Tests for the SFTP upload handling in cowrie/shell/fs.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(
+            os.environ, {"COWRIE_HONEYPOT_DOWNLOAD_PATH": self.tmpdir.name}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fs = FakeServer().fs
+        self.data = os.urandom(256 * 1024)
+        self.shasum = hashlib.sha256(self.data).hexdigest()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def upload(self, offsets: list[int]) -> None:
+        fd = self.fs.open("/tmp/upload", os.O_WRONLY | os.O_CREAT, 0o644)
+        for offset in offsets:
+            self.fs.lseek(fd, offset, os.SEEK_SET)
+            self.fs.write(fd, self.data[offset : offset + 32768])
+        self.fs.close(fd)
+
+    def test_sequential(self) -> None:
+        with mock.patch.object(fs, "sha256_file") as sha256_file:
+            self.upload(list(range(0, len(self.data), 32768)))
+        sha256_file.assert_not_called()
+        self.assertEqual(os.listdir(self.tmpdir.name), [self.shasum])
+
+    def test_out_of_order(self) -> None:
+        offsets = list(range(0, len(self.data), 32768))
+        offsets[2], offsets[3] = offsets[3], offsets[2]
+        with mock.patch.object(
+            fs, "sha256_file", wraps=artifact.sha256_file
+        ) as sha256_file:
+            self.upload(offsets)
+        sha256_file.assert_called_once()
+        self.assertEqual(os.listdir(self.tmpdir.name), [self.shasum])
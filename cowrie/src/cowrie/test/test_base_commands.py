@@ -4,8 +4,12 @@ from __future__ import annotations
 
 import os
 import unittest
+from unittest import mock
 
+from cowrie.commands import base
 from cowrie.commands.base import Command_php
+from cowrie.core.cache import LRUCache
+from cowrie.shell import server
 from cowrie.shell.protocol import HoneyPotInteractiveProtocol
 from cowrie.test.fake_server import FakeAvatar, FakeServer
 from cowrie.test.fake_transport import FakeTransport
@@ -17,7 +21,7 @@ PROMPT = b"root@unitTest:~# "
 NONEXISTEN_FILE = "/path/to/the/file/that/does/not/exist"
 
 
-class ShellBaseCommandsTests(unittest.TestCase):  # TODO: ps, history
+class ShellBaseCommandsTests(unittest.TestCase):  # TODO: history
     """Tests for basic commands from cowrie/commands/base.py."""
 
     def setUp(self) -> None:
@@ -49,6 +53,14 @@ class ShellBaseCommandsTests(unittest.TestCase):  # TODO: ps, history
         self.proto.lineReceived(b"clear\n")
         self.assertEqual(self.tr.value(), PROMPT)
 
+    def test_uname_memoized(self) -> None:
+        self.proto.lineReceived(b"uname -n\n")
+        self.assertEqual(self.tr.value(), b"unitTest\n" + PROMPT)
+        self.proto.lineReceived(b"hostname unitChanged\n")
+        self.tr.clear()
+        self.proto.lineReceived(b"uname -n\n")
+        self.assertEqual(self.tr.value(), b"unitChanged\nroot@unitChanged:~# ")
+
     def test_hostname_command(self) -> None:
         self.proto.lineReceived(b"hostname unitChanged\n")
         self.assertEqual(self.tr.value(), b"root@unitChanged:~# ")
@@ -110,6 +122,63 @@ class ShellBaseCommandsTests(unittest.TestCase):  # TODO: ps, history
         self.proto.lineReceived(b"php -v\n")
         self.assertEqual(self.tr.value(), Command_php.VERSION.encode() + PROMPT)
 
+    def test_ps_command(self) -> None:
+        self.proto.lineReceived(b"ps\n")
+        self.assertEqual(
+            self.tr.value().splitlines()[0].split(),
+            [b"PID", b"TTY", b"TIME", b"COMMAND"],
+        )
+        self.tr.clear()
+        self.proto.lineReceived(b"ps aux\n")
+        self.assertIn(b"ps aux", self.tr.value())
+
+    def test_ps_cached(self) -> None:
+        patcher = mock.patch.object(base, "psCache", LRUCache(16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        avatar = self.proto.user
+        avatar.server.processVersion, cmdoutput = server.command_output(
+            "src/cowrie/data/cmdoutput.json"
+        )
+        avatar.server.process = cmdoutput["command"]["ps"]
+        with mock.patch.object(base.random, "randint", return_value=4000):
+            self.proto.lineReceived(b"ps auxw\n")
+        first = self.tr.value()
+        self.assertIn(b"[kthreadd]", first)
+        self.assertIn(b"/usr/sbin/sshd: root@pts/0", first)
+
+        # The process table comes back from the cache, the session's own
+        # processes get new PIDs
+        self.tr.clear()
+        with mock.patch.object(base.random, "randint", return_value=5000):
+            self.proto.lineReceived(b"ps auxw\n")
+        second = self.tr.value()
+        self.assertEqual(len(base.psCache), 1)
+        first_lines, second_lines = first.split(b"\n"), second.split(b"\n")
+        self.assertEqual(first_lines[:-4], second_lines[:-4])
+        self.assertEqual(second_lines[-4].split()[1], b"5000")
+        self.assertEqual(second_lines[-3].split()[1], b"5005")
+
+        # Another user or other arguments are rendered again
+        avatar.username = "admin"
+        self.proto.lineReceived(b"ps auxw\n")
+        self.proto.lineReceived(b"ps aux\n")
+        self.assertEqual(len(base.psCache), 3)
+
+    def test_ps_header(self) -> None:
+        avatar = self.proto.user
+        avatar.server.processVersion, cmdoutput = server.command_output(
+            "src/cowrie/data/cmdoutput.json"
+        )
+        for process in ([], cmdoutput["command"]["ps"]):
+            avatar.server.process = process
+            self.tr.clear()
+            self.proto.lineReceived(b"ps aux\n")
+            self.assertEqual(
+                self.tr.value().splitlines()[0].split()[:3],
+                [b"USER", b"PID", b"%CPU"],
+            )
+
     def test_chattr_command(self) -> None:
         self.proto.lineReceived(b"chattr\n")
         self.assertEqual(self.tr.value(), PROMPT)
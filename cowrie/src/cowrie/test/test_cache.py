@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+
+from twisted.internet import defer, task
+
+from cowrie.core.cache import Coalescer, LRUCache, PersistentCache
+from cowrie.core.ratelimit import TokenBucket
+
+
+class PersistentCacheTests(unittest.TestCase):
+    """Tests for cowrie/core/cache.py PersistentCache"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "sub", "cache.sqlite")
+        self.cache = PersistentCache(self.filename)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_ttl(self) -> None:
+        self.cache.set("file", "abc", {"positives": 3}, ttl=10, now=100)
+        self.assertEqual(self.cache.get("file", "abc", now=105), {"positives": 3})
+        self.assertIsNone(self.cache.get("file", "abc", now=111))
+        self.assertIsNone(self.cache.get("url", "abc", now=105))
+        self.assertEqual(self.cache.purge(now=111), 1)
+
+    def test_persistent(self) -> None:
+        self.cache.set("url", "http://x/", [1, 2], ttl=3600)
+        self.cache.close()
+        self.cache = PersistentCache(self.filename)
+        self.assertEqual(self.cache.get("url", "http://x/"), [1, 2])
+
+
+class LRUCacheTests(unittest.TestCase):
+    """Tests for cowrie/core/cache.py LRUCache"""
+
+    def test_evicts_least_recently_used(self) -> None:
+        lru = LRUCache(2)
+        lru.set("a", 1, expires=100)
+        lru.set("b", 2, expires=100)
+        self.assertEqual(lru.get("a", now=0), (True, 1))
+        lru.set("c", 3, expires=100)
+        self.assertEqual(lru.get("b", now=0), (False, None))
+        self.assertEqual(len(lru), 2)
+
+    def test_expiry(self) -> None:
+        lru = LRUCache(2)
+        lru.set("a", None, expires=10)
+        self.assertEqual(lru.get("a", now=5), (True, None))
+        self.assertEqual(lru.get("a", now=11), (False, None))
+
+    def test_no_expiry(self) -> None:
+        lru = LRUCache(2)
+        lru.set("a", 1)
+        self.assertEqual(lru.get("a"), (True, 1))
+        self.assertEqual(lru.get("a", now=1e12), (True, 1))
+
+
+class CoalescerTests(unittest.TestCase):
+    """Tests for cowrie/core/cache.py Coalescer"""
+
+    def test_concurrent_calls_share_result(self) -> None:
+        calls: list[defer.Deferred[str]] = []
+
+        def lookup() -> defer.Deferred[str]:
+            d: defer.Deferred[str] = defer.Deferred()
+            calls.append(d)
+            return d
+
+        c = Coalescer()
+        results: list[str] = []
+        c.run("k", lookup).addCallback(results.append)
+        c.run("k", lookup).addCallback(results.append)
+        self.assertIn("k", c)
+        self.assertEqual(len(calls), 1)
+        calls[0].callback("verdict")
+        self.assertEqual(results, ["verdict", "verdict"])
+        self.assertNotIn("k", c)
+
+        c.run("k", lookup)
+        self.assertEqual(len(calls), 2)
+
+    def test_failure_propagates(self) -> None:
+        c = Coalescer()
+        errors: list[type] = []
+        for _ in range(2):
+            c.run("k", lambda: 1 / 0).addErrback(lambda f: errors.append(f.type))
+        self.assertEqual(errors, [ZeroDivisionError, ZeroDivisionError])
+
+
+class TokenBucketTests(unittest.TestCase):
+    """Tests for cowrie/core/ratelimit.py"""
+
+    def test_rate(self) -> None:
+        clock = task.Clock()
+        bucket = TokenBucket(4, 60, clock=clock)
+        fired: list[int] = []
+        for i in range(6):
+            bucket.acquire().addCallback(lambda _, i=i: fired.append(i))
+        self.assertEqual(fired, [0, 1, 2, 3])
+        self.assertEqual(len(bucket), 2)
+        clock.advance(14)
+        self.assertEqual(fired, [0, 1, 2, 3])
+        clock.advance(1)
+        self.assertEqual(fired, [0, 1, 2, 3, 4])
+        clock.advance(15)
+        self.assertEqual(fired, [0, 1, 2, 3, 4, 5])
+        self.assertEqual(len(bucket), 0)
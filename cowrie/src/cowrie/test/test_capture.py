@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cowrie.core.capture import CaptureFiles, CaptureWriter
+
+
+class CaptureTests(unittest.TestCase):
+    """Tests for cowrie/core/capture.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "capture")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_buffered(self) -> None:
+        """
+        Piping a payload in 4 KiB chunks opens the file once and writes
+        it in buffer sized blocks
+        """
+        with (
+            mock.patch("os.open", wraps=os.open) as os_open,
+            mock.patch("os.write", wraps=os.write) as os_write,
+        ):
+            writer = CaptureWriter(self.path, buffer_size=65536)
+            for _ in range(256):
+                writer.write(b"x" * 4096)
+            writer.close()
+        self.assertEqual(os_open.call_count, 1)
+        self.assertEqual(os_write.call_count, 16)
+        self.assertEqual(self.read(), b"x" * 4096 * 256)
+
+    def test_limit(self) -> None:
+        writer = CaptureWriter(self.path, limit=10)
+        self.assertEqual(writer.write(b"123456"), 6)
+        self.assertFalse(writer.truncated)
+        self.assertEqual(writer.write(b"789abc"), 4)
+        self.assertEqual(writer.write(b"def"), 0)
+        self.assertTrue(writer.truncated)
+        writer.close()
+        self.assertEqual(self.read(), b"123456789a")
+
+    def test_append_counts_existing(self) -> None:
+        with open(self.path, "wb") as f:
+            f.write(b"12345678")
+        writer = CaptureWriter(self.path, limit=10)
+        self.assertEqual(writer.write(b"9abc"), 2)
+        writer.close()
+        self.assertEqual(self.read(), b"123456789a")
+
+    def test_files(self) -> None:
+        captures = CaptureFiles()
+        writer = captures.open(self.path)
+        self.assertIs(captures.open(self.path), writer)
+        writer.write(b"data")
+        self.assertEqual(self.read(), b"")
+        captures.close_all()
+        self.assertTrue(writer.closed)
+        self.assertNotIn(self.path, captures)
+        self.assertEqual(self.read(), b"data")
+        self.assertEqual(writer.write(b"more"), 0)
+
+    def test_hash(self) -> None:
+        captures = CaptureFiles()
+        captures.open(self.path).write(b"first ")
+        captures.close(self.path)
+        # Reopened, as by a second >> redirection, the hash carries on
+        captures.open(self.path).write(b"second")
+        captures.close(self.path)
+        self.assertEqual(
+            captures.hexdigest(self.path), hashlib.sha256(b"first second").hexdigest()
+        )
+
+        # Changed behind the writer's back, the hash is unknown
+        with open(self.path, "ab") as f:
+            f.write(b"!")
+        self.assertIsNone(captures.hexdigest(self.path))
+        writer = CaptureWriter(self.path)
+        self.assertIsNone(writer.hexdigest())
+        writer.close()
@@ -4,7 +4,9 @@ from __future__ import annotations
 
 import os
 import unittest
+from unittest import mock
 
+from cowrie.shell import command
 from cowrie.shell.protocol import HoneyPotInteractiveProtocol
 from cowrie.test.fake_server import FakeAvatar, FakeServer
 from cowrie.test.fake_transport import FakeTransport
@@ -49,3 +51,53 @@ class ShellCatCommandTests(unittest.TestCase):
         self.proto.lineReceived(b"test\n")
         self.proto.handle_CTRL_C()
         self.assertEqual(self.tr.value(), b"test\n^C\n" + PROMPT)
+
+    def test_cat_proc_memoized(self) -> None:
+        patcher = mock.patch.object(command, "outputCache", command.LRUCache(16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with open("honeyfs/proc/cpuinfo", "rb") as f:
+            cpuinfo = f.read()
+        self.proto.lineReceived(b"cat /proc/cpuinfo\n")
+        self.assertEqual(self.tr.value(), cpuinfo + PROMPT)
+
+        self.tr.clear()
+        with mock.patch.object(self.proto.fs, "file_contents") as file_contents:
+            self.proto.lineReceived(b"cat /proc/cpuinfo | grep processor\n")
+            file_contents.assert_not_called()
+        processors = [line for line in cpuinfo.splitlines() if b"processor" in line]
+        self.assertEqual(self.tr.value(), b"\n".join(processors) + b"\n" + PROMPT)
+
+    def test_cat_proc_memoized_pipe_closed(self) -> None:
+        """
+        A memoized render stops once the pipe closes and is not kept
+        """
+        patcher = mock.patch.object(command, "outputCache", command.LRUCache(16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with mock.patch.object(
+            command.HoneyPotCommand,
+            "writeBytes",
+            autospec=True,
+            side_effect=command.HoneyPotCommand.writeBytes,
+        ) as writeBytes:
+            self.proto.lineReceived(b"cat /proc/cpuinfo | head -n 1\n")
+        writers = [type(call.args[0]).__name__ for call in writeBytes.call_args_list]
+        self.assertEqual(writers.count("Command_cat"), 1)
+        self.assertEqual(len(command.outputCache), 0)
+
+    def test_cat_memo_bypassed(self) -> None:
+        patcher = mock.patch.object(command, "outputCache", command.LRUCache(16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.proto.lineReceived(b"cat /proc/version\n")
+        self.proto.lineReceived(b"cd /proc\n")
+        self.proto.lineReceived(b"rm /proc/version\n")
+        self.tr.clear()
+        self.proto.lineReceived(b"cat version\n")
+        self.assertEqual(
+            self.tr.value(),
+            b"cat: version: No such file or directory\n"
+            + PROMPT.replace(b"~", b"/proc"),
+        )
+        self.assertEqual(len(command.outputCache), 1)
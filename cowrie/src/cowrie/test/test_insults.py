@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+
+from twisted.internet import task
+from twisted.test import proto_helpers
+
+from cowrie.core import ttylog
+from cowrie.insults.insults import LoggingServerProtocol
+
+
+class ChannelTransport(proto_helpers.StringTransport):
+    def __init__(self) -> None:
+        super().__init__()
+        self.writes: list[bytes] = []
+        self.ended: bool = False
+
+    def write(self, data: bytes) -> None:
+        assert not self.ended
+        self.writes.append(data)
+        super().write(data)
+
+    def processEnded(self, reason: object) -> None:
+        self.ended = True
+
+
+class OutputCoalescingTests(unittest.TestCase):
+    """Tests for output buffering in cowrie/insults/insults.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ttylogFile = os.path.join(self.tmpdir.name, "tty")
+        self.clock = task.Clock()
+        self.proto = LoggingServerProtocol()
+        self.proto.clock = self.clock
+        self.proto.transport = ChannelTransport()
+        self.proto.ttylogEnabled = True
+        self.proto.ttylogOpen = True
+        self.proto.ttylogWriter = ttylog.TTYLogWriter(self.ttylogFile, 0.0)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def records(self) -> list[bytes]:
+        self.proto.ttylogWriter.close(0.0)
+        with open(self.ttylogFile, "rb") as f:
+            return [
+                record[6]
+                for record in ttylog.ttylog_records(f)
+                if record[0] == ttylog.OP_WRITE
+            ]
+
+    def test_coalesced(self) -> None:
+        for _ in range(1000):
+            self.proto.write(b"y ")
+        self.assertEqual(self.proto.transport.writes, [])
+        self.clock.advance(0)
+        self.assertEqual(self.proto.transport.writes, [b"y " * 1000])
+        self.assertEqual(self.records(), [b"y " * 1000])
+        self.assertEqual(self.proto.bytesSent, 2000)
+
+    def test_ends_after_output(self) -> None:
+        self.proto.write(b"output")
+        self.proto.processEnded(None)
+        self.assertFalse(self.proto.transport.ended)
+        self.clock.advance(0)
+        self.assertEqual(self.proto.transport.value(), b"output")
+        self.assertTrue(self.proto.transport.ended)
+
+        # Nothing buffered, the session ends at once
+        self.proto.transport.ended = False
+        self.proto.processEnded(None)
+        self.assertTrue(self.proto.transport.ended)
+
+    def test_rate_limit(self) -> None:
+        self.proto.outputRateLimit = 1000
+        self.proto.outputBudget = 1000
+        self.proto.write(b"x" * 3500)
+        self.proto.processEnded(None)
+        self.clock.advance(0)
+        self.assertEqual(len(self.proto.transport.value()), 1000)
+        self.clock.advance(1)
+        self.assertEqual(len(self.proto.transport.value()), 2000)
+        self.clock.pump([1, 1])
+        self.assertEqual(len(self.proto.transport.value()), 3500)
+        self.assertTrue(self.proto.transport.ended)
+        self.assertEqual(b"".join(self.records()), b"x" * 3500)
+
+    def test_rate_limit_split_writes(self) -> None:
+        self.proto.outputRateLimit = 1000
+        self.proto.outputBudget = 1000
+        data = b"".join(b"%04d" % i for i in range(1000))
+        for i in range(0, len(data), 300):
+            self.proto.write(data[i : i + 300])
+        self.clock.pump([0] + [1] * 4)
+        self.assertEqual(
+            [len(write) for write in self.proto.transport.writes], [1000] * 4
+        )
+        self.assertEqual(self.proto.transport.value(), data)
+        self.assertEqual(self.proto.outputBuffered, 0)
+
+    def test_buffer_limit(self) -> None:
+        self.proto.outputRateLimit = 1000
+        self.proto.outputBudget = 1000
+        self.proto.outputBufferLimit = 2000
+        self.proto.write(b"x" * 1500)
+        self.assertFalse(self.proto.outputFull())
+        self.proto.write(b"y" * 1500)
+        self.assertTrue(self.proto.outputFull())
+        self.assertEqual(self.proto.outputDropped, 1000)
+        self.clock.advance(0)
+        self.assertFalse(self.proto.outputFull())
+        self.clock.advance(1)
+        self.assertEqual(self.proto.transport.value(), b"x" * 1500 + b"y" * 500)
+        self.assertEqual(self.proto.bytesSent, 2000)
+        self.proto.write(b"z" * 10)
+        self.clock.advance(1)
+        self.assertEqual(self.proto.transport.value()[-10:], b"z" * 10)
+
+        # Dropped output is logged in order, queued output once
+        self.assertEqual(
+            b"".join(self.records()), b"x" * 1500 + b"y" * 1500 + b"z" * 10
+        )
+
+    def test_lost_after_partial_flush(self) -> None:
+        """
+        Output still queued when the connection is lost is logged, the
+        part already sent is not logged again
+        """
+        self.proto.outputRateLimit = 1000
+        self.proto.outputBudget = 1000
+        self.proto.write(b"x" * 1500)
+        self.proto.write(b"y" * 1000)
+        self.clock.advance(0)
+        self.proto.ttylogPath = self.tmpdir.name
+        self.proto.ttylogFile = self.ttylogFile
+        self.proto.startTime = 0.0
+        self.proto.connectionLost()
+        self.assertEqual(self.proto.outputBuffered, 0)
+        self.assertEqual(len(self.proto.outputBuffer), 0)
+        path = os.path.join(self.tmpdir.name, self.proto.ttylogWriter.hexdigest())
+        with open(path, "rb") as f:
+            records = [
+                record[6]
+                for record in ttylog.ttylog_records(f)
+                if record[0] == ttylog.OP_WRITE
+            ]
+        self.assertEqual(records, [b"x" * 1000, b"x" * 500 + b"y" * 1000])
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+
+from cowrie.core.metrics import JSONFileSink, MetricsRegistry, StatsDSink
+
+
+class MetricsRegistryTests(unittest.TestCase):
+    """Tests for cowrie/core/metrics.py"""
+
+    def setUp(self) -> None:
+        self.registry = MetricsRegistry()
+
+    def test_counter_labels(self) -> None:
+        c = self.registry.counter("events_total", "Events")
+        c.inc(plugin="jsonlog")
+        c.inc(2, plugin="jsonlog")
+        c.inc(plugin="mysql")
+        self.assertEqual(
+            sorted(c.samples(), key=lambda s: s[0]["plugin"]),
+            [({"plugin": "jsonlog"}, 3), ({"plugin": "mysql"}, 1)],
+        )
+
+    def test_same_name_returns_same_metric(self) -> None:
+        a = self.registry.gauge("queue")
+        b = self.registry.gauge("queue")
+        self.assertIs(a, b)
+        with self.assertRaises(TypeError):
+            self.registry.counter("queue")
+
+    def test_histogram(self) -> None:
+        h = self.registry.histogram("lag", buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.5, 2.0):
+            h.observe(v)
+        (labels, value) = h.samples()[0]
+        self.assertEqual(labels, {})
+        self.assertEqual(value.count, 4)
+        self.assertEqual(value.cumulative(), [(0.1, 1), (1.0, 3), (float("inf"), 4)])
+        self.assertEqual(value.quantile(0.5), 1.0)
+
+    def test_snapshot_is_json(self) -> None:
+        self.registry.counter("c").inc(plugin="x")
+        self.registry.histogram("h", buckets=(1.0,)).observe(3.0)
+        snap = json.loads(json.dumps(self.registry.snapshot()))
+        self.assertEqual(snap[0]["samples"][0]["value"], 1)
+        self.assertEqual(snap[1]["samples"][0]["value"]["buckets"][-1], ["+Inf", 1])
+
+
+class MetricsSinkTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = MetricsRegistry()
+        self.registry.counter("writes_total").inc(5, plugin="jsonlog")
+        self.registry.gauge("sessions").set(3)
+
+    def test_json_file_sink(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "metrics.json")
+            sink = JSONFileSink(path)
+            sink.flush(self.registry)
+            sink.flush(self.registry)
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])["metrics"][1]["name"], "sessions")
+
+    def test_statsd_lines(self) -> None:
+        sink = StatsDSink("127.0.0.1", 8125)
+        try:
+            self.assertEqual(
+                sink.lines(self.registry),
+                ["cowrie.writes_total.plugin_jsonlog:5|c", "cowrie.sessions:3|g"],
+            )
+            self.registry.counter("writes_total").inc(2, plugin="jsonlog")
+            self.assertEqual(
+                sink.lines(self.registry)[0], "cowrie.writes_total.plugin_jsonlog:2|c"
+            )
+        finally:
+            sink.close()
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import unittest
+from typing import Any
+from unittest import mock
+
+from cowrie.core import monitor, output
+
+
+class DummyOutput(output.Output):
+    def start(self) -> None:
+        self.events: list[dict[str, Any]] = []
+
+    def stop(self) -> None:
+        pass
+
+    def write(self, event: dict[str, Any]) -> None:
+        if event["eventid"] == "cowrie.test.error":
+            raise ValueError
+        self.events.append(event)
+
+
+DummyOutput.__module__ = "cowrie.output.testdummy"
+
+
+class OutputInstrumentationTests(unittest.TestCase):
+    """Tests for the per plugin metrics in cowrie/core/output.py"""
+
+    def setUp(self) -> None:
+        for m in (
+            output.write_seconds,
+            output.events_total,
+            output.errors_total,
+            output.dropped_total,
+        ):
+            m.clear()
+        self.output = DummyOutput()
+        self.output.emit(
+            {
+                "eventid": "cowrie.session.connect",
+                "sessionno": "S1",
+                "session": "abcdef",
+                "src_ip": "192.0.2.1",
+                "message": "New connection",
+            }
+        )
+
+    def count(self, metric: Any) -> Any:
+        return metric.values.get((("plugin", "testdummy"),), 0)
+
+    def test_events_and_latency(self) -> None:
+        for _ in range(3):
+            self.output.emit(
+                {"eventid": "cowrie.command.input", "sessionno": "S1", "message": "ls"}
+            )
+        self.assertEqual(len(self.output.events), 4)
+        self.assertEqual(self.count(output.events_total), 4)
+        self.assertEqual(self.count(output.write_seconds).count, 4)
+
+    def test_errors_and_drops(self) -> None:
+        with self.assertRaises(ValueError):
+            self.output.emit(
+                {"eventid": "cowrie.test.error", "sessionno": "S1", "message": "x"}
+            )
+        self.output.emit(
+            {"eventid": "cowrie.command.input", "session": "unknown", "message": "x"}
+        )
+        self.output.emit({"eventid": "cowrie.command.input", "sessionno": "S1"})
+        self.assertEqual(self.count(output.errors_total), 1)
+        # Only the connect event was written
+        self.assertEqual(self.count(output.events_total), 1)
+        self.assertEqual(self.count(output.dropped_total), 2)
+
+    def test_profile_report(self) -> None:
+        report = output.profile_report().splitlines()
+        self.assertTrue(report[0].startswith("plugin"))
+        self.assertTrue(report[1].startswith("testdummy"))
+
+    def test_slow_writes(self) -> None:
+        """
+        Each slow plugin is logged once, with its write() method
+        """
+        monitor.slow_writes.clear()
+        with (
+            mock.patch.object(monitor, "_slow_plugins", set()),
+            mock.patch.object(monitor.log, "msg") as msg,
+        ):
+            for plugin in ("testdummy", "testdummy", "other"):
+                monitor.report_slow_write(plugin, 1.0, self.output.write)
+            self.assertEqual(msg.call_count, 2)
+            self.assertIn("DummyOutput.write", msg.call_args_list[0][0][0])
+            self.assertIn("Output plugin other", msg.call_args_list[1][0][0])
+        self.assertEqual(monitor.slow_writes.values[(("plugin", "testdummy"),)], 2)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+from twisted.internet import task
+
+from cowrie.shell.protocol import HoneyPotInteractiveProtocol, honeypot
+from cowrie.test.fake_server import FakeAvatar, FakeServer
+from cowrie.test.fake_transport import FakeTransport
+
+os.environ["COWRIE_HONEYPOT_DATA_PATH"] = "data"
+os.environ["COWRIE_SHELL_FILESYSTEM"] = "src/cowrie/data/fs.pickle"
+
+PROMPT = b"root@unitTest:~# "
+MiB = 1024 * 1024
+
+
+class PipeTests(unittest.TestCase):
+    """Tests for pipes in cowrie/shell/honeypot.py"""
+
+    def setUp(self) -> None:
+        self.proto = HoneyPotInteractiveProtocol(FakeAvatar(FakeServer()))
+        self.tr = FakeTransport("", "31337")
+        self.proto.makeConnection(self.tr)
+        self.tr.clear()
+
+    def tearDown(self) -> None:
+        self.proto.connectionLost()
+
+    def pipeline(self, *commands: str) -> list[honeypot.StdOutStdErrEmulationProtocol]:
+        pps: list[honeypot.StdOutStdErrEmulationProtocol] = []
+        for cmd in reversed(commands):
+            name, *args = cmd.split()
+            pps.insert(
+                0,
+                honeypot.StdOutStdErrEmulationProtocol(
+                    self.proto,
+                    self.proto.commands[name],
+                    args,
+                    None,
+                    pps[0] if pps else None,
+                ),
+            )
+        return pps
+
+    def test_bounded_buffer(self) -> None:
+        """
+        Piping 40 MiB into a command through a 4 MiB buffer keeps no more
+        than the buffer in memory
+        """
+        chunk = b"x" * 65535 + b"\n"
+        with mock.patch.object(
+            honeypot.StdOutStdErrEmulationProtocol, "pipe_buffer_size", 4 * MiB
+        ):
+            first, second = self.pipeline("cat", "wc")
+            tracemalloc.start()
+            for _ in range(40 * MiB // len(chunk)):
+                first.outReceived(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.assertEqual(second.pipe_size, 4 * MiB)
+        self.assertTrue(first.outputClosed())
+        self.assertLess(peak, 5 * MiB)
+
+    def test_head_limit(self) -> None:
+        first, second = self.pipeline("cat", "head -n 3")
+        for _ in range(100):
+            first.outReceived(b"line\n")
+        self.assertEqual(second.pipe_lines, 3)
+        self.assertTrue(first.outputClosed())
+
+        first, second = self.pipeline("cat", "head -c 10")
+        first.outReceived(b"x" * 100)
+        self.assertEqual(second.pipe_size, 10)
+
+        first, second = self.pipeline("cat", "wc -l")
+        first.outReceived(b"x\n" * 100)
+        self.assertFalse(first.outputClosed())
+
+    def test_cat_large_file_head(self) -> None:
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b"".join(b"%063d\n" % i for i in range(512 * 1024)))
+            f.flush()
+            self.proto.fs.mkfile("/tmp/big", 0, 0, 0, 33188)
+            self.proto.fs.update_realfile(self.proto.fs.getfile("/tmp/big"), f.name)
+            self.proto.lineReceived(b"cat /tmp/big | grep 1 | head -n 2\n")
+        self.assertEqual(self.tr.value(), b"%063d\n%063d\n" % (1, 10) + PROMPT)
+
+    def test_yes_head(self) -> None:
+        """
+        yes stops once head has read its input, instead of running forever
+        """
+        clock = task.Clock()
+        with mock.patch("cowrie.commands.base.reactor", clock):
+            self.proto.lineReceived(b"yes | head -n 3\n")
+            clock.advance(1)
+        self.assertFalse(clock.getDelayedCalls())
+        self.assertTrue(self.tr.value().startswith(b"y\n"))
+        self.assertTrue(self.tr.value().endswith(PROMPT))
+
+    def test_yes_paused(self) -> None:
+        """
+        yes writes nothing while the terminal queue is full
+        """
+        clock = task.Clock()
+        with (
+            mock.patch("cowrie.commands.base.reactor", clock),
+            mock.patch.object(self.tr, "outputFull", return_value=True),
+        ):
+            self.proto.lineReceived(b"yes\n")
+            clock.advance(1)
+            self.assertEqual(self.tr.value(), b"")
+            self.tr.outputFull.return_value = False
+            clock.advance(0.01)
+            self.assertEqual(self.tr.value(), b"y\n")
+            self.proto.handle_CTRL_C()
+
+    def test_cat_paused(self) -> None:
+        """
+        cat stops writing while the terminal queue is full and goes on
+        once it has been sent
+        """
+        passwd = self.proto.fs.file_contents("/etc/passwd")
+        with (
+            mock.patch.object(self.tr, "outputFull", return_value=True),
+            mock.patch.object(self.tr, "afterOutput", create=True) as afterOutput,
+        ):
+            self.proto.lineReceived(b"cat /etc/passwd\n")
+            self.assertEqual(self.tr.value(), passwd.split(b"\n")[0] + b"\n")
+            self.tr.outputFull.return_value = False
+            afterOutput.call_args[0][0]()
+        self.assertEqual(self.tr.value(), passwd + PROMPT)
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import os
+import unittest
+from unittest import mock
+
+from twisted.internet import task
+
+from cowrie.shell import profiling
+from cowrie.shell.command import HoneyPotCommand
+from cowrie.shell.protocol import HoneyPotInteractiveProtocol
+from cowrie.test.fake_server import FakeAvatar, FakeServer
+from cowrie.test.fake_transport import FakeTransport
+
+os.environ["COWRIE_HONEYPOT_DATA_PATH"] = "data"
+os.environ["COWRIE_SHELL_FILESYSTEM"] = "src/cowrie/data/fs.pickle"
+
+PROMPT = b"root@unitTest:~# "
+METRICS = (
+    profiling.command_seconds,
+    profiling.command_cpu_seconds,
+    profiling.command_output_bytes,
+    profiling.command_invocations,
+)
+
+
+def sample(metric, name: str):
+    return metric.values.get((("command", name),))
+
+
+class CommandProfilingTests(unittest.TestCase):
+    """Tests for cowrie/shell/profiling.py"""
+
+    def setUp(self) -> None:
+        for metric in METRICS:
+            metric.clear()
+        profiling.interval.clear()
+        patcher = mock.patch.object(profiling, "enabled", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock = task.Clock()
+        cooperator = task.Cooperator(
+            scheduler=lambda f: self.clock.callLater(1, f),
+            terminationPredicateFactory=lambda: lambda: True,
+        )
+        patcher = mock.patch.object(HoneyPotCommand, "cooperator", cooperator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.proto = HoneyPotInteractiveProtocol(FakeAvatar(FakeServer()))
+        self.tr = FakeTransport("", "31337")
+        self.proto.makeConnection(self.tr)
+        self.tr.clear()
+
+    def tearDown(self) -> None:
+        self.proto.connectionLost()
+
+    def run_line(self, line: str) -> bytes:
+        self.tr.clear()
+        self.proto.lineReceived(line.encode() + b"\n")
+        while self.clock.getDelayedCalls():
+            self.clock.advance(1)
+        return self.tr.value()
+
+    def test_recorded(self) -> None:
+        self.run_line("echo hello")
+        self.run_line("echo hello world")
+        self.assertEqual(sample(profiling.command_invocations, "Command_echo"), 2)
+        self.assertEqual(sample(profiling.command_output_bytes, "Command_echo"), 18)
+        self.assertEqual(sample(profiling.command_seconds, "Command_echo").count, 2)
+        self.assertEqual(profiling.interval["Command_echo"][0], 2)
+
+    def test_errors(self) -> None:
+        self.assertEqual(
+            self.run_line("cat /nonexistent"),
+            b"cat: /nonexistent: No such file or directory\n" + PROMPT,
+        )
+        self.assertEqual(sample(profiling.command_output_bytes, "Command_cat"), 45)
+
+    def test_cooperative(self) -> None:
+        """
+        A command that exits after start() returned is recorded once, with
+        the time of its steps
+        """
+        self.run_line("find /")
+        self.assertEqual(sample(profiling.command_invocations, "Command_find"), 1)
+        seconds = sample(profiling.command_seconds, "Command_find")
+        cpu = sample(profiling.command_cpu_seconds, "Command_find")
+        self.assertGreater(cpu.sum, 0)
+        self.assertGreater(seconds.sum, 0)
+
+    def test_ctrl_c(self) -> None:
+        self.tr.clear()
+        self.proto.lineReceived(b"find /\n")
+        self.clock.advance(1)
+        self.proto.handle_CTRL_C()
+        while self.clock.getDelayedCalls():
+            self.clock.advance(1)
+        self.assertEqual(sample(profiling.command_invocations, "Command_find"), 1)
+
+    def test_disabled(self) -> None:
+        with mock.patch.object(profiling, "enabled", False):
+            self.run_line("echo hello")
+        self.assertIsNone(sample(profiling.command_invocations, "Command_echo"))
+
+    def test_summary(self) -> None:
+        self.run_line("echo hello")
+        self.run_line("find /")
+        rows = profiling.summary(1).splitlines()
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[1].startswith("Command_find "))
+
+    def test_reporter(self) -> None:
+        clock = task.Clock()
+        reporter = profiling.CommandProfileReporter()
+        reporter._loop.clock = clock
+        reporter.startService()
+        self.run_line("echo hello")
+        with mock.patch.object(profiling.log, "msg") as msg:
+            clock.advance(reporter.interval)
+            self.assertIn("Command_echo", msg.call_args[0][0])
+            self.assertEqual(profiling.interval, {})
+            msg.reset_mock()
+            clock.advance(reporter.interval)
+            msg.assert_not_called()
+        reporter.stopService()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from cowrie.commands.uname import Command_uname
+from cowrie.scripts import commandmanifest
+from cowrie.shell.command import CommandRegistry
+from cowrie.shell.protocol import HoneyPotBaseProtocol, HoneyPotInteractiveProtocol
+from cowrie.test.fake_server import FakeAvatar, FakeServer
+from cowrie.test.fake_transport import FakeTransport
+
+os.environ["COWRIE_HONEYPOT_DATA_PATH"] = "data"
+os.environ["COWRIE_SHELL_FILESYSTEM"] = "src/cowrie/data/fs.pickle"
+
+PROMPT = b"root@unitTest:~# "
+PATH = ["/usr/local/bin", "/usr/bin", "/bin"]
+
+
+class CommandLookupTests(unittest.TestCase):
+    """Tests for command lookup in cowrie/shell/protocol.py"""
+
+    def setUp(self) -> None:
+        os.environ["COWRIE_HONEYPOT_DATA_PATH"] = "src/cowrie/data"
+        HoneyPotBaseProtocol.txtcmds = None
+        self.proto = HoneyPotInteractiveProtocol(FakeAvatar(FakeServer()))
+        self.tr = FakeTransport("", "31337")
+        self.proto.makeConnection(self.tr)
+        self.tr.clear()
+
+    def tearDown(self) -> None:
+        self.proto.connectionLost()
+        os.environ["COWRIE_HONEYPOT_DATA_PATH"] = "data"
+        HoneyPotBaseProtocol.txtcmds = None
+
+    def test_txtcmd(self) -> None:
+        with open("src/cowrie/data/txtcmds/usr/bin/top", encoding="utf-8") as f:
+            top = f.read()
+        self.proto.lineReceived(b"top\n")
+        self.assertEqual(self.tr.value(), top.encode() + PROMPT)
+
+        with mock.patch("builtins.open") as mock_open:
+            self.tr.clear()
+            self.proto.lineReceived(b"/usr/bin/top\n")
+            mock_open.assert_not_called()
+        self.assertEqual(self.tr.value(), top.encode() + PROMPT)
+
+    def test_cached(self) -> None:
+        cmdclass = self.proto.getCommand("top", PATH)
+        self.assertIsNotNone(cmdclass)
+        with mock.patch.object(
+            self.proto.fs, "exists", wraps=self.proto.fs.exists
+        ) as exists:
+            self.assertIs(self.proto.getCommand("top", PATH), cmdclass)
+            self.assertIsNone(self.proto.getCommand("nosuchcommand", PATH))
+            self.assertIsNone(self.proto.getCommand("nosuchcommand", PATH))
+            # Only the first miss looks at each PATH entry
+            self.assertEqual(exists.call_count, len(PATH))
+
+    def test_filesystem_changes(self) -> None:
+        self.assertIsNotNone(self.proto.getCommand("top", PATH))
+        self.proto.lineReceived(b"rm /usr/bin/top\n")
+        self.assertIsNone(self.proto.getCommand("top", PATH))
+        self.proto.lineReceived(b"touch /usr/bin/top\n")
+        self.assertIsNotNone(self.proto.getCommand("top", PATH))
+
+    def test_relative(self) -> None:
+        self.assertIsNone(self.proto.getCommand("./top", PATH))
+        self.proto.cwd = "/usr/bin"
+        self.assertIsNotNone(self.proto.getCommand("./top", PATH))
+
+    def test_added_command(self) -> None:
+        self.proto.fs.mkfile("/usr/bin/newcmd", 0, 0, 0, 33188)
+        self.assertIsNone(self.proto.getCommand("newcmd", PATH))
+        self.proto.commands["/usr/bin/newcmd"] = HoneyPotBaseProtocol
+        try:
+            self.assertIs(self.proto.getCommand("newcmd", PATH), HoneyPotBaseProtocol)
+        finally:
+            del self.proto.commands["/usr/bin/newcmd"]
+
+
+class CommandRegistryTests(unittest.TestCase):
+    """Tests for CommandRegistry in cowrie/shell/command.py"""
+
+    def test_manifest_current(self) -> None:
+        with open("src/cowrie/commands/manifest.py", encoding="utf-8") as f:
+            self.assertEqual(
+                f.read(),
+                commandmanifest.generate(),
+                "run src/cowrie/scripts/commandmanifest.py",
+            )
+
+    def test_imported_on_first_use(self) -> None:
+        code = (
+            "import sys\n"
+            "from cowrie.shell.protocol import HoneyPotBaseProtocol\n"
+            "print('cowrie.commands.wget' in sys.modules)\n"
+            "HoneyPotBaseProtocol.commands['wget']\n"
+            "print('cowrie.commands.wget' in sys.modules)\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, "PYTHONPATH": "src"},
+        ).stdout
+        self.assertEqual(output.split(), ["False", "True"])
+
+    def test_registry(self) -> None:
+        commands = CommandRegistry({"uname": ("uname", "/bin/uname")})
+        self.assertEqual(commands.pending, {"uname": "uname", "/bin/uname": "uname"})
+        self.assertIn("/bin/uname", commands)
+        self.assertEqual(commands.pending, {})
+        self.assertIs(commands["uname"], Command_uname)
+        self.assertEqual(len(commands), 2)
+
+        commands["/usr/bin/new"] = HoneyPotBaseProtocol
+        self.assertEqual(len(commands), 3)
+        del commands["/usr/bin/new"]
+        self.assertEqual(sorted(commands), ["/bin/uname", "uname"])
+
+    def test_runtime_command_wins(self) -> None:
+        commands = CommandRegistry({"uname": ("uname", "/bin/uname")})
+        commands["/bin/uname"] = HoneyPotBaseProtocol
+        self.assertIs(commands["uname"], Command_uname)
+        self.assertIs(commands["/bin/uname"], HoneyPotBaseProtocol)
+
+    def test_failed_import(self) -> None:
+        commands = CommandRegistry({"nosuchmodule": ("nosuchcommand",)})
+        with mock.patch("cowrie.shell.command.log.err") as err:
+            self.assertIsNone(commands.get("nosuchcommand"))
+        err.assert_called_once()
+        self.assertNotIn("nosuchcommand", commands)
+        self.assertEqual(len(commands), 0)
+
+        # Tested for before it is looked up, the command is left out too
+        commands = CommandRegistry({"nosuchmodule": ("nosuchcommand",)})
+        with mock.patch("cowrie.shell.command.log.err"):
+            self.assertNotIn("nosuchcommand", commands)
+        with self.assertRaises(KeyError):
+            commands["nosuchcommand"]
+
+    def test_failed_import_lookup(self) -> None:
+        """
+        A command whose module fails to import is not found by the shell
+        """
+        proto = HoneyPotInteractiveProtocol(FakeAvatar(FakeServer()))
+        commands = CommandRegistry({"nosuchmodule": ("wget", "/usr/bin/wget")})
+        with (
+            mock.patch.object(proto, "commands", commands),
+            mock.patch("cowrie.shell.command.log.err"),
+        ):
+            self.assertFalse(proto.isCommand("wget"))
+            self.assertIsNone(proto.getCommand("wget", PATH))
+            self.assertIsNone(proto.getCommand("/usr/bin/wget", PATH))
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, ClassVar
+from urllib.parse import parse_qs, urlparse
+
+from twisted.internet import defer
+
+from cowrie.output import s3
+
+os.environ["COWRIE_OUTPUT_S3_BUCKET"] = "cowrie"
+os.environ["COWRIE_OUTPUT_S3_REGION"] = "us-east-1"
+os.environ["COWRIE_OUTPUT_S3_ACCESS_KEY_ID"] = "test"
+os.environ["COWRIE_OUTPUT_S3_SECRET_ACCESS_KEY"] = "test"
+os.environ["COWRIE_OUTPUT_S3_MULTIPART_THRESHOLD"] = str(256 * 1024)
+os.environ["COWRIE_OUTPUT_S3_MULTIPART_CHUNKSIZE"] = str(100 * 1024)
+
+
+class S3StandIn(BaseHTTPRequestHandler):
+    """
+    Path style S3 API subset: HEAD and PUT object, multipart uploads
+    """
+
+    protocol_version = "HTTP/1.1"
+    log: ClassVar[list[tuple[str, str]]] = []
+    objects: ClassVar[dict[str, bytes]] = {}
+    parts: ClassVar[dict[int, bytes]] = {}
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _reply(self, code: int, body: bytes = b"", **headers: str) -> None:
+        self.send_response(code)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+            chunks = b""
+            while True:
+                size, _, rest = data.partition(b"\r\n")
+                n = int(size.split(b";")[0], 16)
+                if n == 0:
+                    break
+                chunks += rest[:n]
+                data = rest[n + 2 :]
+            data = chunks
+        return data
+
+    def _target(self) -> tuple[str, dict[str, list[str]]]:
+        url = urlparse(self.path)
+        return url.path, parse_qs(url.query, keep_blank_values=True)
+
+    def do_HEAD(self) -> None:
+        path, _ = self._target()
+        self.log.append(("HEAD", path))
+        self._reply(200 if path in self.objects else 404)
+
+    def do_PUT(self) -> None:
+        path, query = self._target()
+        body = self._body()
+        if "uploadId" in query:
+            self.log.append(("PART", path))
+            self.parts[int(query["partNumber"][0])] = body
+        else:
+            self.log.append(("PUT", path))
+            self.objects[path] = body
+        self._reply(200, ETag='"etag"')
+
+    def do_POST(self) -> None:
+        path, query = self._target()
+        body = self._body()
+        if "uploads" in query:
+            self.log.append(("CREATE", path))
+            self._reply(
+                200,
+                b"<InitiateMultipartUploadResult><UploadId>1</UploadId>"
+                b"</InitiateMultipartUploadResult>",
+            )
+            return
+        self.log.append(("COMPLETE", path))
+        numbers = [int(n) for n in re.findall(rb"<PartNumber>(\d+)<", body)]
+        self.objects[path] = b"".join(self.parts[n] for n in numbers)
+        self._reply(
+            200,
+            b"<CompleteMultipartUploadResult><ETag>&quot;etag&quot;</ETag>"
+            b"</CompleteMultipartUploadResult>",
+        )
+
+
+class S3OutputTests(unittest.TestCase):
+    """Tests for cowrie/output/s3.py"""
+
+    def setUp(self) -> None:
+        self.handler = S3StandIn
+        self.handler.log = []
+        self.handler.objects = {}
+        self.handler.parts = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), S3StandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ["COWRIE_OUTPUT_S3_ENDPOINT"] = (
+            f"http://127.0.0.1:{self.server.server_address[1]}"
+        )
+        os.environ["COWRIE_OUTPUT_S3_CACHE_FILE"] = os.path.join(
+            self.tmpdir.name, "s3.sqlite"
+        )
+        self.output = s3.Output()
+        # Run the botocore calls inline instead of in the thread pool
+        self.output.deferToThread = defer.maybeDeferred
+
+    def tearDown(self) -> None:
+        self.output.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def artifact(self, size: int) -> tuple[str, str, bytes]:
+        data = os.urandom(size)
+        shasum = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.tmpdir.name, shasum)
+        with open(path, "wb") as f:
+            f.write(data)
+        return shasum, path, data
+
+    def upload(self, shasum: str, path: str) -> None:
+        failures: list[Any] = []
+        self.output.upload(shasum, path).addErrback(failures.append)
+        if failures:
+            failures[0].raiseException()
+
+    def test_small_upload(self) -> None:
+        shasum, path, data = self.artifact(1000)
+        self.upload(shasum, path)
+        self.assertEqual(
+            self.handler.log,
+            [("HEAD", f"/cowrie/{shasum}"), ("PUT", f"/cowrie/{shasum}")],
+        )
+        self.assertEqual(self.handler.objects[f"/cowrie/{shasum}"], data)
+
+    def test_duplicate_skips_head(self) -> None:
+        shasum, path, _ = self.artifact(1000)
+        self.upload(shasum, path)
+        self.upload(shasum, path)
+        self.assertEqual(len(self.handler.log), 2)
+
+        # The cache survives a restart
+        self.output.stop()
+        self.output = s3.Output()
+        self.upload(shasum, path)
+        self.assertEqual(len(self.handler.log), 2)
+
+    def test_multipart_upload(self) -> None:
+        shasum, path, data = self.artifact(350 * 1024)
+        self.upload(shasum, path)
+        kinds = [kind for kind, _ in self.handler.log]
+        self.assertEqual(
+            kinds, ["HEAD", "CREATE", "PART", "PART", "PART", "PART", "COMPLETE"]
+        )
+        self.assertEqual(self.handler.objects[f"/cowrie/{shasum}"], data)
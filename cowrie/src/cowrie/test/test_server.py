@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cowrie.shell import server
+
+PROCESSES = {"command": {"ps": [{"USER": "root", "PID": 1, "COMMAND": "init"}]}}
+
+
+class CommandOutputTests(unittest.TestCase):
+    """Tests for the shared command output in cowrie/shell/server.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "cmdoutput.json")
+        self.write(PROCESSES, 1)
+        self.addCleanup(server.commandOutputs.pop, self.path, None)
+
+    def write(self, data: dict, mtime: int) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_parsed_once(self) -> None:
+        version, data = server.command_output(self.path)
+        with mock.patch.object(server.json, "load") as load:
+            self.assertIs(server.command_output(self.path)[1], data)
+            load.assert_not_called()
+        self.assertEqual(data["command"]["ps"][0]["COMMAND"], "init")
+        self.assertEqual(version[0], self.path)
+
+    def test_frozen(self) -> None:
+        data = server.command_output(self.path)[1]
+        processes = data["command"]["ps"]
+        self.assertIsInstance(processes, tuple)
+        with self.assertRaises(TypeError):
+            processes[0]["PID"] = 2  # type: ignore[index]
+
+    def test_reloaded(self) -> None:
+        version, data = server.command_output(self.path)
+        processes = {"command": {"ps": [{"USER": "root", "PID": 1, "COMMAND": "sh"}]}}
+        self.write(processes, 2)
+        changed, reloaded = server.command_output(self.path)
+        self.assertNotEqual(changed, version)
+        self.assertEqual(reloaded["command"]["ps"][0]["COMMAND"], "sh")
+        self.assertEqual(data["command"]["ps"][0]["COMMAND"], "init")
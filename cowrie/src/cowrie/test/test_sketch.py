@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import unittest
+
+from cowrie.core.sketch import HyperLogLog, SpaceSaving
+
+
+class SpaceSavingTests(unittest.TestCase):
+    """Tests for cowrie/core/sketch.py SpaceSaving"""
+
+    def test_exact_below_capacity(self) -> None:
+        ss = SpaceSaving(10)
+        for key in ["a", "b", "a", "c", "a", "b"]:
+            ss.add(key)
+        self.assertEqual(ss.top(), [("a", 3, 0), ("b", 2, 0), ("c", 1, 0)])
+        self.assertEqual(ss.total, 6)
+
+    def test_bounded(self) -> None:
+        ss = SpaceSaving(5)
+        for i in range(10000):
+            ss.add(f"ip{i}")
+        self.assertEqual(len(ss), 5)
+
+    def test_heavy_hitters_survive(self) -> None:
+        ss = SpaceSaving(100)
+        for i in range(20000):
+            ss.add(f"noise{i}")
+            if i % 10 == 0:
+                ss.add("heavy")
+            if i % 25 == 0:
+                ss.add(("root", "fail"))
+        top = [key for key, _count, _error in ss.top(2)]
+        self.assertEqual(top, ["heavy", ("root", "fail")])
+        self.assertGreaterEqual(ss.get("heavy"), 2000)
+        self.assertLessEqual(ss.get("heavy") - ss.error("heavy"), 2000)
+
+    def test_weighted(self) -> None:
+        ss = SpaceSaving(2)
+        ss.add("a", 5)
+        ss.add("b", 1)
+        ss.add("c", 1)
+        self.assertEqual(ss.top(), [("a", 5, 0), ("c", 2, 1)])
+        self.assertNotIn("b", ss)
+
+
+class HyperLogLogTests(unittest.TestCase):
+    """Tests for cowrie/core/sketch.py HyperLogLog"""
+
+    def test_empty(self) -> None:
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_duplicates(self) -> None:
+        hll = HyperLogLog()
+        for _ in range(1000):
+            hll.add("1.2.3.4")
+        self.assertEqual(hll.count(), 1)
+
+    def test_estimate(self) -> None:
+        hll = HyperLogLog()
+        for i in range(50000):
+            hll.add(f"10.{i >> 16}.{(i >> 8) & 255}.{i & 255}")
+        self.assertAlmostEqual(hll.count(), 50000, delta=50000 * 0.03)
+
+    def test_merge_and_clear(self) -> None:
+        a = HyperLogLog(10)
+        b = HyperLogLog(10)
+        for i in range(500):
+            a.add(str(i))
+            b.add(str(i + 250))
+        a.merge(b)
+        self.assertAlmostEqual(a.count(), 750, delta=750 * 0.1)
+        a.clear()
+        self.assertEqual(a.count(), 0)
+        with self.assertRaises(ValueError):
+            a.merge(HyperLogLog(12))
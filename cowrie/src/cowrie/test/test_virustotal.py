@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from typing import Any
+
+from twisted.internet import defer
+
+from cowrie.output import virustotal
+
+os.environ["COWRIE_OUTPUT_VIRUSTOTAL_API_KEY"] = "test"
+os.environ["COWRIE_OUTPUT_VIRUSTOTAL_UPLOAD"] = "false"
+
+
+REPORT = {
+    "response_code": 1,
+    "resource": "abc",
+    "verbose_msg": "Scan finished",
+    "positives": 2,
+    "total": 60,
+    "scan_date": "2026-01-01 00:00:00",
+    "permalink": "https://www.virustotal.com/",
+    "scans": {"Feed": {"detected": True, "result": "Trojan"}},
+}
+
+
+class VirusTotalCacheTests(unittest.TestCase):
+    """Tests for caching and deduplication in cowrie/output/virustotal.py"""
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.environ["COWRIE_OUTPUT_VIRUSTOTAL_CACHE_FILE"] = os.path.join(
+            self.tmpdir.name, "vt.sqlite"
+        )
+        self.output = virustotal.Output()
+        self.requests: list[tuple[str, defer.Deferred[Any]]] = []
+
+        def fake_request(path: str, body: bytes, contentType: Any = None) -> Any:
+            d: defer.Deferred[Any] = defer.Deferred()
+            self.requests.append((path, d))
+            return d
+
+        self.output._request = fake_request  # type: ignore[method-assign]
+
+    def tearDown(self) -> None:
+        self.output.stop()
+        self.tmpdir.cleanup()
+        del os.environ["COWRIE_OUTPUT_VIRUSTOTAL_CACHE_FILE"]
+
+    def event(self, session: str) -> dict[str, Any]:
+        return {
+            "eventid": "cowrie.session.file_download",
+            "session": session,
+            "shasum": "abc",
+            "outfile": "/nonexistent",
+        }
+
+    def test_concurrent_downloads_one_request(self) -> None:
+        for session in ("s1", "s2", "s3"):
+            self.output.write(self.event(session))
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0][0], "file/report")
+        self.requests[0][1].callback(REPORT)
+
+        # Later sessions are served from the cache
+        self.output.write(self.event("s4"))
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.output.cache.get("file", "abc"), REPORT)
+
+    def test_uploaded_file_cached_as_pending(self) -> None:
+        self.output.upload = True
+        uploads: list[str] = []
+
+        def fake_postfile(artifact: str, fileName: str) -> defer.Deferred[bool]:
+            uploads.append(fileName)
+            return defer.succeed(True)
+
+        self.output.postfile = fake_postfile  # type: ignore[method-assign]
+        self.output.write(self.event("s1"))
+        self.requests[0][1].callback(
+            {"response_code": 0, "resource": "abc", "verbose_msg": "not found"}
+        )
+        self.assertEqual(uploads, ["abc"])
+        self.assertEqual(self.output.cache.get("file", "abc")["response_code"], -2)
+        self.output.write(self.event("s2"))
+        self.assertEqual(len(self.requests), 1)
+
+    def test_unknown_file_not_uploaded(self) -> None:
+        """
+        A file that was not uploaded is not reported as queued at VT
+        """
+        self.output.write(self.event("s1"))
+        self.requests[0][1].callback(
+            {"response_code": 0, "resource": "abc", "verbose_msg": "not found"}
+        )
+        self.assertIsNone(self.output.cache.get("file", "abc"))
@@ -45,6 +45,7 @@ from twisted.plugin import IPlugin
 from twisted.python import log, usage
 
 import cowrie.core.checkers
+import cowrie.core.output
 import cowrie.core.realm
 import cowrie.ssh.factory
 import cowrie.telnet.factory
@@ -52,8 +53,11 @@ from backend_pool.pool_server import PoolServerFactory
 from cowrie import core
 from cowrie._version import __version__ as __cowrie_version__
 from cowrie.core.config import CowrieConfig
+from cowrie.core.metrics import MetricsReporter
+from cowrie.core.monitor import ReactorMonitor
 from cowrie.core.utils import create_endpoint_services, get_endpoints_from_section
 from cowrie.pool_interface.handler import PoolHandler
+from cowrie.shell import profiling
 
 if TYPE_CHECKING:
     from collections.abc import Callable
@@ -66,7 +70,14 @@ class Options(usage.Options):
 
     # The '-c' parameters is currently ignored
     optParameters: ClassVar[list[str]] = []
-    optFlags: ClassVar[list[list[str]]] = [["help", "h", "Display this help and exit."]]
+    optFlags: ClassVar[list[list[str | None]]] = [
+        ["help", "h", "Display this help and exit."],
+        [
+            "profile-outputs",
+            None,
+            "Print a ranked table of output plugin write() cost at shutdown.",
+        ],
+    ]
 
 
 @provider(ILogObserver)
@@ -82,6 +93,16 @@ def importFailureObserver(event: dict) -> None:
 globalLogPublisher.addObserver(importFailureObserver)
 
 
+def reportOutputProfile() -> None:
+    """
+    Print the output plugin write() statistics and log them, as stdout is
+    gone when running as a daemon
+    """
+    report = cowrie.core.output.profile_report()
+    log.msg(f"Output plugin write() statistics:\n{report}")
+    print(report)  # noqa: T201
+
+
 @implementer(IServiceMaker, IPlugin)
 class CowrieServiceMaker:
     tapname: ClassVar[str] = "cowrie"
@@ -115,9 +136,10 @@ class CowrieServiceMaker:
 
         if options["help"] is True:
             print(  # noqa: T201
-                """Usage: twistd [options] cowrie [-h]
+                """Usage: twistd [options] cowrie [-h] [--profile-outputs]
 Options:
   -h, --help             print this help message.
+  --profile-outputs      print output plugin write() statistics at shutdown.
 
 Makes a Cowrie SSH/Telnet honeypot.
 """
@@ -172,10 +194,25 @@ Makes a Cowrie SSH/Telnet honeypot.
                 log.err()
                 log.msg(f"Failed to load output engine: {engine}")
 
+        if options["profile-outputs"]:
+            reactor.addSystemEventTrigger(  # type: ignore[attr-defined]
+                "after",
+                "shutdown",
+                reportOutputProfile,
+            )
+
         self.topService = service.MultiService()
         application = service.Application("cowrie")
         self.topService.setServiceParent(application)
 
+        # Reactor lag / slow callback monitoring and push based metrics sinks
+        if CowrieConfig.getboolean("monitor", "enabled", fallback=True):
+            ReactorMonitor().setServiceParent(self.topService)
+            MetricsReporter().setServiceParent(self.topService)
+
+        if profiling.enabled:
+            profiling.CommandProfileReporter().setServiceParent(self.topService)
+
         # initialise VM pool handling - only if proxy AND pool set to enabled, and pool is to be deployed here
         # or also enabled if pool_only is true
         backend_type: str = CowrieConfig.get("honeypot", "backend", fallback="shell")
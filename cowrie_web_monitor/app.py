@@ -3,9 +3,10 @@ import re
 import time
 import queue
 import json
+import sqlite3
 import threading
 from datetime import datetime
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 
 import requests
 from flask import Flask, render_template, Response, send_from_directory
@@ -13,6 +14,8 @@ from flask import Flask, render_template, Response, send_from_directory
 app = Flask(__name__)
 
 LOGFILE = "../cowrie/var/log/cowrie/cowrie.log"
+# Shared with cowrie's IP enrichment service (cowrie.core.enrichment)
+ENRICHMENT_DB = "../cowrie/var/lib/cowrie/enrichment.sqlite"
 WEBHOOK_PATH = "../webhook_url.txt"
 IMAGES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "images"))
 
@@ -30,14 +33,20 @@ event_queue = queue.Queue(maxsize=500)
 # Webhook queue (async)
 webhook_queue = queue.Queue(maxsize=200)
 
-# GeoIP cache
-geo_cache = {}
+# GeoIP cache, in memory in front of the shared SQLite cache
+geo_cache = OrderedDict()
+geo_lock = threading.Lock()
+geo_db = None
 
 # ----------------------------------------------------
 # CONFIG
 # ----------------------------------------------------
 GEO_API_URL = "http://ip-api.com/json/{ip}?fields=status,message,country,regionName,city,query,isp,org,as,reverse"
 
+GEO_CACHE_SIZE = 10000
+GEO_TTL = 7 * 86400  # successful lookups
+GEO_FAIL_TTL = 600  # failed lookups are retried after this
+
 DISCORD_RATE_LIMIT_SECONDS = 1.2  # safe small delay
 
 # ----------------------------------------------------
@@ -59,24 +68,84 @@ WEBHOOK_URL = get_webhook_url()
 # GEO LOOKUP
 # -----------------------------
 
-def geo_lookup(ip):
-    """Cached lookup for IP geolocation."""
-    if ip in geo_cache:
-        return geo_cache[ip]
+def _geo_db():
+    """Open the shared enrichment cache, same schema as cowrie.core.cache."""
+    global geo_db
+    if geo_db is None:
+        os.makedirs(os.path.dirname(ENRICHMENT_DB), exist_ok=True)
+        geo_db = sqlite3.connect(ENRICHMENT_DB, check_same_thread=False)
+        geo_db.execute("PRAGMA journal_mode=WAL")
+        geo_db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "expires REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        geo_db.commit()
+    return geo_db
+
+
+def _geo_cache_get(ip, now):
+    entry = geo_cache.get(ip)
+    if entry is not None and entry[0] >= now:
+        geo_cache.move_to_end(ip)
+        return entry[1]
+    try:
+        row = _geo_db().execute(
+            "SELECT value FROM cache WHERE namespace = 'geo' AND key = ? AND expires >= ?",
+            (ip, now),
+        ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+    entry = json.loads(row[0])
+    _geo_cache_set(ip, entry["value"], entry["expires"])
+    return entry["value"]
+
+
+def _geo_cache_set(ip, data, expires):
+    geo_cache[ip] = (expires, data)
+    geo_cache.move_to_end(ip)
+    while len(geo_cache) > GEO_CACHE_SIZE:
+        geo_cache.popitem(last=False)
 
+
+def geo_lookup(ip):
+    """Cached lookup for IP geolocation, persisted across restarts."""
+    now = time.time()
+    with geo_lock:
+        data = _geo_cache_get(ip, now)
+    if data is not None:
+        return data
+
+    data = None
     try:
         r = requests.get(GEO_API_URL.format(ip=ip), timeout=2)
-        data = r.json()
-
-        if data.get("status") == "success":
-            geo_cache[ip] = data
-            return data
+        result = r.json()
+        if result.get("status") == "success":
+            data = result
     except:
         pass
 
-    # fallback minimal
-    geo_cache[ip] = {"country": "Unknown", "city": "Unknown", "org": "Unknown"}
-    return geo_cache[ip]
+    if data is not None:
+        ttl = GEO_TTL
+    else:
+        # fallback minimal
+        data = {"country": "Unknown", "city": "Unknown", "org": "Unknown"}
+        ttl = GEO_FAIL_TTL
+
+    with geo_lock:
+        _geo_cache_set(ip, data, now + ttl)
+        try:
+            _geo_db().execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires) "
+                "VALUES ('geo', ?, ?, ?)",
+                (ip, json.dumps({"value": data, "expires": now + ttl}), now + ttl),
+            )
+            _geo_db().commit()
+        except sqlite3.Error:
+            pass
+    return data
 
 
 # -----------------------------